@@ -0,0 +1,163 @@
+"""
+Compare the per-message cost of WebRTCDataChannel.on_message against the
+previous implementation (json.loads, four get_nested_field() lookups to build
+the resolver key, then an if/elif chain on the message type).
+
+Both paths see the same session: subscribers on the streamed topics, requests
+waiting for their response and a per-topic response handler. The data channel
+is not connected; outgoing messages are discarded. on_message is run with the
+stdlib JSON codec and with the default codec. Parsing dominates the per-message
+cost with the stdlib codec, so the dispatch after parsing (resolver, subscriber
+callbacks and response handlers) is also timed on its own, on parsed messages.
+
+Usage: python dispatch_benchmark.py [--count 20000]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from aiortc import RTCPeerConnection
+
+from go2_webrtc_driver.constants import DATA_CHANNEL_TYPE, RTC_TOPIC
+from go2_webrtc_driver.json_codec import get_json_codec
+from go2_webrtc_driver.util import get_nested_field
+from go2_webrtc_driver.webrtc_datachannel import WebRTCDataChannel
+from sample_messages import recorded_messages
+
+SUBSCRIBED_TOPICS = ["LOW_STATE", "LF_SPORT_MOD_STATE", "ULIDAR_ARRAY", "MULTIPLE_STATE", "WIRELESS_CONTROLLER"]
+PENDING_REQUESTS = 4
+
+
+def legacy_resolve(message, pending_callbacks):
+    """The resolver key computation as it was before the dispatch table."""
+    if not message.get("type"):
+        return
+    if message["type"] == DATA_CHANNEL_TYPE["RTC_INNER_REQ"] and get_nested_field(message, "info", "req_type") == "request_static_file":
+        return
+    identifier = (
+        get_nested_field(message, "data", "uuid") or
+        get_nested_field(message, "data", "header", "identity", "id") or
+        get_nested_field(message, "info", "uuid") or
+        get_nested_field(message, "info", "req_uuid")
+    )
+    key = identifier or f"{message['type']} $ {message.get('topic', '')}"
+    get_nested_field(message, "data", "content_info")
+    if key in pending_callbacks:
+        del pending_callbacks[key]
+
+
+def legacy_handle_response(message):
+    msg_type = message["type"]
+    if msg_type == DATA_CHANNEL_TYPE["VALIDATION"]:
+        pass
+    elif msg_type == DATA_CHANNEL_TYPE["RTC_INNER_REQ"]:
+        pass
+    elif msg_type == DATA_CHANNEL_TYPE["HEARTBEAT"]:
+        pass
+    elif msg_type in {DATA_CHANNEL_TYPE["ERRORS"], DATA_CHANNEL_TYPE["ADD_ERROR"], DATA_CHANNEL_TYPE["RM_ERROR"]}:
+        pass
+    elif msg_type == DATA_CHANNEL_TYPE["ERR"]:
+        pass
+
+
+def build_datachannel(received, codec):
+    """A WebRTCDataChannel with subscribers, pending requests and a per-topic handler."""
+    datachannel = WebRTCDataChannel(SimpleNamespace(pc=None), RTCPeerConnection(), codec=codec)
+    datachannel.channel.send = lambda data: None
+    datachannel.channel._setReadyState("open")
+
+    pub_sub = datachannel.pub_sub
+    for name in SUBSCRIBED_TOPICS:
+        pub_sub.subscribe(RTC_TOPIC[name], lambda message: received.append(message["topic"]))
+
+    loop = asyncio.get_running_loop()
+    for index in range(PENDING_REQUESTS):
+        pub_sub.future_resolver.save_resolve(
+            DATA_CHANNEL_TYPE["REQUEST"], RTC_TOPIC["SPORT_MOD"], loop.create_future(), f"request-{index}", 3600
+        )
+    datachannel.set_response_handler(DATA_CHANNEL_TYPE["MSG"], lambda message: None, topic=RTC_TOPIC["LOW_STATE"])
+    return datachannel
+
+
+async def run(label, raw_messages, dispatch):
+    started = time.perf_counter()
+    for raw in raw_messages:
+        await dispatch(raw)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<18}: {elapsed / len(raw_messages) * 1e6:7.2f} us/message")
+    return elapsed
+
+
+async def benchmark(count):
+    raw_messages = recorded_messages(count)
+
+    legacy_received = []
+    pending = {f"request-{index}": None for index in range(PENDING_REQUESTS)}
+    subscriptions = {RTC_TOPIC[name]: lambda message: legacy_received.append(message["topic"]) for name in SUBSCRIBED_TOPICS}
+    async def legacy(raw):
+        message = json.loads(raw)
+        legacy_resolve(message, pending)
+        topic = message.get("topic")
+        if topic in subscriptions:
+            subscriptions[topic](message)
+        legacy_handle_response(message)
+
+    def legacy_dispatch(message):
+        legacy_resolve(message, pending)
+        topic = message.get("topic")
+        if topic in subscriptions:
+            subscriptions[topic](message)
+        legacy_handle_response(message)
+
+    legacy_time = await run("legacy", raw_messages, legacy)
+
+    mismatches = 0
+    parsed_messages = [json.loads(raw) for raw in raw_messages]
+    legacy_received.clear()
+    started = time.perf_counter()
+    for message in parsed_messages:
+        legacy_dispatch(message)
+    legacy_dispatch_time = time.perf_counter() - started
+    print(f"{'legacy dispatch':<18}: {legacy_dispatch_time / len(parsed_messages) * 1e6:7.2f} us/message")
+
+    received = []
+    datachannel = build_datachannel(received, "json")
+    run_resolve = datachannel.pub_sub.run_resolve
+    handle_response = datachannel.handle_response
+    started = time.perf_counter()
+    for message in parsed_messages:
+        run_resolve(message)
+        await handle_response(message)
+    dispatch_time = time.perf_counter() - started
+    print(f"{'dispatch':<18}: {dispatch_time / len(parsed_messages) * 1e6:7.2f} us/message")
+    print(f"{'speedup':<18}: {legacy_dispatch_time / dispatch_time:7.2f}x")
+    if received != legacy_received:
+        mismatches += 1
+    datachannel.pub_sub.future_resolver.pending_callbacks.clear()
+
+    for codec in ("json", get_json_codec().name):
+        received = []
+        datachannel = build_datachannel(received, codec)
+        on_message = datachannel.channel.listeners("message")[0]
+        current_time = await run(f"on_message/{codec}", raw_messages, on_message)
+        print(f"{'speedup':<18}: {legacy_time / current_time:7.2f}x")
+        if received != legacy_received:
+            mismatches += 1
+        datachannel.pub_sub.future_resolver.pending_callbacks.clear()
+
+    print(f"{'delivery':<18}: {'ok' if not mismatches else 'messages delivered differently'}")
+    return 1 if mismatches else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Data channel dispatch benchmark")
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+    return asyncio.run(benchmark(args.count))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,48 @@
+"""
+Parse/serialize benchmark of the data channel JSON codecs on lowstate and
+sportmodestate messages. Also checks that every codec produces the same bytes
+for outgoing messages as the standard library.
+
+Usage: python json_codec_benchmark.py [--count 5000]
+"""
+
+import argparse
+import json
+import time
+
+from go2_webrtc_driver.json_codec import JSON_CODECS
+from sample_messages import recorded_messages
+
+
+def measure(function, items):
+    started = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON codec benchmark")
+    parser.add_argument("--count", type=int, default=5000)
+    args = parser.parse_args()
+
+    raw_messages = recorded_messages(args.count)
+    parsed_messages = [json.loads(raw) for raw in raw_messages]
+    average_size = sum(len(raw) for raw in raw_messages) / len(raw_messages)
+    print(f"{len(raw_messages)} messages, {average_size:.0f} bytes on average")
+
+    baseline = None
+    for name, codec in JSON_CODECS.items():
+        parse_us = measure(codec.loads, raw_messages)
+        serialize_us = measure(codec.dumps, parsed_messages)
+
+        identical = all(codec.dumps(message) == json.dumps(message) for message in parsed_messages)
+        roundtrip = all(codec.loads(raw) == parsed for raw, parsed in zip(raw_messages, parsed_messages))
+
+        baseline = baseline or parse_us
+        print(f"{name:<8} parse {parse_us:7.2f} us ({baseline / parse_us:4.1f}x)  "
+              f"serialize {serialize_us:7.2f} us  identical output: {identical}  roundtrip: {roundtrip}")
+
+
+if __name__ == "__main__":
+    main()
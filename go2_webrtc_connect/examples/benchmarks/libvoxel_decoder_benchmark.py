@@ -0,0 +1,69 @@
+"""
+Compare the libvoxel wasm bridge with bulk memory transfers against the
+previous per-byte copies (input written byte by byte, outputs sliced into
+Python lists), and check that both return the same buffers.
+
+Usage: python libvoxel_decoder_benchmark.py [--frames 20] [--occupied 3000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.lidar_decoder_libvoxel import LidarDecoder
+from sample_messages import voxel_map_frame
+
+
+class LegacyLidarDecoder(LidarDecoder):
+    """The wasm memory traffic as it was before the bulk transfers."""
+
+    def copy_within(self, target, start, end):
+        sublist = self.HEAPU8[start:end]
+        for i in range(len(sublist)):
+            if target + i < len(self.HEAPU8):
+                self.HEAPU8[target + i] = sublist[i]
+
+    def add_value_arr(self, start, value):
+        for i, byte in enumerate(value):
+            self.HEAPU8[start + i] = byte
+
+    def read_bytes(self, start, length, dtype=np.uint8, out=None, name=None):
+        return np.frombuffer(bytearray(self.HEAPU8[start:start + length]), dtype=dtype)
+
+
+def measure(decoder, frames):
+    started = time.perf_counter()
+    for compressed, metadata in frames:
+        decoder.decode(compressed, metadata)
+    return (time.perf_counter() - started) / len(frames) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="libvoxel decoder benchmark")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--occupied", type=int, default=3000, help="Non-zero bytes per frame")
+    args = parser.parse_args()
+
+    frames = [voxel_map_frame(seed, args.occupied) for seed in range(args.frames)]
+    legacy = LegacyLidarDecoder()
+    current = LidarDecoder()
+
+    for compressed, metadata in frames:
+        expected = legacy.decode(compressed, metadata)
+        result = current.decode(compressed, metadata)
+        assert expected["point_count"] == result["point_count"]
+        assert expected["face_count"] == result["face_count"]
+        for key in ("positions", "uvs", "indices"):
+            assert np.array_equal(expected[key], result[key]), key
+    print(f"parity    : ok ({len(frames)} frames, {result['face_count']} faces in the last one)")
+
+    legacy_time = measure(legacy, frames)
+    current_time = measure(current, frames)
+    print(f"legacy    : {legacy_time:7.2f} ms/frame")
+    print(f"bulk      : {current_time:7.2f} ms/frame")
+    print(f"speedup   : {legacy_time / current_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark the lidar decoders on a corpus of voxel_map_compressed messages:
+decode latency percentiles, frames per second per core (CPU time), peak
+memory of the outputs and Python/numpy temporaries (tracemalloc; the wasm
+linear memory of libvoxel is not included), and output equivalence between
+LibVoxelDecoder and NativeDecoder.
+
+The lazily decoded 'data' of a message must also read like an eagerly decoded
+dict when copied with dict(), unpacked with {**data} or compared with ==.
+
+The decoders agree when libvoxel reports as many points as native decodes
+voxels, and every libvoxel mesh vertex is a corner of a native voxel.
+
+Usage: python lidar_decode_benchmark.py [--corpus voxel_map.corpus] [--frames 50] [--repeat 5]
+       Without --corpus a synthetic corpus is used (see lidar_fixtures.py).
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.lidar_decoder_unified import UnifiedLidarDecoder
+from lidar_fixtures import parse_lidar_message, read_corpus, synthetic_corpus
+
+# Voxel corner offsets, for the equivalence check
+CORNERS = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)])
+
+
+def percentile_ms(samples, q):
+    return np.percentile(samples, q) * 1e3
+
+
+def benchmark(decoder_type, frames, repeat):
+    decoder = UnifiedLidarDecoder(decoder_type)
+    decoder.load()
+    decoder.decode(*frames[0])  # Warm up
+
+    latencies = []
+    cpu_started = time.process_time()
+    for _ in range(repeat):
+        for compressed, metadata in frames:
+            started = time.perf_counter()
+            decoder.decode(compressed, metadata)
+            latencies.append(time.perf_counter() - started)
+    cpu_time = time.process_time() - cpu_started
+
+    tracemalloc.start()
+    for compressed, metadata in frames:
+        decoder.decode(compressed, metadata)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50": percentile_ms(latencies, 50),
+        "p90": percentile_ms(latencies, 90),
+        "p99": percentile_ms(latencies, 99),
+        "max": max(latencies) * 1e3,
+        "fps_per_core": len(latencies) / cpu_time if cpu_time else float("inf"),
+        "peak_mb": peak / 1e6,
+        "allocated_kb_per_frame": decoder.get_stats()["allocated_bytes_per_frame"] / 1e3,
+    }
+
+
+def voxel_keys(voxels):
+    return (voxels[:, 0] * 1024 + voxels[:, 1]) * 1024 + voxels[:, 2]
+
+
+def check_equivalence(frames):
+    libvoxel = UnifiedLidarDecoder("libvoxel")
+    native = UnifiedLidarDecoder("native")
+    mismatches = 0
+    for index, (compressed, metadata) in enumerate(frames):
+        mesh = libvoxel.decode(compressed, metadata)
+        points = native.decode(compressed, metadata)["points"]
+
+        origin = np.asarray(metadata["origin"], dtype=np.float32)
+        voxels = np.rint((points - origin) / np.float32(metadata["resolution"])).astype(np.int64)
+        corners = (voxels[:, None, :] + CORNERS[None]).reshape(-1, 3)
+        vertices = mesh["positions"].reshape(-1, 3).astype(np.int64)
+
+        same_count = mesh["point_count"] == len(points)
+        vertices_match = np.isin(voxel_keys(vertices), voxel_keys(corners)).all()
+        if not (same_count and vertices_match):
+            mismatches += 1
+            print(f"frame {index}: libvoxel {mesh['point_count']} points, native {len(points)} "
+                  f"points, vertices {'match' if vertices_match else 'do not match'}")
+    return mismatches
+
+
+def check_lazy_data(frames):
+    decoder = UnifiedLidarDecoder("native")
+    mismatches = 0
+    for compressed, metadata in frames:
+        expected = decoder.decode(compressed, metadata)["points"]
+        lazy = decoder.decode_lazy(compressed, metadata)
+        copies = [dict(lazy), {**lazy}]
+        same = all(
+            copy.keys() == {**metadata, "data": None}.keys() and copy["data"] is not None
+            and np.array_equal(copy["data"]["points"], expected)
+            for copy in copies
+        )
+        if not (same and lazy == copies[0] and copies[1] == lazy):
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lidar decode benchmark")
+    parser.add_argument("--corpus", help="Corpus recorded with record_lidar_fixtures.py")
+    parser.add_argument("--frames", type=int, default=50, help="Synthetic frames when no corpus is given")
+    parser.add_argument("--occupied", type=int, default=3000, help="Non-zero bytes per synthetic frame")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--decoders", nargs="+", default=["libvoxel", "native"])
+    args = parser.parse_args()
+
+    messages = read_corpus(args.corpus) if args.corpus else synthetic_corpus(args.frames, args.occupied)
+    frames = []
+    for message in messages:
+        header, compressed = parse_lidar_message(message)
+        frames.append((compressed, header["data"]))
+    print(f"corpus: {len(frames)} frames from {args.corpus or 'synthetic data'}")
+
+    print(f"{'decoder':<10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'fps/core':>9} {'peak MB':>8} {'alloc KB/frame':>15}")
+    for decoder_type in args.decoders:
+        result = benchmark(decoder_type, frames, args.repeat)
+        print(f"{decoder_type:<10} {result['p50']:8.2f} {result['p90']:8.2f} {result['p99']:8.2f} "
+              f"{result['max']:8.2f} {result['fps_per_core']:9.0f} {result['peak_mb']:8.2f} "
+              f"{result['allocated_kb_per_frame']:15.0f}")
+
+    mismatches = check_equivalence(frames)
+    print(f"equivalence: {'ok' if not mismatches else f'{mismatches} mismatching frames'}")
+
+    lazy_mismatches = check_lazy_data(frames)
+    print(f"lazy data  : {'ok' if not lazy_mismatches else f'{lazy_mismatches} frames copy differently'}")
+    return 1 if mismatches or lazy_mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
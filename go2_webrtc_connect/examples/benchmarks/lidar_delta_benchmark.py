@@ -0,0 +1,124 @@
+"""
+Bandwidth of VoxelDeltaEncoder against sending every voxel of every frame.
+
+Frames are windows of a fixed synthetic world moving with the robot, with some
+voxels flickering like sensor noise, or the native decoder output of a
+recorded corpus. Three simulated clients rebuild the frames from the messages:
+one connected from the start, one joining midway and one that only keeps up
+with every third frame. Each must hold exactly the frame's voxels after every
+message.
+
+Usage: python lidar_delta_benchmark.py [--corpus voxel_map.corpus] [--frames 300]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.lidar_decoder_unified import UnifiedLidarDecoder
+from go2_webrtc_driver.lidar.voxel_delta import VoxelDeltaEncoder, decode_voxels, pack_voxels
+from lidar_fixtures import parse_lidar_message, read_corpus
+
+WINDOW = (128, 128, 38)
+
+
+def synthetic_frames(count, density=0.03, speed=1.4, noise=0.02, seed=0):
+    """Windows of a random world, shifted by `speed` voxels per frame."""
+    rng = np.random.default_rng(seed)
+    world_size = (WINDOW[0] + int(count * speed) + 1, WINDOW[1], WINDOW[2])
+    world = np.argwhere(rng.random(world_size) < density)
+    for index in range(count):
+        low = int(index * speed)
+        voxels = world[(world[:, 0] >= low) & (world[:, 0] < low + WINDOW[0])]
+        flicker = rng.random(len(voxels)) < noise
+        yield voxels[~flicker]
+
+
+def corpus_frames(path):
+    decoder = UnifiedLidarDecoder("native")
+    for message in read_corpus(path):
+        header, compressed = parse_lidar_message(message)
+        metadata = header["data"]
+        points = decoder.decode(compressed, metadata)["points"]
+        yield np.floor(points / metadata["resolution"] + 0.5).astype(np.int64)
+
+
+class SimulatedClient:
+    def __init__(self, client_id, joins_at=0, every=1):
+        self.client_id = client_id
+        self.joins_at = joins_at
+        self.every = every
+        self.keys = set()
+        self.version = None
+        self.errors = 0
+
+    def receive(self, message, expected_keys):
+        if message["type"] == "keyframe":
+            self.keys = set(pack_voxels(decode_voxels(message["added"], message["encoding"])).tolist())
+        else:
+            if message["base"] != self.version:
+                self.errors += 1
+            self.keys.difference_update(pack_voxels(decode_voxels(message["removed"], message["encoding"])).tolist())
+            self.keys.update(pack_voxels(decode_voxels(message["added"], message["encoding"])).tolist())
+        self.version = message["version"]
+        if self.keys != set(expected_keys.tolist()) or len(self.keys) != message["count"]:
+            self.errors += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voxel delta encoding benchmark")
+    parser.add_argument("--corpus", help="Corpus recorded with record_lidar_fixtures.py")
+    parser.add_argument("--frames", type=int, default=300, help="Synthetic frames when no corpus is given")
+    parser.add_argument("--keyframe-interval", type=int, default=100)
+    args = parser.parse_args()
+
+    frames = list(corpus_frames(args.corpus) if args.corpus else synthetic_frames(args.frames))
+    encoder = VoxelDeltaEncoder(keyframe_interval=args.keyframe_interval)
+    clients = [
+        SimulatedClient("live"),
+        SimulatedClient("late", joins_at=len(frames) // 2),
+        SimulatedClient("slow", every=3),
+    ]
+
+    full_bytes = 0
+    update_time = 0.0
+    message_time = 0.0
+    for index, voxels in enumerate(frames):
+        started = time.perf_counter()
+        encoder.update(voxels)
+        update_time += time.perf_counter() - started
+        full_bytes += len(encoder.keys) * 6  # Every voxel as int16 triplets
+
+        for client in clients:
+            if index == client.joins_at:
+                encoder.add_client(client.client_id)
+            if index < client.joins_at or index % client.every:
+                continue
+            started = time.perf_counter()
+            message = encoder.message(client.client_id)
+            message_time += time.perf_counter() - started
+            if message is not None:
+                client.receive(message, encoder.keys)
+
+    stats = encoder.get_stats()["clients"]
+    live = stats["live"]
+    print(f"frames        : {len(frames)} from {args.corpus or 'synthetic data'}, "
+          f"{np.mean([len(voxels) for voxels in frames]):.0f} voxels per frame")
+    print(f"full frames   : {full_bytes / len(frames) / 1e3:.1f} KB/frame")
+    print(f"delta stream  : {live['bytes_sent'] / len(frames) / 1e3:.1f} KB/frame "
+          f"({full_bytes / live['bytes_sent']:.1f}x less, {live['keyframes']} keyframes)")
+    print(f"update        : {update_time / len(frames) * 1e3:.2f} ms/frame")
+    print(f"messages      : {message_time / len(frames) * 1e3:.2f} ms/frame for {len(clients)} clients")
+    for client in clients:
+        client_stats = stats[client.client_id]
+        print(f"client {client.client_id:<6} : {client_stats['keyframes']} keyframes, {client_stats['deltas']} deltas, "
+              f"{client.errors} errors")
+
+    errors = sum(client.errors for client in clients)
+    print(f"reconstruction: {'ok' if not errors else f'{errors} errors'}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
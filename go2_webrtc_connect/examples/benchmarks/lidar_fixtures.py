@@ -0,0 +1,69 @@
+"""
+Corpus of rt/utlidar/voxel_map_compressed data channel messages for the lidar
+benchmarks.
+
+A corpus file holds the raw binary messages exactly as they arrive on the data
+channel (JSON header + compressed voxel payload), each prefixed with its length:
+
+    b"G2LIDAR1" | (uint32 length, message bytes) * N
+
+Record one from a robot with record_lidar_fixtures.py. Without a recording,
+synthetic_corpus() builds messages with the same layout from sample_messages.
+"""
+
+import json
+import struct
+
+from go2_webrtc_driver.constants import DATA_CHANNEL_TYPE, RTC_TOPIC
+from sample_messages import voxel_map_frame
+
+CORPUS_MAGIC = b"G2LIDAR1"
+
+
+def encode_lidar_message(compressed, metadata):
+    """Build a binary lidar message as the Go2 sends it."""
+    header = json.dumps({
+        "type": DATA_CHANNEL_TYPE["MSG"],
+        "topic": RTC_TOPIC["ULIDAR_ARRAY"],
+        "data": metadata,
+    }).encode()
+    return struct.pack("<HHII", 2, 0, len(header), 0) + header + compressed
+
+
+def is_lidar_message(message):
+    return isinstance(message, bytes) and struct.unpack_from("<HH", message, 0) == (2, 0)
+
+
+def parse_lidar_message(message):
+    """Split a binary lidar message into (JSON header, compressed payload), like the data channel does."""
+    header_length, = struct.unpack_from("<I", message, 4)
+    header = json.loads(message[12:12 + header_length])
+    return header, message[12 + header_length:]
+
+
+def write_corpus(path, messages):
+    with open(path, "wb") as corpus:
+        corpus.write(CORPUS_MAGIC)
+        for message in messages:
+            corpus.write(struct.pack("<I", len(message)))
+            corpus.write(message)
+
+
+def read_corpus(path):
+    with open(path, "rb") as corpus:
+        data = corpus.read()
+    if not data.startswith(CORPUS_MAGIC):
+        raise ValueError(f"{path} is not a lidar corpus file")
+
+    messages = []
+    offset = len(CORPUS_MAGIC)
+    while offset < len(data):
+        length, = struct.unpack_from("<I", data, offset)
+        offset += 4
+        messages.append(data[offset:offset + length])
+        offset += length
+    return messages
+
+
+def synthetic_corpus(count=50, occupied_bytes=3000):
+    return [encode_lidar_message(*voxel_map_frame(seed, occupied_bytes)) for seed in range(count)]
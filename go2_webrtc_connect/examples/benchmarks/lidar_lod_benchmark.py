@@ -0,0 +1,96 @@
+"""
+Level of detail cost for many viewers: VoxelLevels builds each level once per
+frame (pooled from the level below) and shares it, against pooling the full
+frame separately for every viewer. Levels must match pooling the full frame
+directly with np.floor_divide. A viewer whose point budget is the median voxel
+count of the frames shows how often the level would change without hysteresis.
+
+Usage: python lidar_lod_benchmark.py [--corpus voxel_map.corpus] [--frames 100] [--viewers 12]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.point_encoding import encode_points
+from go2_webrtc_driver.lidar.voxel_delta import pack_voxels, unique_keys, unpack_voxels
+from go2_webrtc_driver.lidar.voxel_lod import VoxelLevels
+from lidar_delta_benchmark import corpus_frames, synthetic_frames
+
+
+def pooled(voxels, level):
+    return unpack_voxels(unique_keys(pack_voxels(np.floor_divide(voxels, 1 << level))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voxel level of detail benchmark")
+    parser.add_argument("--corpus", help="Corpus recorded with record_lidar_fixtures.py")
+    parser.add_argument("--frames", type=int, default=100, help="Synthetic frames when no corpus is given")
+    parser.add_argument("--viewers", type=int, default=12)
+    parser.add_argument("--max-level", type=int, default=4)
+    args = parser.parse_args()
+
+    frames = list(corpus_frames(args.corpus) if args.corpus else synthetic_frames(args.frames, density=0.1))
+    budgets = [None, 20000, 5000, 1000]  # Point budget per viewer, in turn
+    levels = VoxelLevels(max_level=args.max_level)
+    for viewer in range(args.viewers):
+        levels.subscribe(viewer, point_budget=budgets[viewer % len(budgets)])
+
+    # A budget right at the typical voxel count, which the frames cross back and forth
+    edge_budget = int(np.median([len(unique_keys(pack_voxels(voxels))) for voxels in frames]))
+    edge_levels = VoxelLevels(max_level=args.max_level)
+    edge_levels.subscribe("edge", point_budget=edge_budget)
+    edge_served = []
+    edge_stateless = []
+
+    mismatches = 0
+    counts = np.zeros(args.max_level + 1)
+    shared_time = 0.0
+    separate_time = 0.0
+    payload = {}
+    for voxels in frames:
+        started = time.perf_counter()
+        levels.update(voxels)
+        for level, viewers in levels.clients_by_level().items():
+            data, _, _ = levels.cached(level, "payload", lambda: encode_points(levels.points(level)))
+            for _ in viewers:
+                payload[level] = len(data)
+        shared_time += time.perf_counter() - started
+
+        # Each viewer pooling the full frame on its own
+        started = time.perf_counter()
+        for viewer in range(args.viewers):
+            budget = budgets[viewer % len(budgets)]
+            for level in range(args.max_level + 1):
+                cells = pooled(voxels, level)
+                if not budget or len(cells) <= budget:
+                    break
+            encode_points(cells * (1 << level) + ((1 << level) - 1) / 2)
+        separate_time += time.perf_counter() - started
+
+        edge_levels.update(voxels)
+        edge_served.append(next(iter(edge_levels.clients_by_level())))
+        edge_stateless.append(edge_levels.level_for(edge_budget))
+
+        for level in range(args.max_level + 1):
+            counts[level] += levels.count(level)
+            if not np.array_equal(levels.voxels(level), pooled(voxels, level)):
+                mismatches += 1
+
+    print(f"frames   : {len(frames)} from {args.corpus or 'synthetic data'}, {args.viewers} viewers "
+          f"with budgets {budgets}")
+    print(f"{'level':<6} {'cell m':>7} {'voxels':>8} {'KB/frame':>9}")
+    for level in range(args.max_level + 1):
+        size = f"{payload[level] / 1e3:9.0f}" if level in payload else f"{'-':>9}"
+        print(f"{level:<6} {levels.resolution * (1 << level):7.2f} {counts[level] / len(frames):8.0f} {size}")
+    print(f"shared   : {shared_time / len(frames) * 1e3:.2f} ms/frame")
+    print(f"separate : {separate_time / len(frames) * 1e3:.2f} ms/frame")
+    print(f"edge     : budget {edge_budget}, {np.count_nonzero(np.diff(edge_served))} level changes "
+          f"({np.count_nonzero(np.diff(edge_stateless))} without hysteresis)")
+    print(f"pooling  : {'ok' if not mismatches else f'{mismatches} mismatching levels'}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+"""
+Compare lidar recording as CSV (decoded points written with tolist() and a
+flush per frame, as plot_lidar_stream.py --csv-write did) with the binary
+LidarRecorder format: write cost per frame, file size, time to open the
+recording and to read a random frame. The binary recording must return the
+recorded frames unchanged.
+
+Usage: python lidar_recording_benchmark.py [--corpus voxel_map.corpus] [--frames 200]
+"""
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.lidar_decoder_unified import UnifiedLidarDecoder
+from go2_webrtc_driver.lidar.lidar_recording import LidarRecorder, LidarRecording
+from lidar_fixtures import parse_lidar_message, read_corpus, synthetic_corpus
+
+
+def record_csv(path, frames, decoded):
+    started = time.perf_counter()
+    with open(path, "w", newline="", encoding="utf-8") as output:
+        writer = csv.writer(output)
+        writer.writerow(["stamp", "frame_id", "resolution", "src_size", "origin", "width", "point_count", "positions"])
+        for (_, metadata), points in zip(frames, decoded):
+            writer.writerow([metadata["stamp"], metadata["frame_id"], metadata["resolution"], metadata["src_size"],
+                             metadata["origin"], metadata["width"], len(points), points.tolist()])
+            output.flush()
+    return time.perf_counter() - started
+
+
+def record_binary(path, frames):
+    started = time.perf_counter()
+    with LidarRecorder(path) as recorder:
+        for compressed, metadata in frames:
+            recorder.write(compressed, metadata)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lidar recording benchmark")
+    parser.add_argument("--corpus", help="Corpus recorded with record_lidar_fixtures.py")
+    parser.add_argument("--frames", type=int, default=200, help="Synthetic frames when no corpus is given")
+    parser.add_argument("--reads", type=int, default=1000, help="Random frame reads")
+    args = parser.parse_args()
+
+    messages = read_corpus(args.corpus) if args.corpus else synthetic_corpus(args.frames)
+    frames = []
+    for message in messages:
+        header, compressed = parse_lidar_message(message)
+        frames.append((compressed, header["data"]))
+    decoder = UnifiedLidarDecoder("native")
+    decoded = [decoder.decode(compressed, metadata)["points"] for compressed, metadata in frames]
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "lidar.csv")
+        binary_path = os.path.join(directory, "lidar.g2lrec")
+        csv_time = record_csv(csv_path, frames, decoded)
+        binary_time = record_binary(binary_path, frames)
+
+        started = time.perf_counter()
+        recording = LidarRecording(binary_path)
+        open_time = time.perf_counter() - started
+
+        indices = [random.randrange(len(recording)) for _ in range(args.reads)]
+        started = time.perf_counter()
+        for index in indices:
+            recording[index]
+        read_time = (time.perf_counter() - started) / args.reads
+
+        mismatches = sum(
+            1 for (compressed, metadata), (_, recorded_metadata, recorded) in zip(frames, recording.frames(0))
+            if recorded != compressed or recorded_metadata != metadata
+        )
+        middle = recording.seek(recording.duration / 2)
+        seek_ok = abs(recording.stamps[middle] - recording.stamps[0] - recording.duration / 2) <= np.diff(recording.stamps).max()
+        recording.close()
+
+        print(f"frames          : {len(frames)} from {args.corpus or 'synthetic data'}")
+        print(f"{'format':<8} {'write us/frame':>15} {'size MB':>9}")
+        print(f"{'csv':<8} {csv_time / len(frames) * 1e6:15.0f} {os.path.getsize(csv_path) / 1e6:9.2f}")
+        print(f"{'binary':<8} {binary_time / len(frames) * 1e6:15.0f} {os.path.getsize(binary_path) / 1e6:9.2f}")
+        print(f"open            : {open_time * 1e3:.2f} ms")
+        print(f"random read     : {read_time * 1e6:.1f} us/frame")
+
+    ok = not mismatches and seek_ok
+    print(f"round trip      : {'ok' if ok else f'{mismatches} mismatching frames'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+"""
+Compare the per-frame cost and payload size of the plot_lidar_stream.py
+browser stream: the former list comprehension, float np.unique and JSON lists
+against unique_vertices and binary float32 / int16 attachments. The binary
+points must match the JSON ones.
+
+Usage: python lidar_stream_benchmark.py [--corpus voxel_map.corpus] [--frames 20]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.lidar_decoder_unified import UnifiedLidarDecoder
+from go2_webrtc_driver.lidar.point_encoding import decode_points, encode_points, unique_vertices
+from lidar_fixtures import parse_lidar_message, read_corpus, synthetic_corpus
+
+ROTATE_X_ANGLE = np.pi / 2
+ROTATE_Z_ANGLE = np.pi
+
+
+def rotation_matrices():
+    x, z = ROTATE_X_ANGLE, ROTATE_Z_ANGLE
+    rotation_x = np.array([[1, 0, 0], [0, np.cos(x), -np.sin(x)], [0, np.sin(x), np.cos(x)]])
+    rotation_z = np.array([[np.cos(z), -np.sin(z), 0], [np.sin(z), np.cos(z), 0], [0, 0, 1]])
+    return np.round(rotation_x, 12), np.round(rotation_z, 12)
+
+
+def legacy_frame(positions):
+    """The former per-frame pipeline, returning the JSON the browser received."""
+    rotation_x, rotation_z = rotation_matrices()
+    points = np.array([positions[i:i+3] for i in range(0, len(positions), 3)], dtype=np.float32)
+    unique_points = np.unique(points, axis=0)
+    points = unique_points @ rotation_x.T @ rotation_z.T
+    points = points[(points[:, 1] >= 0) & (points[:, 1] <= 100)]
+    center = points.mean(axis=0)
+    offset_points = points - center
+    scalars = np.linalg.norm(offset_points, axis=1)
+    return json.dumps({
+        "points": offset_points.tolist(),
+        "scalars": scalars.tolist(),
+        "center": {"x": float(center[0]), "y": float(center[1]), "z": float(center[2])},
+    })
+
+
+def binary_frame(positions, rotation, quantize):
+    points = unique_vertices(positions) @ rotation.T
+    points = points[(points[:, 1] >= 0) & (points[:, 1] <= 100)]
+    offset_points = points - points.mean(axis=0)
+    return encode_points(offset_points, quantize=quantize)
+
+
+def measure(function, frames):
+    outputs = []
+    started = time.perf_counter()
+    for positions in frames:
+        outputs.append(function(positions))
+    return (time.perf_counter() - started) / len(frames), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lidar browser stream benchmark")
+    parser.add_argument("--corpus", help="Corpus recorded with record_lidar_fixtures.py")
+    parser.add_argument("--frames", type=int, default=20, help="Synthetic frames when no corpus is given")
+    args = parser.parse_args()
+
+    messages = read_corpus(args.corpus) if args.corpus else synthetic_corpus(args.frames)
+    decoder = UnifiedLidarDecoder("libvoxel")
+    frames = []
+    for message in messages:
+        header, compressed = parse_lidar_message(message)
+        frames.append(decoder.decode(compressed, header["data"])["positions"].copy())
+
+    rotation_x, rotation_z = rotation_matrices()
+    rotation = (rotation_z @ rotation_x).astype(np.float32)
+    legacy_time, legacy = measure(legacy_frame, frames)
+    float_time, floats = measure(lambda positions: binary_frame(positions, rotation, False), frames)
+    int16_time, int16s = measure(lambda positions: binary_frame(positions, rotation, True), frames)
+
+    mismatches = 0
+    for legacy_json, (float_data, *_), (int16_data, _, scale) in zip(legacy, floats, int16s):
+        expected = np.array(json.loads(legacy_json)["points"], dtype=np.float32).reshape(-1, 3)
+        if not (np.allclose(decode_points(float_data), expected, atol=1e-4)
+                and np.allclose(decode_points(int16_data, "int16", scale), expected, atol=scale)):
+            mismatches += 1
+
+    print(f"frames : {len(frames)} from {args.corpus or 'synthetic data'}, "
+          f"{np.mean([len(positions) // 3 for positions in frames]):.0f} vertices per frame")
+    print(f"{'stream':<8} {'ms/frame':>9} {'KB/frame':>9}")
+    for name, seconds, outputs in (("json", legacy_time, legacy), ("float32", float_time, floats),
+                                   ("int16", int16_time, int16s)):
+        sizes = [len(output) if name == "json" else len(output[0]) for output in outputs]
+        print(f"{name:<8} {seconds * 1e3:9.2f} {np.mean(sizes) / 1e3:9.0f}")
+    print(f"parity : {'ok' if not mismatches else f'{mismatches} mismatching frames'}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+"""
+Compare the vectorized bits_to_points() of the native lidar decoder with the
+previous per-byte/per-bit Python loop, and check that both produce the same
+points in the same order.
+
+Usage: python native_decoder_benchmark.py [--frames 20] [--occupied 3000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.lidar_decoder_native import bits_to_points, decompress
+from sample_messages import voxel_map_frame
+
+
+def legacy_bits_to_points(buf, origin, resolution=0.05):
+    """bits_to_points() as it was before vectorization."""
+    buf = np.frombuffer(bytearray(buf), dtype=np.uint8)
+    nonzero_indices = np.nonzero(buf)[0]
+    points = []
+
+    for n in nonzero_indices:
+        byte_value = buf[n]
+        z = n // 0x800
+        n_slice = n % 0x800
+        y = n_slice // 0x10
+        x_base = (n_slice % 0x10) * 8
+
+        for bit_pos in range(8):
+            if byte_value & (1 << (7 - bit_pos)):
+                x = x_base + bit_pos
+                points.append((x,y,z))
+
+    return np.array(points) * resolution + origin
+
+
+def measure(function, frames):
+    started = time.perf_counter()
+    for buf, metadata in frames:
+        function(buf, metadata["origin"], metadata["resolution"])
+    return (time.perf_counter() - started) / len(frames) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Native lidar decoder benchmark")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--occupied", type=int, default=3000, help="Non-zero bytes per frame")
+    args = parser.parse_args()
+
+    frames = []
+    for seed in range(args.frames):
+        compressed, metadata = voxel_map_frame(seed, args.occupied)
+        frames.append((decompress(compressed, metadata["src_size"]), metadata))
+
+    # Parity: same points, same order, float32 instead of float64
+    mismatches = 0
+    for buf, metadata in frames:
+        expected = legacy_bits_to_points(buf, metadata["origin"], metadata["resolution"])
+        points = bits_to_points(buf, metadata["origin"], metadata["resolution"])
+        if (points.dtype != np.float32 or points.shape != expected.shape
+                or not np.allclose(points, expected, atol=1e-5)):
+            mismatches += 1
+    print(f"parity    : {'ok' if not mismatches else f'{mismatches} mismatching frames'} "
+          f"({len(frames)} frames, {len(points)} points in the last one)")
+
+    legacy_time = measure(legacy_bits_to_points, frames)
+    current_time = measure(bits_to_points, frames)
+    print(f"legacy    : {legacy_time:7.2f} ms/frame")
+    print(f"vectorized: {current_time:7.2f} ms/frame")
+    print(f"speedup   : {legacy_time / current_time:.1f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
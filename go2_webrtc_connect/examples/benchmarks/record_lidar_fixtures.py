@@ -0,0 +1,61 @@
+"""
+Record rt/utlidar/voxel_map_compressed messages from a Go2 into a corpus file
+for lidar_decode_benchmark.py. The raw data channel messages are stored
+unchanged, so the benchmark sees exactly what the robot sends.
+
+Usage: python record_lidar_fixtures.py --ip 192.168.8.181 --frames 100 --output voxel_map.corpus
+"""
+
+import argparse
+import asyncio
+import logging
+
+from go2_webrtc_driver.webrtc_driver import Go2WebRTCConnection, WebRTCConnectionMethod
+from go2_webrtc_driver.constants import RTC_TOPIC
+from lidar_fixtures import is_lidar_message, parse_lidar_message, write_corpus
+
+logging.basicConfig(level=logging.FATAL)
+
+
+async def record(ip, frame_count):
+    conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, ip=ip)
+    await conn.connect()
+    await conn.datachannel.disableTrafficSaving(True)
+    conn.datachannel.pub_sub.publish_without_callback(RTC_TOPIC["ULIDAR_SWITCH"], "on")
+
+    messages = []
+    done = asyncio.get_event_loop().create_future()
+
+    # Capture the raw bytes next to the driver's own message handler
+    @conn.datachannel.channel.on("message")
+    def on_message(message):
+        if not is_lidar_message(message) or done.done():
+            return
+        header, _ = parse_lidar_message(message)
+        if header.get("topic") == RTC_TOPIC["ULIDAR_ARRAY"]:
+            messages.append(message)
+            print(f"\rRecorded {len(messages)}/{frame_count}", end="", flush=True)
+            if len(messages) >= frame_count:
+                done.set_result(None)
+
+    conn.datachannel.pub_sub.subscribe(RTC_TOPIC["ULIDAR_ARRAY"], lambda message: None)
+    await done
+    print()
+    await conn.disconnect()
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record lidar benchmark fixtures")
+    parser.add_argument("--ip", default="192.168.8.181")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--output", default="voxel_map.corpus")
+    args = parser.parse_args()
+
+    messages = asyncio.run(record(args.ip, args.frames))
+    write_corpus(args.output, messages)
+    print(f"Wrote {len(messages)} messages to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Representative data channel messages for the offline benchmarks.
+
+The layouts mirror what the Go2 sends on rt/lf/lowstate and rt/lf/sportmodestate
+(see examples/data_channel/lowstate and sportmodestate) and the payload of
+rt/utlidar/voxel_map_compressed; values are randomised but deterministic so
+runs are comparable.
+"""
+
+import json
+import random
+
+import lz4.block
+import numpy as np
+
+from go2_webrtc_driver.constants import DATA_CHANNEL_TYPE, RTC_TOPIC
+
+
+def _floats(rng, n, scale=1.0):
+    return [round(rng.uniform(-scale, scale), 6) for _ in range(n)]
+
+
+def lowstate_message(seed=0):
+    rng = random.Random(seed)
+    return {
+        "type": DATA_CHANNEL_TYPE["MSG"],
+        "topic": RTC_TOPIC["LOW_STATE"],
+        "data": {
+            "imu_state": {"rpy": _floats(rng, 3, 3.14)},
+            "motor_state": [
+                {
+                    "q": round(rng.uniform(-2.5, 2.5), 6),
+                    "temperature": rng.randint(25, 60),
+                    "lost": rng.randint(0, 3),
+                    "reserve": [0, rng.randint(0, 600)],
+                }
+                for _ in range(20)
+            ],
+            "bms_state": {
+                "version_high": 1,
+                "version_low": 18,
+                "soc": rng.randint(10, 100),
+                "current": rng.randint(-9000, 2000),
+                "cycle": rng.randint(0, 200),
+                "bq_ntc": [rng.randint(25, 40), rng.randint(25, 40)],
+                "mcu_ntc": [rng.randint(25, 40), rng.randint(25, 40)],
+            },
+            "foot_force": [rng.randint(0, 200) for _ in range(4)],
+            "temperature_ntc1": rng.randint(30, 60),
+            "power_v": round(rng.uniform(24.0, 33.6), 6),
+        },
+    }
+
+
+def sportmodestate_message(seed=0):
+    rng = random.Random(seed)
+    return {
+        "type": DATA_CHANNEL_TYPE["MSG"],
+        "topic": RTC_TOPIC["LF_SPORT_MOD_STATE"],
+        "data": {
+            "stamp": {"sec": 1738000000 + seed, "nanosec": rng.randint(0, 999999999)},
+            "error_code": 0,
+            "imu_state": {
+                "quaternion": _floats(rng, 4),
+                "gyroscope": _floats(rng, 3, 4.0),
+                "accelerometer": _floats(rng, 3, 12.0),
+                "rpy": _floats(rng, 3, 3.14),
+                "temperature": rng.randint(30, 60),
+            },
+            "mode": 1,
+            "progress": 0,
+            "gait_type": 1,
+            "foot_raise_height": 0.08,
+            "position": _floats(rng, 3, 5.0),
+            "body_height": round(rng.uniform(0.25, 0.35), 6),
+            "velocity": _floats(rng, 3, 1.0),
+            "yaw_speed": round(rng.uniform(-1.0, 1.0), 6),
+            "range_obstacle": _floats(rng, 4, 2.0),
+            "foot_force": [rng.randint(0, 200) for _ in range(4)],
+            "foot_position_body": _floats(rng, 12, 0.4),
+            "foot_speed_body": _floats(rng, 12, 0.5),
+        },
+    }
+
+
+def recorded_messages(count=1000):
+    """Interleaved lowstate/sportmodestate messages as they arrive on the wire (JSON text)."""
+    messages = []
+    for i in range(count):
+        message = lowstate_message(i) if i % 2 == 0 else sportmodestate_message(i)
+        messages.append(json.dumps(message))
+    return messages
+
+
+# Voxel map geometry used by the Go2: 128 x 128 x 38 voxels, one bit each
+VOXEL_MAP_WIDTH = [128, 128, 38]
+VOXEL_MAP_SRC_SIZE = 128 * 128 * 38 // 8
+
+
+def voxel_map_frame(seed=0, occupied_bytes=3000):
+    """
+    A synthetic voxel_map_compressed frame: (compressed payload, metadata).
+    occupied_bytes bytes of the bit map are non-zero, giving roughly
+    4 * occupied_bytes points.
+    """
+    rng = np.random.default_rng(seed)
+    voxels = np.zeros(VOXEL_MAP_SRC_SIZE, dtype=np.uint8)
+    indices = rng.choice(voxels.size, occupied_bytes, replace=False)
+    voxels[indices] = rng.integers(1, 256, occupied_bytes)
+
+    compressed = lz4.block.compress(voxels.tobytes(), store_size=False)
+    metadata = {
+        "origin": [-3.2, -3.2, -0.5],
+        "resolution": 0.05,
+        "src_size": VOXEL_MAP_SRC_SIZE,
+        "width": VOXEL_MAP_WIDTH,
+        "stamp": 1738000000.0 + seed * 0.1,
+        "frame_id": "odom",
+    }
+    return compressed, metadata
@@ -0,0 +1,95 @@
+"""
+Query latency of LidarSpatialIndex on a voxel map accumulated from synthetic
+voxel_map_compressed frames, checked against brute force numpy over all points.
+
+Queries: radius (1 m), k-NN (k=10), oriented box (a 2 m x 0.6 m corridor ahead),
+nearest obstacle in a 30 degree heading cone (3 m). Also reports the cost of
+syncing the index after each frame.
+
+Usage: python spatial_index_benchmark.py [--frames 60] [--queries 500]
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from go2_webrtc_driver.lidar.lidar_decoder_native import LidarDecoder
+from go2_webrtc_driver.lidar.spatial_index import LidarSpatialIndex, yaw_to_matrix
+from go2_webrtc_driver.lidar.voxel_map import VoxelMapAccumulator
+from sample_messages import voxel_map_frame
+
+
+def build_map(frame_count):
+    """Accumulate frames of a robot walking along x, syncing the index after each frame."""
+    decoder = LidarDecoder()
+    voxel_map = VoxelMapAccumulator()
+    index = LidarSpatialIndex()
+    sync_times = []
+    for seed in range(frame_count):
+        compressed, metadata = voxel_map_frame(seed)
+        metadata["origin"] = [-3.2 + 0.1 * seed, -3.2, -0.5]
+        points = decoder.decode(compressed, metadata)["points"]
+        voxel_map.integrate(points, metadata)
+
+        started = time.perf_counter()
+        index.sync(voxel_map)
+        sync_times.append(time.perf_counter() - started)
+    return voxel_map, index, sync_times
+
+
+def measure(label, queries, function):
+    started = time.perf_counter()
+    results = [function(query) for query in queries]
+    elapsed = (time.perf_counter() - started) / len(queries) * 1e6
+    print(f"{label:<16}: {elapsed:8.1f} us/query")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lidar spatial index benchmark")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    voxel_map, index, sync_times = build_map(args.frames)
+    points = voxel_map.points()
+    print(f"map: {len(points)} points in {len(index.cells)} cells, "
+          f"sync {np.mean(sync_times) * 1e3:.2f} ms/frame")
+
+    rng = np.random.default_rng(0)
+    low, high = points.min(axis=0), points.max(axis=0)
+    centers = rng.uniform(low, high, (args.queries, 3)).astype(np.float32)
+    yaws = rng.uniform(-math.pi, math.pi, args.queries)
+    queries = list(zip(centers, yaws))
+
+    half_extents = np.array([1.0, 0.3, 0.25], dtype=np.float32)
+    half_angle = math.radians(15)
+
+    radius_results = measure("radius 1 m", queries, lambda q: index.radius(q[0], 1.0))
+    knn_results = measure("k-NN k=10", queries, lambda q: index.nearest(q[0], 10))
+    box_results = measure("oriented box", queries, lambda q: index.oriented_box(q[0], half_extents, q[1]))
+    cone_results = measure("cone 3 m", queries, lambda q: index.nearest_in_cone(q[0], q[1], half_angle, 3.0))
+
+    # Parity with brute force over all points
+    for (center, yaw), found, (knn, knn_distances), box, (cone_point, cone_distance) in zip(
+            queries, radius_results, knn_results, box_results, cone_results):
+        distances = np.linalg.norm(points - center, axis=1)
+        assert len(found) == np.count_nonzero(distances <= 1.0)
+        assert np.allclose(knn_distances, np.sort(distances)[:10], atol=1e-5)
+
+        local = (points - center) @ yaw_to_matrix(yaw).astype(np.float32)
+        assert len(box) == np.count_nonzero(np.all(np.abs(local) <= half_extents, axis=1))
+
+        offsets = points[:, :2] - center[:2]
+        bearing = (np.arctan2(offsets[:, 1], offsets[:, 0]) - yaw + np.pi) % (2 * np.pi) - np.pi
+        in_cone = (distances <= 3.0) & (np.abs(bearing) <= half_angle)
+        expected = distances[in_cone].min() if in_cone.any() else None
+        assert (cone_distance is None) == (expected is None)
+        assert expected is None or math.isclose(cone_distance, expected, abs_tol=1e-5)
+    print("parity          : ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,19 +7,19 @@ VERSION = "1.0.18"
 
 import asyncio
 import logging
-import csv
+import threading
 import numpy as np
-from flask import Flask, render_template_string
+from flask import Flask, render_template_string, request
 from flask_socketio import SocketIO
 from go2_webrtc_driver.webrtc_driver import Go2WebRTCConnection, WebRTCConnectionMethod
+from go2_webrtc_driver.msgs.subscription import KEEP_LATEST
+from go2_webrtc_driver.lidar.lidar_decoder_unified import UnifiedLidarDecoder
+from go2_webrtc_driver.lidar.lidar_recording import LidarRecorder, LidarRecording
+from go2_webrtc_driver.lidar.point_encoding import encode_points, unique_vertices
+from go2_webrtc_driver.lidar.voxel_delta import VoxelDeltaEncoder
+from go2_webrtc_driver.lidar.voxel_lod import VoxelLevels
 import argparse
 from datetime import datetime
-import os
-import sys
-import ast
-
-# Increase the field size limit for CSV reading
-csv.field_size_limit(sys.maxsize)
 
 # Flask app and SocketIO setup
 app = Flask(__name__)
@@ -31,13 +31,8 @@ logging.basicConfig(level=logging.FATAL)
 ENABLE_POINT_CLOUD = True
 SAVE_LIDAR_DATA = True
 
-# File paths
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-LIDAR_CSV_FILE = f"lidar_data_{timestamp}.csv"
-
 # Global variables
-lidar_csv_file = None
-lidar_csv_writer = None
+lidar_recorder = None
 
 lidar_buffer = []
 message_count = 0  # Counter for processed LIDAR messages
@@ -57,16 +52,52 @@ parser = argparse.ArgumentParser(description=f"LIDAR Viz v{VERSION}")
 parser.add_argument("--version", action="version", version=f"LIDAR Viz v{VERSION}")
 parser.add_argument("--cam-center", action="store_true", help="Put Camera at the Center")
 parser.add_argument("--type-voxel", action="store_true", help="Voxel View")
-parser.add_argument("--csv-read", type=str, help="Read from CSV files instead of WebRTC")
-parser.add_argument("--csv-write", action="store_true", help="Write CSV data file")
+parser.add_argument("--replay", type=str, help="Replay a lidar recording instead of WebRTC")
+parser.add_argument("--replay-speed", type=float, default=1.0, help="Replay speed factor, 0 for as fast as possible (default: 1.0)")
+parser.add_argument("--replay-start", type=float, default=0.0, help="Start the replay this many seconds into the recording")
+parser.add_argument("--record", action="store_true", help="Record the lidar frames to a lidar_data_<time>.g2lrec file")
 parser.add_argument("--skip-mod", type=int, default=1, help="Skip messages using modulus (default: 1, no skipping)")
 parser.add_argument('--minYValue', type=int, default=0, help='Minimum Y value for the plot')
 parser.add_argument('--maxYValue', type=int, default=100, help='Maximum Y value for the plot')
+parser.add_argument("--quantize", action="store_true", help="Send int16 instead of float32 coordinates to the browser")
+parser.add_argument("--delta", action="store_true", help="Send only the voxels added or removed since the previous frame")
+parser.add_argument("--keyframe-interval", type=int, default=100, help="Frames between full keyframes with --delta (default: 100)")
+parser.add_argument("--max-lod", type=int, default=4, help="Coarsest level of detail browsers can ask for, in halvings of the resolution (default: 4)")
 args = parser.parse_args()
 
 minYValue = args.minYValue
 maxYValue = args.maxYValue
-SAVE_LIDAR_DATA = args.csv_write
+SAVE_LIDAR_DATA = args.record
+
+# Level of detail of each browser and, with --delta, what it has received (one encoder per level)
+voxel_levels = VoxelLevels(max_level=args.max_lod)
+delta_encoders = {}  # level -> VoxelDeltaEncoder
+stream_lock = threading.Lock()
+
+@socketio.on('connect')
+def handle_connect():
+    with stream_lock:
+        voxel_levels.subscribe(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    with stream_lock:
+        voxel_levels.unsubscribe(request.sid)
+        for encoder in delta_encoders.values():
+            encoder.remove_client(request.sid)
+
+@socketio.on('lidar_view')
+def handle_lidar_view(view):
+    """Level of detail of a browser: a point budget and/or a resolution in meters."""
+    with stream_lock:
+        voxel_levels.subscribe(request.sid, view.get("point_budget"), view.get("resolution"))
+
+@socketio.on('lidar_resync')
+def handle_lidar_resync():
+    with stream_lock:
+        for encoder in delta_encoders.values():
+            if request.sid in encoder.clients:
+                encoder.reset_client(request.sid)
 
 @socketio.on('check_args')
 def handle_check_args():
@@ -80,31 +111,29 @@ def handle_check_args():
     typeFlagBinary = format(typeFlag, "04b")
     socketio.emit("check_args_ack", {"type": typeFlagBinary})
 
-def setup_csv_output():
-    """Set up CSV files for LIDAR output."""
-    global lidar_csv_file, lidar_csv_writer
+def setup_recording(pub_sub):
+    """Record the compressed LIDAR frames, one file per connection."""
+    global lidar_recorder
 
-    if SAVE_LIDAR_DATA:
-        lidar_csv_file = open(LIDAR_CSV_FILE, mode='w', newline='', encoding='utf-8')
-        lidar_csv_writer = csv.writer(lidar_csv_file)
-        lidar_csv_writer.writerow(['stamp', 'frame_id', 'resolution', 'src_size', 'origin', 'width', 
-                                   'point_count', 'positions'])
-        lidar_csv_file.flush()  # Ensure the header row is flushed to disk
+    if SAVE_LIDAR_DATA and lidar_recorder is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        lidar_recorder = LidarRecorder(f"lidar_data_{timestamp}.g2lrec")
+        lidar_recorder.subscribe(pub_sub)
 
-def close_csv_output():
-    """Close CSV files."""
-    global lidar_csv_file
+def close_recording():
+    """Write the pending frames and the frame index."""
+    global lidar_recorder
 
-    if lidar_csv_file:
-        lidar_csv_file.close()
-        lidar_csv_file = None
+    if lidar_recorder:
+        lidar_recorder.close()
+        lidar_recorder = None
 
 def filter_points(points, percentage):
     """Filter points to skip plotting points within a certain percentage of distance to each other."""
     return points  # No filtering
 
-def rotate_points(points, x_angle, z_angle):
-    """Rotate points around the x and z axes by given angles."""
+def rotation_matrix(x_angle, z_angle):
+    """Rotation around the x axis, then around the z axis."""
     rotation_matrix_x = np.array([
         [1, 0, 0],
         [0, np.cos(x_angle), -np.sin(x_angle)],
@@ -117,9 +146,78 @@ def rotate_points(points, x_angle, z_angle):
         [0, 0, 1]
     ])
     
-    points = points @ rotation_matrix_x.T
-    points = points @ rotation_matrix_z.T
-    return points
+    # Rounded so that e.g. cos(pi / 2) is exactly 0 and points on the y bounds stay on them
+    return np.round(rotation_matrix_z @ rotation_matrix_x, 12).astype(np.float32)
+
+ROTATION = rotation_matrix(ROTATE_X_ANGLE, ROTATE_Z_ANGLE)
+
+def emit_lidar_frame(positions, metadata):
+    """Rotate, filter and center the points of a decoded frame and send each browser its level of detail."""
+    total_points = len(positions) // 3
+    unique_points = unique_vertices(positions)
+
+    rotated = unique_points @ ROTATION.T
+    in_range = (rotated[:, 1] >= minYValue) & (rotated[:, 1] <= maxYValue)
+
+    # Vertices are relative to the frame window, which moves with the robot: shift
+    # them to world voxel coordinates so that the coarser levels and the deltas
+    # do not change when the window moves
+    origin = np.rint(np.asarray(metadata["origin"]) / metadata["resolution"]).astype(np.int64)
+    world_vertices = unique_points[in_range].astype(np.int64) + origin
+    center = world_vertices.mean(axis=0) @ ROTATION.T if len(world_vertices) else np.zeros(3)
+
+    with stream_lock:
+        voxel_levels.resolution = metadata["resolution"]
+        voxel_levels.update(world_vertices)
+        groups = voxel_levels.clients_by_level()
+        if args.delta:
+            messages = delta_messages(groups, center)
+        else:
+            messages = [("lidar_data", sid, points_message(level, center))
+                        for level, sids in groups.items() for sid in sids]
+    for event, sid, message in messages:
+        socketio.emit(event, message, to=sid)
+    return total_points, len(unique_points)
+
+def points_message(level, center):
+    """Points of a level of detail, centered, as a binary attachment; built once per frame and level."""
+    def build():
+        # The browser colors the points by distance
+        points = voxel_levels.points(level) @ ROTATION.T - center
+        data, encoding, scale = encode_points(points, quantize=args.quantize)
+        return {
+            "points": data,
+            "encoding": encoding,
+            "scale": scale,
+            "count": len(points),
+            "voxel_size": 1 << level,
+            "center": {"x": float(center[0]), "y": float(center[1]), "z": float(center[2])}
+        }
+    return voxel_levels.cached(level, "message", build)
+
+def delta_messages(groups, center):
+    """Keyframes and deltas bringing each browser to the current frame at its level of detail."""
+    messages = []
+    for level, sids in groups.items():
+        encoder = delta_encoders.get(level)
+        if encoder is None:
+            encoder = delta_encoders[level] = VoxelDeltaEncoder(keyframe_interval=args.keyframe_interval)
+        encoder.update(voxel_levels.voxels(level))
+        transform = {
+            "rotation": ROTATION.ravel().tolist(),
+            "center": {"x": float(center[0]), "y": float(center[1]), "z": float(center[2])},
+            "scale": 1 << level,
+        }
+
+        for sid in sids:
+            # A browser keeps its place in the encoders of the levels it left, so coming
+            # back to one of them costs a delta from the frame it still holds there
+            if sid not in encoder.clients:
+                encoder.add_client(sid)
+            message = encoder.message(sid)
+            if message is not None:
+                messages.append(("lidar_delta", sid, {**message, **transform}))
+    return messages
 
 async def lidar_webrtc_connection():
     """Connect to WebRTC and process LIDAR data."""
@@ -146,8 +244,8 @@ async def lidar_webrtc_connection():
             # Turn LIDAR sensor on
             conn.datachannel.pub_sub.publish_without_callback("rt/utlidar/switch", "on")
 
-            # Set up CSV outputs
-            setup_csv_output()
+            # Record the raw frames
+            setup_recording(conn.datachannel.pub_sub)
 
             async def lidar_callback_task(message):
                 """Task to process incoming LIDAR data."""
@@ -161,65 +259,30 @@ async def lidar_webrtc_connection():
                         return
 
                     positions = message["data"]["data"].get("positions", [])
-                    origin = message["data"].get("origin", [])
-                    points = np.array([positions[i:i+3] for i in range(0, len(positions), 3)], dtype=np.float32)
-                    total_points = len(points)
-                    unique_points = np.unique(points, axis=0)
-
-                    # Save to CSV
-                    if SAVE_LIDAR_DATA and lidar_csv_writer:
-                        lidar_csv_writer.writerow([
-                            message["data"]["stamp"],
-                            message["data"]["frame_id"],
-                            message["data"]["resolution"],
-                            message["data"]["src_size"],
-                            message["data"]["origin"],
-                            message["data"]["width"],
-                            len(unique_points),
-                            unique_points.tolist()  # Save full data
-                        ])
-                        lidar_csv_file.flush()  # Flush data to disk
-
-                    points = rotate_points(unique_points, ROTATE_X_ANGLE, ROTATE_Z_ANGLE)  # Rotate points
-                    points = points[(points[:, 1] >= minYValue) & (points[:, 1] <= maxYValue)]
-
-                    # Calculate center coordinates
-                    center_x = float(np.mean(points[:, 0]))
-                    center_y = float(np.mean(points[:, 1]))
-                    center_z = float(np.mean(points[:, 2]))
-
-                    # Offset points by center coordinates
-                    offset_points = points - np.array([center_x, center_y, center_z])
+                    total_points, unique_count = emit_lidar_frame(positions, message["data"])
 
                     # Count and log points
                     message_count += 1
-                    print(f"LIDAR Message {message_count}: Total points={total_points}, Unique points={len(unique_points)}")
-
-                    # Emit data to Socket.IO
-                    scalars = np.linalg.norm(offset_points, axis=1)  # Color by distance
-                    socketio.emit("lidar_data", {
-                        "points": offset_points.tolist(),
-                        "scalars": scalars.tolist(),
-                        "center": {"x": center_x, "y": center_y, "z": center_z}
-                    })
+                    print(f"LIDAR Message {message_count}: Total points={total_points}, Unique points={unique_count}")
 
                 except Exception as e:
                     logging.error(f"Error in LIDAR callback: {e}")
 
-            # Subscribe to LIDAR voxel map messages
-            conn.datachannel.pub_sub.subscribe(
+            # Subscribe to LIDAR voxel map messages. Only the newest frame is kept
+            # while the previous one is processed, so a slow frame never piles up tasks.
+            lidar_subscription = conn.datachannel.pub_sub.subscribe_queue(
                 "rt/utlidar/voxel_map_compressed",
-                lambda message: asyncio.create_task(lidar_callback_task(message))
+                policy=KEEP_LATEST
             )
 
-            # Keep the connection active
-            while True:
-                await asyncio.sleep(1)
+            # Process frames for as long as the connection is active
+            async for message in lidar_subscription:
+                await lidar_callback_task(message)
 
         except Exception as e:
             logging.error(f"An error occurred: {e}")
             logging.info(f"Reconnecting in {reconnect_interval} seconds... (Attempt {retry_attempts + 1}/{MAX_RETRY_ATTEMPTS})")
-            close_csv_output()
+            close_recording()
             try:
                 await conn.disconnect()
             except Exception as e:
@@ -229,73 +292,37 @@ async def lidar_webrtc_connection():
 
     logging.error("Max retry attempts reached. Exiting.")
 
-async def read_csv_and_emit(csv_file):
-    """Continuously read CSV files and emit data without delay."""
+async def replay_and_emit(path):
+    """Replay a lidar recording in a loop, paced by the frame stamps."""
     global message_count
 
-    # checkArgs()
-
-    while True:  # Infinite loop to restart at EOF
-        try:
-            total_messages = sum(1 for _ in open(csv_file)) - 1  # Calculate total messages
-
-            with open(csv_file, mode='r', newline='', encoding='utf-8') as lidar_file:
-                lidar_reader = csv.DictReader(lidar_file)
-
-                for lidar_row in lidar_reader:
-                    if message_count % args.skip_mod == 0:
-                        try:
-                            # Extract and validate positions
-                            positions = ast.literal_eval(lidar_row.get("positions", "[]"))
-                            if isinstance(positions, list) and all(isinstance(item, list) and len(item) == 3 for item in positions):
-                                points = np.array(positions, dtype=np.float32)
-                            else:
-                                points = np.array([item for item in positions if isinstance(item, list) and len(item) == 3], dtype=np.float32)
-
-                            # Extract and compute origin, resolution, width, and center
-                            origin = np.array(eval(lidar_row.get("origin", "[]")), dtype=np.float32)
-                            resolution = float(lidar_row.get("resolution", 0.05))
-                            width = np.array(eval(lidar_row.get("width", "[128, 128, 38]")), dtype=np.float32)
-                            center = origin + (width * resolution) / 2
-
-                            # Process points
-                            if points.size > 0:
-                                points = rotate_points(points, ROTATE_X_ANGLE, ROTATE_Z_ANGLE)
-                                points = points[(points[:, 1] >= minYValue) & (points[:, 1] <= maxYValue)]
-                                unique_points = np.unique(points, axis=0)
-                                # Calculate center coordinates
-                                center_x = float(np.mean(unique_points[:, 0]))
-                                center_y = float(np.mean(unique_points[:, 1]))
-                                center_z = float(np.mean(unique_points[:, 2]))
-
-                                # Offset points by center coordinates
-                                offset_points = unique_points - np.array([center_x, center_y, center_z])
-                            else:
-                                unique_points = np.empty((0, 3), dtype=np.float32)
-                                offset_points = unique_points
-
-                            # Emit data to Socket.IO
-                            scalars = np.linalg.norm(offset_points, axis=1)
-                            socketio.emit("lidar_data", {
-                                "points": offset_points.tolist(),
-                                "scalars": scalars.tolist(),
-                                "center": {"x": center_x, "y": center_y, "z": center_z}
-                            })
-
-                            # Print message details
-                            print(f"LIDAR Message {message_count}/{total_messages}: Unique points={len(unique_points)}")
-
-                        except Exception as e:
-                            logging.error(f"Exception during processing: {e}")
-
-                    # Increment message count
-                    message_count += 1
-
-            # Restart file reading when EOF is reached
-            message_count = 0  # Reset counter if needed
-
-        except Exception as e:
-            logging.error(f"Error reading CSV file: {e}")
+    decoder = UnifiedLidarDecoder()
+    with LidarRecording(path) as recording:
+        print(f"Replaying {len(recording)} frames ({recording.duration:.1f} s) at {args.replay_speed}x")
+        start = recording.seek(args.replay_start)
+
+        while True:  # Infinite loop to restart at EOF
+            replayed = 0
+            async for index, metadata, compressed in recording.replay(args.replay_speed or None, start=start):
+                replayed += 1
+                if message_count % args.skip_mod == 0:
+                    try:
+                        positions = decoder.decode(compressed, metadata).get("positions", [])
+                        total_points, unique_count = emit_lidar_frame(positions, metadata)
+                        print(f"LIDAR Message {index + 1}/{len(recording)}: Unique points={unique_count}")
+                    except Exception as e:
+                        logging.error(f"Exception during processing: {e}")
+
+                # Increment message count
+                message_count += 1
+
+            if not replayed:
+                logging.error("No frames to replay in %s", path)
+                return
+
+            # Restart from the beginning when EOF is reached
+            start = 0
+            message_count = 0
 
 @app.route("/")
 def index():
@@ -359,6 +386,12 @@ def index():
                                                                                                                               
                     socket.on("connect", () => {
                         console.log("Socket connected...");
+                        // Level of detail, e.g. http://127.0.0.1:8080/?budget=20000 or ?resolution=0.2
+                        const params = new URLSearchParams(window.location.search);
+                        socket.emit("lidar_view", {
+                            point_budget: parseInt(params.get("budget")) || null,
+                            resolution: parseFloat(params.get("resolution")) || null
+                        });
                         pollArgs();
                     });
                                   
@@ -390,49 +423,69 @@ def index():
                         if (!data.handled) {
                             data.handled = true; // Prevent re-triggering
                             console.log("Received LIDAR data");
-                            const points = data.points || [];
-                            const scalars = data.scalars || [];
-
-                            if (pointCloudEnable > 0) {
-                                if (pointCloud) scene.remove(pointCloud);
-                                if (voxelMesh) {
-                                    scene.remove(voxelMesh);
-                                    voxelMesh = null;
-                                }
-
-                                const geometry = new THREE.BufferGeometry();
-                                const vertices = new Float32Array(points.flat());
-                                geometry.setAttribute('position', new THREE.BufferAttribute(vertices, 3));
-
-                                const colors = new Float32Array(scalars.length * 3);
-                                const maxScalar = Math.max.apply(null, scalars);
-                                scalars.forEach((scalar, i) => {
-                                    const color = new THREE.Color();
-                                    color.setHSL(scalar / maxScalar, 1.0, 0.5);
-                                    colors.set([color.r, color.g, color.b], i * 3);
-                                });
-
-                                geometry.setAttribute('color', new THREE.BufferAttribute(colors, 3));
-
-                                const material = new THREE.PointsMaterial({ size: 0.3, vertexColors: true });
-                                pointCloud = new THREE.Points(geometry, material);
-
-                                scene.add(pointCloud);
-                            } else {
-                                if (voxelMesh) scene.remove(voxelMesh);
-                                voxelMesh = createVoxelMesh(points, scalars, voxelSize, Infinity);
-                                if (voxelMesh instanceof THREE.Object3D) {
-                                    scene.add(voxelMesh);
-                                }
-                                // Remove any existing point cloud
-                                if (pointCloud) {
-                                    scene.remove(pointCloud);
-                                    pointCloud = null;
-                                }
-                            }
+                            renderPoints(decodePoints(data), data.count, data.voxel_size);
                         }
                     });
 
+                    // Handle LIDAR keyframes and deltas (--delta)
+                    socket.on("lidar_delta", (data) => {
+                        const voxels = applyDelta(data);
+                        if (voxels) {
+                            renderPoints(transformVoxels(voxels, data.rotation, data.center, data.scale), voxels.count, data.scale);
+                        } else {
+                            socket.emit("lidar_resync");
+                        }
+                    });
+
+                    function renderPoints(points, count, cellSize) {
+                        const scalars = new Float32Array(count);
+                        let maxScalar = 0;
+                        for (let i = 0; i < count; i++) {
+                            // Color by distance to the center
+                            const scalar = Math.hypot(points[i * 3], points[i * 3 + 1], points[i * 3 + 2]);
+                            scalars[i] = scalar;
+                            if (scalar > maxScalar) maxScalar = scalar;
+                        }
+
+                        if (pointCloudEnable > 0) {
+                            if (pointCloud) scene.remove(pointCloud);
+                            if (voxelMesh) {
+                                scene.remove(voxelMesh);
+                                voxelMesh = null;
+                            }
+
+                            const geometry = new THREE.BufferGeometry();
+                            geometry.setAttribute('position', new THREE.BufferAttribute(points, 3));
+
+                            const colors = new Float32Array(scalars.length * 3);
+                            const color = new THREE.Color();
+                            for (let i = 0; i < scalars.length; i++) {
+                                color.setHSL(scalars[i] / maxScalar, 1.0, 0.5);
+                                colors[i * 3] = color.r;
+                                colors[i * 3 + 1] = color.g;
+                                colors[i * 3 + 2] = color.b;
+                            }
+
+                            geometry.setAttribute('color', new THREE.BufferAttribute(colors, 3));
+
+                            const material = new THREE.PointsMaterial({ size: 0.3, vertexColors: true });
+                            pointCloud = new THREE.Points(geometry, material);
+
+                            scene.add(pointCloud);
+                        } else {
+                            if (voxelMesh) scene.remove(voxelMesh);
+                            voxelMesh = createVoxelMesh(points, scalars, maxScalar, voxelSize * cellSize, Infinity);
+                            if (voxelMesh instanceof THREE.Object3D) {
+                                scene.add(voxelMesh);
+                            }
+                            // Remove any existing point cloud
+                            if (pointCloud) {
+                                scene.remove(pointCloud);
+                                pointCloud = null;
+                            }
+                        }
+                    }
+
                     function animate() {
                         requestAnimationFrame(animate);
                         controls.update();
@@ -445,6 +498,93 @@ def index():
                 init();
             });
 
+            /**
+            * Rebuilds the (x, y, z) * count Float32Array of a binary lidar_data message.
+            */
+            function decodePoints(data) {
+                if (data.encoding === "int16") {
+                    const quantized = new Int16Array(data.points);
+                    const points = new Float32Array(quantized.length);
+                    for (let i = 0; i < quantized.length; i++) {
+                        points[i] = quantized[i] * data.scale;
+                    }
+                    return points;
+                }
+                return new Float32Array(data.points);
+            }
+
+            /**
+            * Voxels received as keyframes and deltas, in cell coordinates, one set per
+            * level of detail (cell size) so that returning to a level continues from it.
+            * Removed voxels are replaced by the last one to keep the array packed.
+            */
+            const voxelLevels = new Map();
+
+            /** Applies a keyframe or delta; returns the voxels of its level, or null if a message was missed. */
+            function applyDelta(data) {
+                let voxels = voxelLevels.get(data.scale);
+                if (voxels === undefined) {
+                    voxels = { version: null, count: 0, coords: new Int32Array(0), index: new Map() };
+                    voxelLevels.set(data.scale, voxels);
+                }
+                if (data.type === "keyframe") {
+                    voxels.count = 0;
+                    voxels.index.clear();
+                } else if (data.base !== voxels.version) {
+                    return null;  // Missed a message, ask for a keyframe
+                }
+
+                const ArrayType = data.encoding === "int16" ? Int16Array : Int32Array;
+                const removed = new ArrayType(data.removed);
+                for (let i = 0; i < removed.length; i += 3) {
+                    const key = removed[i] + "," + removed[i + 1] + "," + removed[i + 2];
+                    const index = voxels.index.get(key);
+                    if (index === undefined) continue;
+                    voxels.index.delete(key);
+                    const last = --voxels.count;
+                    if (index !== last) {
+                        voxels.coords.copyWithin(index * 3, last * 3, last * 3 + 3);
+                        const c = voxels.coords;
+                        voxels.index.set(c[index * 3] + "," + c[index * 3 + 1] + "," + c[index * 3 + 2], index);
+                    }
+                }
+
+                const added = new ArrayType(data.added);
+                if ((voxels.count * 3 + added.length) > voxels.coords.length) {
+                    const coords = new Int32Array(Math.ceil((voxels.count * 3 + added.length) * 1.5));
+                    coords.set(voxels.coords.subarray(0, voxels.count * 3));
+                    voxels.coords = coords;
+                }
+                for (let i = 0; i < added.length; i += 3) {
+                    const key = added[i] + "," + added[i + 1] + "," + added[i + 2];
+                    if (voxels.index.has(key)) continue;
+                    voxels.index.set(key, voxels.count);
+                    voxels.coords.set(added.subarray(i, i + 3), voxels.count * 3);
+                    voxels.count++;
+                }
+
+                voxels.version = data.version;
+                return voxels.count === data.count ? voxels : null;
+            }
+
+            /**
+            * Rotates the voxels (cells of scale voxels per edge) and moves their center
+            * to the origin, like lidar_data points.
+            */
+            function transformVoxels(voxels, rotation, center, scale) {
+                const [r0, r1, r2, r3, r4, r5, r6, r7, r8] = rotation;
+                const points = new Float32Array(voxels.count * 3);
+                const c = voxels.coords;
+                const offset = (scale - 1) / 2;
+                for (let i = 0; i < voxels.count * 3; i += 3) {
+                    const x = c[i] * scale + offset, y = c[i + 1] * scale + offset, z = c[i + 2] * scale + offset;
+                    points[i] = r0 * x + r1 * y + r2 * z - center.x;
+                    points[i + 1] = r3 * x + r4 * y + r5 * z - center.y;
+                    points[i + 2] = r6 * x + r7 * y + r8 * z - center.z;
+                }
+                return points;
+            }
+
             function pollArgs() {
                 pollingInterval = setInterval(() => {
                     socket.emit('check_args');
@@ -454,7 +594,7 @@ def index():
             /**
             * Creates a voxel mesh from point data and scalar data.
             */
-            function createVoxelMesh(points, scalars, voxelSize, maxVoxelsToShow = Infinity) {
+            function createVoxelMesh(points, scalars, maxScalar, voxelSize, maxVoxelsToShow = Infinity) {
                 const geometry = new THREE.BufferGeometry();
 
                 try {
@@ -481,8 +621,7 @@ def index():
                         1, 2, 6, 6, 5, 1  // Right
                     ];
 
-                    const maxVoxels = Math.min(maxVoxelsToShow, points.length);
-                    const maxScalar = Math.max(...scalars);
+                    const maxVoxels = Math.min(maxVoxelsToShow, scalars.length);
 
                     // Typed arrays for better performance
                     const positions = new Float32Array(maxVoxels * 8 * 3); // 8 vertices * 3 coords per voxel
@@ -494,9 +633,9 @@ def index():
                     let indexOffset = 0;
 
                     for (let i = 0; i < maxVoxels; i++) {
-                        const centerX = points[i][0];
-                        const centerY = points[i][1];
-                        const centerZ = points[i][2];
+                        const centerX = points[i * 3];
+                        const centerY = points[i * 3 + 1];
+                        const centerZ = points[i * 3 + 2];
 
                         // Compute color based on scalar
                         const normalizedScalar = scalars[i] / maxScalar;
@@ -568,12 +707,14 @@ def start_webrtc():
     loop.run_until_complete(lidar_webrtc_connection())
 
 if __name__ == "__main__":
-    import threading
-    if args.csv_read:
-        csv_thread = threading.Thread(target=lambda: asyncio.run(read_csv_and_emit(args.csv_read)), daemon=True)
-        csv_thread.start()
+    if args.replay:
+        replay_thread = threading.Thread(target=lambda: asyncio.run(replay_and_emit(args.replay)), daemon=True)
+        replay_thread.start()
     else:
         webrtc_thread = threading.Thread(target=start_webrtc, daemon=True)
         webrtc_thread.start()
 
-    socketio.run(app, host="127.0.0.1", port=8080, debug=False)
+    try:
+        socketio.run(app, host="127.0.0.1", port=8080, debug=False)
+    finally:
+        close_recording()
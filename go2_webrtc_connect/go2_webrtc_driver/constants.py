@@ -23,6 +23,21 @@ class WebRTCConnectionMethod(Enum):
     LocalSTA = 2
     Remote = 3
 
+class WebRTCIcePolicy(Enum):
+    HostOnly = 1    # Host candidates only, no STUN/TURN gathering
+    HostStun = 2    # Host + server reflexive candidates through the public STUN server
+    Relay = 3       # TURN relay candidates only
+    All = 4         # Race host, reflexive and relay candidates
+
+# ICE policy used when Go2WebRTCConnection is created without icePolicy
+DEFAULT_ICE_POLICY = {
+    WebRTCConnectionMethod.LocalAP: WebRTCIcePolicy.HostOnly,
+    WebRTCConnectionMethod.LocalSTA: WebRTCIcePolicy.HostOnly,
+    WebRTCConnectionMethod.Remote: WebRTCIcePolicy.All,
+}
+
+STUN_SERVER_URL = "stun:stun.l.google.com:19302"
+
 app_error_messages = {
     "app_error_code_100_1": "DDS message timeout",
     "app_error_code_100_10": "Battery communication error",
@@ -0,0 +1,59 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibJsonCodec:
+    """JSON codec backed by the standard library."""
+
+    name = "json"
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj)
+
+
+class OrjsonCodec:
+    """
+    Parses with orjson and serializes with the standard library. Outgoing messages
+    are rare compared to the incoming state streams, and keeping json.dumps makes
+    the bytes sent to the robot identical to the stdlib codec.
+    """
+
+    name = "orjson"
+
+    @staticmethod
+    def loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN/Infinity and integers beyond 64 bits, the stdlib doesn't
+            return json.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        return json.dumps(obj)
+
+
+JSON_CODECS = {"json": StdlibJsonCodec}
+if orjson is not None:
+    JSON_CODECS["orjson"] = OrjsonCodec
+
+
+def get_json_codec(name=None):
+    """
+    Return a codec by name ("orjson" or "json"). Without a name, orjson is used
+    when it is installed and the standard library otherwise.
+    """
+    if name is None:
+        return OrjsonCodec if orjson is not None else StdlibJsonCodec
+    if name not in JSON_CODECS:
+        raise ValueError(f"Invalid JSON codec. Choose one of: {', '.join(JSON_CODECS)}.")
+    return JSON_CODECS[name]
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .lidar_decoder_unified import UnifiedLidarDecoder
+
+# One decoder per worker thread/process: wasmtime stores must not be shared
+_worker_state = threading.local()
+
+
+def _decode_in_worker(decoder_type, compressed_data, metadata, debug_info=False, output_buffers=0):
+    decoder = getattr(_worker_state, "decoder", None)
+    if decoder is None:
+        decoder = _worker_state.decoder = UnifiedLidarDecoder(
+            decoder_type=decoder_type, debug_info=debug_info, output_buffers=output_buffers
+        )
+    return decoder.decode(compressed_data, metadata)
+
+
+class LidarDecodePool:
+    """
+    Decodes lidar frames on a thread or process pool so the event loop keeps
+    serving acks and heartbeats. At most max_in_flight frames are pending.
+    When a new frame arrives at the limit, the oldest pending frame that no
+    worker has started yet is cancelled in its favour, so the pool falls behind
+    on old frames rather than on the latest one; when every pending frame is
+    already being decoded, the new frame is dropped. Results are delivered in
+    arrival order, and a frame whose stamp is not newer than the last delivered
+    one is dropped as stale.
+    """
+
+    def __init__(self, decoder_type="libvoxel", workers=2, executor="thread", max_in_flight=None,
+                 debug_info=False, output_buffers=0):
+        """
+        :param decoder_type: "libvoxel" or "native".
+        :param workers: Number of worker threads/processes.
+        :param executor: "thread" or "process".
+        :param max_in_flight: Frames pending at most (defaults to workers).
+        :param debug_info: Compile the libvoxel module with debug info.
+        :param output_buffers: Reused output frame buffers per worker (see UnifiedLidarDecoder).
+        """
+        if executor == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lidar-decode")
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError("Invalid executor. Choose 'thread' or 'process'.")
+
+        self.decoder_type = decoder_type
+        self.debug_info = debug_info
+        self.output_buffers = output_buffers
+        self.workers = workers
+        self.executor_type = executor
+        self.max_in_flight = max_in_flight or workers
+        self.in_flight = OrderedDict()  # sequence -> (message, future), in arrival order
+        self.sequence = 0
+        self.last_stamp = None
+        self.delivered = 0
+        self.superseded = 0
+        self.dropped = 0
+        self.stale = 0
+
+    def submit(self, message, deliver):
+        """
+        Decode message['data'] (a LazyDecodedData) in the pool and call
+        deliver(message) with the decoded payload set once it is its turn.
+
+        :return: False if the frame was dropped because every pending frame is being decoded.
+        """
+        if len(self.in_flight) >= self.max_in_flight and not self._supersede_oldest():
+            self.dropped += 1
+            return False
+
+        data = message["data"]
+        future = self.executor.submit(
+            _decode_in_worker, self.decoder_type, data.compressed_data, dict(data.metadata),
+            self.debug_info, self.output_buffers,
+        )
+
+        self.sequence += 1
+        self.in_flight[self.sequence] = (message, future)
+        asyncio.wrap_future(future).add_done_callback(lambda _: self._deliver_ready(deliver))
+        return True
+
+    def _supersede_oldest(self):
+        # Frames being decoded run to completion, so frames keep coming out while
+        # new ones arrive faster than they are decoded
+        for sequence, (_, future) in self.in_flight.items():
+            if future.cancel():
+                del self.in_flight[sequence]
+                self.superseded += 1
+                return True
+        return False
+
+    def _deliver_ready(self, deliver):
+        # Deliver every completed frame at the head of the queue, keeping arrival order
+        while self.in_flight:
+            sequence, (message, future) = next(iter(self.in_flight.items()))
+            if not future.done():
+                break
+            del self.in_flight[sequence]
+
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None:
+                logging.error("Lidar decoding failed", exc_info=error)
+                continue
+
+            data = message["data"]
+            stamp = data.get("stamp")
+            if stamp is not None and self.last_stamp is not None and stamp <= self.last_stamp:
+                self.stale += 1
+                continue
+            self.last_stamp = stamp
+
+            data["data"] = future.result()
+            self.delivered += 1
+            try:
+                deliver(message)
+            except Exception:
+                logging.error("Error delivering decoded lidar frame", exc_info=True)
+
+    def get_stats(self):
+        return {
+            "in_flight": len(self.in_flight),
+            "delivered": self.delivered,
+            "superseded": self.superseded,
+            "dropped": self.dropped,
+            "stale": self.stale,
+        }
+
+    def close(self):
+        """Drop the frames in flight and shut the workers down."""
+        for _, future in self.in_flight.values():
+            future.cancel()
+        self.in_flight.clear()
+        self.executor.shutdown(wait=False)
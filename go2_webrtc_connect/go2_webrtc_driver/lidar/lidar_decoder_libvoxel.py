@@ -21,23 +21,90 @@
 
 import math
 import ctypes
+import hashlib
+import logging
+import threading
 import numpy as np
 import os
+from importlib import metadata
 
 from wasmtime import Config, Engine, Store, Module, Instance, Func, FuncType
 from wasmtime import ValType
 
+WASM_PATH = os.path.join(os.path.dirname(__file__), "libvoxel.wasm")
 
-class LidarDecoder:
-    def __init__(self) -> None:
+# Compiled modules are cached here; set GO2_WEBRTC_CACHE_DIR to "" to disable the cache
+CACHE_DIR = os.getenv("GO2_WEBRTC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "go2_webrtc_connect"))
+
+# (debug_info, cache_dir) -> (engine, module), shared by the decoders of a process
+_compiled_modules = {}
+_compile_lock = threading.Lock()
+
+
+def _cache_path(wasm, debug_info, cache_dir):
+    # Serialized modules only load into the wasmtime version and config that compiled them
+    try:
+        wasmtime_version = metadata.version("wasmtime")
+    except metadata.PackageNotFoundError:
+        wasmtime_version = "unknown"
+    digest = hashlib.sha256(wasm)
+    digest.update(f"{wasmtime_version} debug_info={debug_info}".encode())
+    return os.path.join(cache_dir, f"libvoxel-{digest.hexdigest()[:16]}.cwasm")
+
+
+def load_module(debug_info=False, cache_dir=CACHE_DIR):
+    """
+    Return the (engine, module) of libvoxel.wasm. The module is compiled once
+    per process, and serialized to cache_dir so later runs only deserialize it.
+
+    :param debug_info: Compile with DWARF debug info (slower to compile).
+    :param cache_dir: Directory of the compiled module cache, or None/"" to always compile.
+    """
+    key = (debug_info, cache_dir)
+    with _compile_lock:
+        if key in _compiled_modules:
+            return _compiled_modules[key]
 
         config = Config()
         config.wasm_multi_value = True
-        config.debug_info = True
-        self.store = Store(Engine(config))
+        config.debug_info = debug_info
+        engine = Engine(config)
+
+        module = None
+        if cache_dir:
+            with open(WASM_PATH, "rb") as wasm_file:
+                path = _cache_path(wasm_file.read(), debug_info, cache_dir)
+            if os.path.exists(path):
+                try:
+                    module = Module.deserialize_file(engine, path)
+                except Exception:
+                    logging.warning("Ignoring unusable compiled module cache %s", path, exc_info=True)
+
+        if module is None:
+            module = Module.from_file(engine, WASM_PATH)
+            if cache_dir:
+                try:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    # Write next to the target and rename so readers never see a partial file
+                    temp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(temp_path, "wb") as cache_file:
+                        cache_file.write(module.serialize())
+                    os.replace(temp_path, path)
+                except OSError:
+                    logging.warning("Could not write compiled module cache %s", path, exc_info=True)
+
+        _compiled_modules[key] = (engine, module)
+        return engine, module
 
-        wasm_path = os.path.join(os.path.dirname(__file__), "libvoxel.wasm")
-        self.module = Module.from_file(self.store.engine, wasm_path)
+
+class LidarDecoder:
+    def __init__(self, debug_info=False, cache_dir=CACHE_DIR) -> None:
+        """
+        :param debug_info: Compile libvoxel.wasm with debug info.
+        :param cache_dir: Directory of the compiled module cache, or None to always compile.
+        """
+        engine, self.module = load_module(debug_info, cache_dir)
+        self.store = Store(engine)
 
         self.a_callback_type = FuncType([ValType.i32()], [ValType.i32()])
         self.b_callback_type = FuncType([ValType.i32(), ValType.i32(), ValType.i32()], [])
@@ -66,7 +133,11 @@ class LidarDecoder:
         self.HEAPF32 = (ctypes.c_float * (self.memory_size // 4)).from_address(self.buffer_ptr)
         self.HEAPF64 = (ctypes.c_double * (self.memory_size // 8)).from_address(self.buffer_ptr)
 
+        # numpy view over the linear memory for bulk reads and writes
+        self.heap = np.ctypeslib.as_array(self.HEAPU8)
+
         self.input = self.malloc(self.store, 61440)
+        self.inputSize = 61440
         self.decompressBuffer = self.malloc(self.store, 80000)
         self.positions = self.malloc(self.store, 2880000)
         self.uvs = self.malloc(self.store, 1920000)
@@ -76,17 +147,18 @@ class LidarDecoder:
         self.pointCount = self.malloc(self.store, 4)
         self.decompressBufferSize = 80000
 
+        # Bytes allocated for the outputs of the last decoded frame
+        self.last_allocated_bytes = 0
+
     def adjust_memory_size(self, t):
         return len(self.HEAPU8)
 
     def copy_within(self, target, start, end):
-        # Copy the sublist for the specified range [start:end]
-        sublist = self.HEAPU8[start:end]
-
-        # Replace elements in the list starting from index 'target'
-        for i in range(len(sublist)):
-            if target + i < len(self.HEAPU8):
-                self.HEAPU8[target + i] = sublist[i]
+        # Bytes that would land past the end of the memory are dropped
+        length = min(end - start, self.memory_size - target)
+        if length > 0:
+            # memmove handles overlapping regions like Uint8Array.copyWithin
+            ctypes.memmove(self.buffer_ptr + target, self.buffer_ptr + start, length)
     
     def copy_memory_region(self, t, n, a):
         self.copy_within(t, n, n + a)
@@ -110,13 +182,31 @@ class LidarDecoder:
             raise ValueError(f"invalid type for getValue: {n}")
         
     def add_value_arr(self, start, value):
-        if start + len(value) <= len(self.HEAPU8):
-            for i, byte in enumerate(value):
-                self.HEAPU8[start + i] = byte
+        if start + len(value) <= self.memory_size:
+            self.heap[start:start + len(value)] = np.frombuffer(value, dtype=np.uint8)
         else:
             raise ValueError("Not enough space to insert bytes at the specified index.")
 
-    def decode(self, compressed_data, data):
+    def read_bytes(self, start, length, dtype=np.uint8, out=None, name=None):
+        """
+        Copy `length` bytes out of the wasm memory, into the named array of the
+        LidarFrameBuffer `out` if given, or into a new numpy array otherwise.
+        """
+        source = self.heap[start:start + length].view(dtype)
+        if out is None:
+            self.last_allocated_bytes += length
+            return source.copy()
+        target = out.get(name, source.shape, dtype)
+        np.copyto(target, source)
+        return target
+
+    def decode(self, compressed_data, data, out=None):
+        """
+        :param out: LidarFrameBuffer to write the outputs into instead of allocating
+                    new arrays. The returned arrays are views of it.
+        """
+        if len(compressed_data) > self.inputSize:
+            raise ValueError(f"Compressed lidar frame of {len(compressed_data)} bytes exceeds the {self.inputSize} byte input buffer")
         self.add_value_arr(self.input, compressed_data)
 
         some_v = math.floor(data["origin"][2] / data["resolution"])
@@ -140,17 +230,14 @@ class LidarDecoder:
         c = self.get_value(self.pointCount, "i32")
         u = self.get_value(self.faceCount, "i32")
 
-        positions_slice = self.HEAPU8[self.positions:self.positions + u * 12]
-        positions_copy = bytearray(positions_slice)
-        p = np.frombuffer(positions_copy, dtype=np.uint8)
-
-        uvs_slice = self.HEAPU8[self.uvs:self.uvs + u * 8]
-        uvs_copy = bytearray(uvs_slice)
-        r = np.frombuffer(uvs_copy, dtype=np.uint8)
-
-        indices_slice = self.HEAPU8[self.indices:self.indices + u * 24]
-        indices_copy = bytearray(indices_slice)
-        o = np.frombuffer(indices_copy, dtype=np.uint32)
+        # One copy per output: the wasm buffers are reused by the next frame
+        self.last_allocated_bytes = 0
+        allocated_before = out.allocated_bytes if out is not None else 0
+        p = self.read_bytes(self.positions, u * 12, out=out, name="positions")
+        r = self.read_bytes(self.uvs, u * 8, out=out, name="uvs")
+        o = self.read_bytes(self.indices, u * 24, np.uint32, out=out, name="indices")
+        if out is not None:
+            self.last_allocated_bytes = out.allocated_bytes - allocated_before
 
         return {
             "point_count": c,
@@ -29,33 +29,51 @@ def decompress(compressed_data, decomp_size):
     )
     return decompressed
 
-def bits_to_points(buf, origin, resolution=0.05):
-    buf = np.frombuffer(bytearray(buf), dtype=np.uint8)
-    nonzero_indices = np.nonzero(buf)[0]
-    points = []
+def bits_to_points(buf, origin, resolution=0.05, out=None):
+    """
+    Convert the voxel occupancy bits into an (N, 3) float32 array of points,
+    written into the LidarFrameBuffer `out` when given.
 
-    for n in nonzero_indices:
-        byte_value = buf[n]
-        z = n // 0x800
-        n_slice = n % 0x800
-        y = n_slice // 0x10
-        x_base = (n_slice % 0x10) * 8
+    Every byte holds 8 voxels along x (most significant bit first); a row has
+    128 voxels (16 bytes) and a z slice 128 rows, so the position of a set bit
+    follows from its index in the unpacked bit array.
+    """
+    buf = np.frombuffer(buf, dtype=np.uint8)
+    # The map is sparse: only unpack the non-zero bytes
+    nonzero_bytes = np.flatnonzero(buf)
+    byte_rows, bit_positions = np.nonzero(np.unpackbits(buf[nonzero_bytes, None], axis=1))
+    indices = nonzero_bytes[byte_rows] * 8 + bit_positions
 
-        for bit_pos in range(8):
-            if byte_value & (1 << (7 - bit_pos)):
-                x = x_base + bit_pos
-                points.append((x,y,z))
+    if out is None:
+        points = np.empty((indices.size, 3), dtype=np.float32)
+    else:
+        points = out.get("points", (indices.size, 3), np.float32)
+    points[:, 0] = indices & 0x7F
+    points[:, 1] = (indices >> 7) & 0x7F
+    points[:, 2] = indices >> 14
 
-    return np.array(points) * resolution + origin
+    points *= np.float32(resolution)
+    points += np.asarray(origin, dtype=np.float32)
+    return points
 
 class LidarDecoder:
-    def decode(self, compressed_data, data):
-        def points():
-            decompressed = decompress(compressed_data, data["src_size"])
-            points = bits_to_points(decompressed, data["origin"], data["resolution"])
-            return points
+    def __init__(self):
+        # Bytes allocated for the outputs of the last decoded frame
+        self.last_allocated_bytes = 0
+
+    def decode(self, compressed_data, data, out=None):
+        """
+        :param out: LidarFrameBuffer to write the points into instead of a new array.
+        """
+        allocated_before = out.allocated_bytes if out is not None else 0
+        decompressed = decompress(compressed_data, data["src_size"])
+        points = bits_to_points(decompressed, data["origin"], data["resolution"], out)
+        if out is None:
+            self.last_allocated_bytes = points.nbytes
+        else:
+            self.last_allocated_bytes = out.allocated_bytes - allocated_before
 
         return {
-                "points": points(),
+                "points": points,
                 # "raw": compressed_data,
         }
@@ -1,33 +1,144 @@
+from collections.abc import MutableMapping
+
 from .lidar_decoder_libvoxel import LidarDecoder as LibVoxelDecoder
 from .lidar_decoder_native import LidarDecoder as NativeDecoder
+from .lidar_frame_buffers import LidarFrameBufferPool
+
+
+class LazyDecodedData(MutableMapping):
+    """
+    The 'data' mapping of a binary lidar message. It holds the metadata
+    (origin, resolution, ...) together with the compressed payload, and only
+    decodes the payload when the 'data' entry is first read. It is not a dict,
+    so dict(), {**data} and == go through __getitem__ and see the decoded
+    payload. compressed_data stays available after decoding, e.g. for
+    recording the frame.
+    """
+
+    def __init__(self, metadata, compressed_data, decoder):
+        self.metadata = dict(metadata)  # Every entry but 'data'
+        self.metadata.pop("data", None)
+        self.compressed_data = compressed_data
+        self.decoder = decoder
+        self.decoded = False
+        self._data = None
+
+    def decode(self):
+        """Decode the payload now (no-op if already decoded) and return it."""
+        if not self.decoded:
+            self._data = self.decoder.decode(self.compressed_data, self.metadata)
+            self.decoded = True
+        return self._data
+
+    def __getitem__(self, key):
+        if key == "data":
+            return self.decode()
+        return self.metadata[key]
+
+    def __setitem__(self, key, value):
+        if key == "data":
+            self._data = value
+            self.decoded = True
+        else:
+            self.metadata[key] = value
+
+    def __delitem__(self, key):
+        if key == "data":
+            raise KeyError("The 'data' entry of a lidar message cannot be removed")
+        del self.metadata[key]
+
+    def __contains__(self, key):
+        # Without decoding, unlike Mapping.__contains__
+        return key == "data" or key in self.metadata
+
+    def __iter__(self):
+        yield from self.metadata
+        yield "data"
+
+    def __len__(self):
+        return len(self.metadata) + 1
+
+    def __repr__(self):
+        return f"LazyDecodedData({self.metadata!r}, {'decoded' if self.decoded else 'not decoded'})"
+
+    def __reduce__(self):
+        # The decoder does not pickle; a decoded plain dict does
+        return dict, (self.copy(),)
+
+    def copy(self):
+        """A plain dict of the entries, with the payload decoded."""
+        return dict(self)
 
 
 class UnifiedLidarDecoder:
-    def __init__(self, decoder_type="libvoxel"):
+    def __init__(self, decoder_type="libvoxel", debug_info=False, output_buffers=0):
         """
         Initialize the UnifiedLidarDecoder with the specified decoder type.
+        The decoder itself is created on first use (see load()).
 
         :param decoder_type: The type of decoder to use ("libvoxel" or "native").
                              Defaults to "libvoxel".
+        :param debug_info: Compile the libvoxel module with debug info.
+        :param output_buffers: Decode into a ring of this many reused frame buffers
+                               instead of allocating new arrays per frame. A decoded
+                               frame is overwritten `output_buffers` frames later.
         """
         if decoder_type == "libvoxel":
-            self.decoder = LibVoxelDecoder()
             self.decoder_name = "LibVoxelDecoder"
         elif decoder_type == "native":
-            self.decoder = NativeDecoder()
             self.decoder_name = "NativeDecoder"
         else:
             raise ValueError("Invalid decoder type. Choose 'libvoxel' or 'native'.")
+        self.decoder_type = decoder_type
+        self.debug_info = debug_info
+        self.decoder = None
+        self.buffer_pool = LidarFrameBufferPool(output_buffers) if output_buffers else None
+        self.frames = 0
+        self.allocated_bytes = 0
+
+    def load(self):
+        """Create the decoder now (compiling or loading the wasm module for libvoxel)."""
+        if self.decoder is None:
+            if self.decoder_type == "libvoxel":
+                self.decoder = LibVoxelDecoder(debug_info=self.debug_info)
+            else:
+                self.decoder = NativeDecoder()
+        return self.decoder
 
-    def decode(self, compressed_data, metadata):
+    def decode(self, compressed_data, metadata, out=None):
         """
         Decode the compressed data using the selected decoder.
 
         :param compressed_data: The compressed data to decode.
         :param metadata: Metadata required for decoding (e.g., origin, resolution).
+        :param out: LidarFrameBuffer to decode into; defaults to the next buffer of
+                    the output ring when output_buffers is set.
         :return: Decoded result from the selected decoder.
         """
-        return self.decoder.decode(compressed_data, metadata)
+        decoder = self.decoder or self.load()
+        if out is None and self.buffer_pool:
+            out = self.buffer_pool.next()
+        result = decoder.decode(compressed_data, metadata, out)
+        self.frames += 1
+        self.allocated_bytes += decoder.last_allocated_bytes
+        return result
+
+    def get_stats(self):
+        """Frames decoded and bytes allocated for their outputs."""
+        return {
+            "frames": self.frames,
+            "allocated_bytes": self.allocated_bytes,
+            "allocated_bytes_per_frame": self.allocated_bytes / self.frames if self.frames else 0,
+            "last_allocated_bytes": self.decoder.last_allocated_bytes if self.decoder else 0,
+        }
+
+    def decode_lazy(self, compressed_data, metadata):
+        """
+        Wrap the compressed data and its metadata without decoding it yet.
+
+        :return: LazyDecodedData whose 'data' entry decodes on first access.
+        """
+        return LazyDecodedData(metadata, compressed_data, self)
 
     def get_decoder_name(self):
         """
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class LidarFrameBuffer:
+    """
+    Output arrays of one decoded lidar frame, reused across frames. Arrays only
+    grow (with headroom) when a frame needs more room than any frame before, so
+    in steady state decoding writes into existing memory.
+    """
+
+    def __init__(self, headroom=1.25):
+        self.headroom = headroom
+        self.arrays = {}  # name -> flat numpy array
+        self.allocated_bytes = 0  # Bytes allocated over the buffer's lifetime
+
+    def get(self, name, shape, dtype):
+        """Return a view of `shape` over the named array, growing it if needed."""
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        array = self.arrays.get(name)
+        if array is None or array.dtype != dtype or array.size < count:
+            array = self.arrays[name] = np.empty(int(count * self.headroom) or 1, dtype=dtype)
+            self.allocated_bytes += array.nbytes
+        return array[:count].reshape(shape)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+class LidarFrameBufferPool:
+    """
+    Ring of `frames` LidarFrameBuffers handed out in turn. A decoded frame stays
+    valid until `frames` more frames have been decoded, so consumers must copy
+    what they keep longer than that.
+    """
+
+    def __init__(self, frames=3):
+        if frames < 1:
+            raise ValueError("frames must be at least 1")
+        self.buffers = [LidarFrameBuffer() for _ in range(frames)]
+        self.position = 0
+
+    def next(self):
+        buffer = self.buffers[self.position]
+        self.position = (self.position + 1) % len(self.buffers)
+        return buffer
+
+    @property
+    def allocated_bytes(self):
+        return sum(buffer.allocated_bytes for buffer in self.buffers)
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers)
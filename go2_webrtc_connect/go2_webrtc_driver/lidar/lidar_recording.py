@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from ..constants import RTC_TOPIC
+
+# File layout:
+#   FILE_MAGIC
+#   frame * N:  FRAME_HEADER (stamp, metadata length, payload length) | metadata JSON | compressed payload
+#   frame index: INDEX_DTYPE * N
+#   FOOTER (index offset, frame count, INDEX_MAGIC)
+# A recording that was not closed has no index; it is rebuilt by scanning the frames.
+FILE_MAGIC = b"G2LREC01"
+INDEX_MAGIC = b"G2LRIDX1"
+FRAME_HEADER = struct.Struct("<dII")
+FOOTER = struct.Struct("<QQ8s")
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("stamp", "<f8")])
+
+
+class LidarRecorder:
+    """
+    Records rt/utlidar/voxel_map_compressed frames to a binary file: the
+    compressed payload as received plus its metadata, so nothing is decoded or
+    converted while recording. Frames are buffered and written one chunk of
+    chunk_frames at a time; a frame index is appended on close().
+    """
+
+    def __init__(self, path, chunk_frames=32):
+        """
+        :param path: Output file, overwritten if it exists.
+        :param chunk_frames: Frames buffered in memory before they are written.
+        """
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.file = open(path, "wb")
+        self.file.write(FILE_MAGIC)
+        self.offset = len(FILE_MAGIC)
+        self.chunk = []  # Pending frame parts
+        self.chunk_length = 0  # Pending frames
+        self.index = []  # (offset, stamp) per frame
+        self.bytes_written = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def subscribe(self, pub_sub):
+        """
+        Record every lidar frame received by a pub/sub. Frames are recorded as they
+        arrive, so those later dropped by a busy decode pool are recorded too.
+        """
+        pub_sub.subscribe(RTC_TOPIC["ULIDAR_ARRAY"], self.on_lidar, raw=True)
+
+    def unsubscribe(self, pub_sub):
+        pub_sub.unsubscribe(RTC_TOPIC["ULIDAR_ARRAY"], self.on_lidar)
+
+    def on_lidar(self, message):
+        data = message["data"]
+        compressed = getattr(data, "compressed_data", None)
+        if compressed is None:
+            logging.warning("Lidar frame without its compressed payload, not recorded")
+            return
+        self.write(compressed, data.metadata)
+
+    def write(self, compressed, metadata, stamp=None):
+        """
+        Append one frame.
+
+        :param compressed: The compressed voxel payload.
+        :param metadata: The frame's metadata (origin, resolution, width, stamp, ...).
+        :param stamp: Frame time in seconds, defaults to metadata['stamp'].
+        """
+        if self.file is None:
+            raise ValueError("Recording is closed")
+        if stamp is None:
+            stamp = metadata.get("stamp")
+        if stamp is None:
+            stamp = time.time()
+
+        header = json.dumps(metadata, separators=(",", ":")).encode()
+        self.chunk.append(FRAME_HEADER.pack(stamp, len(header), len(compressed)))
+        self.chunk.append(header)
+        self.chunk.append(compressed)
+        self.chunk_length += 1
+        self.index.append((self.offset, stamp))
+        self.offset += FRAME_HEADER.size + len(header) + len(compressed)
+
+        if self.chunk_length >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        if self.chunk:
+            data = b"".join(self.chunk)
+            self.file.write(data)
+            self.bytes_written += len(data)
+            self.chunk = []
+            self.chunk_length = 0
+        self.file.flush()
+
+    def close(self):
+        """Write the pending frames and the frame index."""
+        if self.file is None:
+            return
+        self.flush()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.write(FOOTER.pack(self.offset, len(self.index), INDEX_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class LidarRecording:
+    """
+    Memory-mapped reader of a LidarRecorder file. Frames are read on demand, so
+    opening a long recording is instant and any frame can be accessed directly.
+
+    recording[i] returns (metadata, compressed payload); decode it with a
+    UnifiedLidarDecoder. replay() paces the frames by their stamps. Opening a
+    file that is not a recording or holds no frame raises ValueError.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < len(FILE_MAGIC):
+            self.file.close()
+            raise ValueError(f"{path} is not a lidar recording")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a lidar recording")
+
+        self.index = self._read_index()
+        if self.index is None:
+            logging.warning("%s has no frame index (recording not closed), scanning frames", path)
+            self.index = self._scan_index()
+        if not len(self.index):
+            self.close()
+            raise ValueError(f"{path} has no frames")
+        self.stamps = self.index["stamp"]
+        self.position = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, index):
+        """(metadata, compressed payload) of frame `index`."""
+        offset = int(self.index["offset"][index])
+        _, header_length, payload_length = FRAME_HEADER.unpack_from(self.map, offset)
+        start = offset + FRAME_HEADER.size
+        metadata = json.loads(self.map[start:start + header_length])
+        start += header_length
+        return metadata, self.map[start:start + payload_length]
+
+    @property
+    def duration(self):
+        return float(self.stamps[-1] - self.stamps[0])
+
+    def index_at(self, stamp):
+        """Index of the first frame at or after stamp."""
+        return min(int(np.searchsorted(self.stamps, stamp)), len(self) - 1)
+
+    def seek(self, seconds):
+        """Move the replay position to `seconds` after the first frame."""
+        self.position = self.index_at(self.stamps[0] + seconds)
+        return self.position
+
+    def frames(self, start=None, stop=None):
+        """Iterate (index, metadata, compressed) from start (default: the seek position)."""
+        start = self.position if start is None else start
+        for index in range(start, len(self) if stop is None else min(stop, len(self))):
+            self.position = index + 1
+            yield (index, *self[index])
+
+    async def replay(self, speed=1.0, start=None, stop=None):
+        """
+        Async iterator over (index, metadata, compressed), paced like the original
+        recording. speed=2.0 replays twice as fast; speed=None as fast as possible.
+        """
+        started = None
+        for index, metadata, compressed in self.frames(start, stop):
+            if speed:
+                stamp = self.stamps[index]
+                if started is None:
+                    started, first_stamp = time.monotonic(), stamp
+                delay = started + (stamp - first_stamp) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)  # Let the event loop run between frames
+            yield index, metadata, compressed
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def _read_index(self):
+        size = len(self.map)
+        if size < len(FILE_MAGIC) + FOOTER.size:
+            return None
+        index_offset, count, magic = FOOTER.unpack_from(self.map, size - FOOTER.size)
+        if magic != INDEX_MAGIC or index_offset + count * INDEX_DTYPE.itemsize != size - FOOTER.size:
+            return None
+        return np.frombuffer(self.map, dtype=INDEX_DTYPE, count=count, offset=index_offset).copy()
+
+    def _scan_index(self):
+        index = []
+        offset = len(FILE_MAGIC)
+        size = len(self.map)
+        while offset + FRAME_HEADER.size <= size:
+            stamp, header_length, payload_length = FRAME_HEADER.unpack_from(self.map, offset)
+            end = offset + FRAME_HEADER.size + header_length + payload_length
+            if end > size:
+                break  # Truncated last frame
+            index.append((offset, stamp))
+            offset = end
+        return np.array(index, dtype=INDEX_DTYPE)
@@ -0,0 +1,53 @@
+import numpy as np
+
+# Largest int16 value, used to quantize coordinates
+INT16_MAX = 32767
+
+
+def unique_vertices(positions):
+    """
+    Unique (N, 3) float32 vertices of a libvoxel mesh, sorted like np.unique(axis=0).
+
+    The mesh positions are uint8 voxel corners, so each vertex is packed into
+    one integer and deduplicated in 1-D, which is much faster than np.unique
+    on rows. Other inputs fall back to np.unique.
+    """
+    positions = np.asarray(positions)
+    vertices = positions.reshape(-1, 3)
+    if positions.dtype != np.uint8:
+        return np.unique(vertices.astype(np.float32), axis=0)
+
+    wide = vertices.astype(np.uint32)
+    keys = np.unique((wide[:, 0] << 16) | (wide[:, 1] << 8) | wide[:, 2])
+    unique = np.empty((len(keys), 3), dtype=np.float32)
+    unique[:, 0] = keys >> 16
+    unique[:, 1] = (keys >> 8) & 0xFF
+    unique[:, 2] = keys & 0xFF
+    return unique
+
+
+def encode_points(points, quantize=False):
+    """
+    Pack (N, 3) points into bytes for a binary Socket.IO attachment.
+
+    :param quantize: Send int16 coordinates (half the size) scaled to the largest
+                     coordinate instead of float32.
+    :return: (bytes, encoding, scale); a client rebuilds the points as
+             Float32Array(bytes) or Int16Array(bytes) * scale.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    if not quantize:
+        return points.tobytes(), "float32", 1.0
+
+    extent = float(np.abs(points).max()) if len(points) else 0.0
+    scale = extent / INT16_MAX if extent else 1.0
+    return np.rint(points / scale).astype(np.int16).tobytes(), "int16", scale
+
+
+def decode_points(data, encoding="float32", scale=1.0):
+    """Inverse of encode_points, returns (N, 3) float32 points."""
+    if encoding == "int16":
+        return (np.frombuffer(data, dtype=np.int16) * np.float32(scale)).reshape(-1, 3)
+    if encoding == "float32":
+        return np.frombuffer(data, dtype=np.float32).reshape(-1, 3)
+    raise ValueError("Invalid encoding. Choose 'float32' or 'int16'.")
@@ -0,0 +1,200 @@
+import itertools
+import math
+
+import numpy as np
+
+
+def yaw_to_matrix(yaw):
+    cos, sin = math.cos(yaw), math.sin(yaw)
+    return np.array([[cos, -sin, 0.0], [sin, cos, 0.0], [0.0, 0.0, 1.0]])
+
+
+class LidarSpatialIndex:
+    """
+    Spatial hash of lidar points for obstacle queries at control-loop rates.
+
+    Points are bucketed in cubic cells of cell_size meters. A query only looks
+    at the cells overlapping its bounding box and filters their points with
+    numpy, so its cost depends on the local point density, not the map size.
+
+    The index is fed either with whole frames (set_points) or incrementally
+    from a VoxelMapAccumulator (sync), which only re-reads the changed blocks.
+    """
+
+    def __init__(self, cell_size=0.8):
+        """
+        :param cell_size: Cell edge in meters. Use the block size of the voxel map
+                          (block_size * resolution, 0.8 m by default) with sync().
+        """
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy, cz) -> (N, 3) float32 points
+        self.version = 0  # Voxel map version the index is synced to
+        self._bounds = None
+
+    def __len__(self):
+        return sum(len(points) for points in self.cells.values())
+
+    # Updates
+
+    def set_points(self, points):
+        """Replace the content of the index with the points of one frame."""
+        points = np.asarray(points, dtype=np.float32)
+        self.cells = {}
+        self._bounds = None
+        if not len(points):
+            return
+
+        keys = np.floor(points / self.cell_size).astype(np.int64)
+        order = np.lexsort(keys.T[::-1])
+        keys, points = keys[order], points[order]
+        starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+        for key, cell_points in zip(map(tuple, keys[np.r_[0, starts]].tolist()), np.split(points, starts)):
+            self.cells[key] = cell_points
+
+    def update(self, updated, removed=()):
+        """
+        Replace some cells.
+
+        :param updated: Dict of cell key -> (N, 3) points.
+        :param removed: Keys of cells that no longer hold points.
+        """
+        for key in removed:
+            self.cells.pop(key, None)
+        for key, points in updated.items():
+            if len(points):
+                self.cells[key] = points
+            else:
+                self.cells.pop(key, None)
+        self._bounds = None
+
+    def sync(self, voxel_map):
+        """Apply the blocks a VoxelMapAccumulator changed since the last sync."""
+        block_extent = voxel_map.block_size * voxel_map.resolution
+        if not math.isclose(block_extent, self.cell_size):
+            raise ValueError(f"cell_size must match the voxel map block extent ({block_extent} m)")
+
+        updated, removed = voxel_map.changes_since(self.version)
+        self.update({key: voxel_map.block_points(key) for key in updated}, removed)
+        self.version = voxel_map.version
+
+    # Queries
+
+    def points_in_box(self, low, high):
+        """Points of the cells overlapping the axis aligned box [low, high] (not filtered)."""
+        low_cell = np.floor(np.asarray(low) / self.cell_size).astype(np.int64).tolist()
+        high_cell = np.floor(np.asarray(high) / self.cell_size).astype(np.int64).tolist()
+
+        cells = self.cells
+        found = []
+        for key in itertools.product(*(range(l, h + 1) for l, h in zip(low_cell, high_cell))):
+            points = cells.get(key)
+            if points is not None:
+                found.append(points)
+
+        if not found:
+            return np.empty((0, 3), dtype=np.float32)
+        return found[0] if len(found) == 1 else np.concatenate(found)
+
+    def radius(self, center, radius):
+        """Points within `radius` meters of center."""
+        center = np.asarray(center, dtype=np.float32)
+        candidates = self.points_in_box(center - radius, center + radius)
+        offsets = candidates - center
+        return candidates[np.einsum("ij,ij->i", offsets, offsets) <= radius * radius]
+
+    def nearest(self, center, k=1, max_distance=None):
+        """
+        The k points closest to center, nearest first.
+
+        :param max_distance: Ignore points farther than this many meters.
+        :return: (points, distances), possibly fewer than k.
+        """
+        center = np.asarray(center, dtype=np.float32)
+        limit = self._farthest_distance(center) if max_distance is None else max_distance
+
+        search = min(self.cell_size, limit)
+        while True:
+            candidates = self.points_in_box(center - search, center + search)
+            distances = np.linalg.norm(candidates - center, axis=1)
+            within = distances <= search
+            # Only points inside the search sphere are known to be nearer than anything not gathered
+            if np.count_nonzero(within) >= k or search >= limit:
+                break
+            search = min(search * 2, limit)
+
+        candidates, distances = candidates[within], distances[within]
+        if len(distances) > k:
+            closest = np.argpartition(distances, k - 1)[:k]
+            candidates, distances = candidates[closest], distances[closest]
+        order = np.argsort(distances)
+        return candidates[order], distances[order]
+
+    def oriented_box(self, center, half_extents, yaw=0.0, rotation=None):
+        """
+        Points inside a box rotated by yaw around z (or by a 3x3 rotation matrix).
+
+        :param half_extents: Half the box size along its own x, y and z axes.
+        """
+        center = np.asarray(center, dtype=np.float32)
+        half_extents = np.asarray(half_extents, dtype=np.float32)
+        rotation = yaw_to_matrix(yaw) if rotation is None else np.asarray(rotation)
+
+        reach = np.abs(rotation) @ half_extents
+        candidates = self.points_in_box(center - reach, center + reach)
+        local = (candidates - center) @ rotation.astype(np.float32)
+        return candidates[np.all(np.abs(local) <= half_extents, axis=1)]
+
+    def is_clear(self, center, half_extents, yaw=0.0, rotation=None):
+        """Whether no point lies inside the oriented box, e.g. the corridor ahead."""
+        return not len(self.oriented_box(center, half_extents, yaw, rotation))
+
+    def nearest_in_cone(self, apex, heading, half_angle, max_range, z_range=None):
+        """
+        Nearest point within a horizontal heading cone.
+
+        :param apex: Cone apex, e.g. the robot position.
+        :param heading: Cone direction as a yaw angle in radians.
+        :param half_angle: Half opening angle in radians.
+        :param max_range: Maximum distance in meters.
+        :param z_range: Optional (min, max) height band of points to consider.
+        :return: (point, distance), or (None, None) if the cone is empty.
+        """
+        apex = np.asarray(apex, dtype=np.float32)
+
+        # Only visit the cells under the bounding box of the circular sector
+        corners = [(0.0, 0.0)]
+        for angle in (heading - half_angle, heading + half_angle):
+            corners.append((max_range * math.cos(angle), max_range * math.sin(angle)))
+        for axis_angle in (0.0, math.pi / 2, math.pi, -math.pi / 2):
+            if abs((axis_angle - heading + math.pi) % (2 * math.pi) - math.pi) <= half_angle:
+                corners.append((max_range * math.cos(axis_angle), max_range * math.sin(axis_angle)))
+        corners = np.array(corners, dtype=np.float32)
+        z_low, z_high = z_range if z_range is not None else (apex[2] - max_range, apex[2] + max_range)
+        low = np.array([*(apex[:2] + corners.min(axis=0)), z_low])
+        high = np.array([*(apex[:2] + corners.max(axis=0)), z_high])
+        candidates = self.points_in_box(low, high)
+        if z_range is not None:
+            candidates = candidates[(candidates[:, 2] >= z_range[0]) & (candidates[:, 2] <= z_range[1])]
+
+        offsets = candidates - apex
+        distances = np.linalg.norm(offsets, axis=1)
+        horizontal = np.hypot(offsets[:, 0], offsets[:, 1])
+        # Inside the cone when the angle to the heading is at most half_angle
+        along = offsets[:, 0] * math.cos(heading) + offsets[:, 1] * math.sin(heading)
+        inside = (distances <= max_range) & (along >= horizontal * math.cos(half_angle))
+        if not inside.any():
+            return None, None
+
+        distances = np.where(inside, distances, np.inf)
+        closest = np.argmin(distances)
+        return candidates[closest], float(distances[closest])
+
+    def _farthest_distance(self, center):
+        # Distance from center to the far corner of the occupied cells
+        if self._bounds is None:
+            if not self.cells:
+                return 0.0
+            keys = np.array(list(self.cells))
+            self._bounds = (keys.min(axis=0) * self.cell_size, (keys.max(axis=0) + 1) * self.cell_size)
+        low, high = self._bounds
+        return float(np.linalg.norm(np.maximum(np.abs(center - low), np.abs(high - center))))
@@ -0,0 +1,192 @@
+import numpy as np
+
+# Voxel coordinates are packed into one int64 key, KEY_BITS per axis
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+KEY_MASK = (1 << KEY_BITS) - 1
+INT16_RANGE = (-32768, 32767)
+
+
+def pack_voxels(voxels):
+    """int64 keys of (N, 3) integer voxel coordinates (each within +-2^20)."""
+    voxels = np.asarray(voxels, dtype=np.int64) + KEY_OFFSET
+    return (voxels[:, 0] << (2 * KEY_BITS)) | (voxels[:, 1] << KEY_BITS) | voxels[:, 2]
+
+
+def unpack_voxels(keys):
+    """(N, 3) int32 voxel coordinates of keys built by pack_voxels."""
+    keys = np.asarray(keys, dtype=np.int64)
+    voxels = np.empty((len(keys), 3), dtype=np.int32)
+    voxels[:, 0] = (keys >> (2 * KEY_BITS)) - KEY_OFFSET
+    voxels[:, 1] = ((keys >> KEY_BITS) & KEY_MASK) - KEY_OFFSET
+    voxels[:, 2] = (keys & KEY_MASK) - KEY_OFFSET
+    return voxels
+
+
+def unique_keys(keys):
+    """Sorted unique keys. Sorting and dropping repeats is much faster than np.unique on large int64 arrays."""
+    keys = np.sort(keys)
+    if len(keys) < 2:
+        return keys
+    first = np.empty(len(keys), dtype=bool)
+    first[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+    return keys[first]
+
+
+def voxel_encoding(*voxel_arrays):
+    """The smallest of int16 and int32 holding every coordinate of the arrays."""
+    for voxels in voxel_arrays:
+        if len(voxels) and (voxels.min() < INT16_RANGE[0] or voxels.max() > INT16_RANGE[1]):
+            return "int32"
+    return "int16"
+
+
+def decode_voxels(data, encoding="int16"):
+    """(N, 3) int32 voxel coordinates of the added or removed bytes of a message."""
+    if encoding not in ("int16", "int32"):
+        raise ValueError("Invalid encoding. Choose 'int16' or 'int32'.")
+    return np.frombuffer(data, dtype=encoding).astype(np.int32).reshape(-1, 3)
+
+
+class VoxelDeltaClient:
+    """What the encoder has sent to one client."""
+
+    def __init__(self):
+        self.version = None  # Frame version the client holds, None before its first keyframe
+        self.keys = None  # Sorted keys of that frame, shared with the encoder (not copied)
+        self.since_keyframe = 0  # Deltas sent since the last keyframe
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes_sent = 0
+
+
+class VoxelDeltaEncoder:
+    """
+    Sends each client only the voxels added or removed since the frame it
+    already holds, instead of every voxel of every frame.
+
+    update() sets the voxels of the current frame. message() then returns for a
+    client either a keyframe (all voxels: new clients, and every
+    keyframe_interval messages so clients can resynchronize) or a delta from
+    the frame it holds, however many frames it skipped. Deltas from the same
+    frame are computed once and shared by every client at that frame.
+
+    The client must receive every message in order (e.g. over Socket.IO); call
+    reset_client() to send it a keyframe next, e.g. after it reported a gap.
+    """
+
+    def __init__(self, keyframe_interval=100):
+        """
+        :param keyframe_interval: Deltas sent to a client before it gets a keyframe again.
+        """
+        self.keyframe_interval = keyframe_interval
+        self._keys = None  # Sorted unique keys of the current frame
+        self.version = 0
+        self.clients = {}  # client id -> VoxelDeltaClient
+        self._messages = {}  # Base version (None for keyframes) -> message of the current frame
+
+    # Frames
+
+    def update(self, voxels):
+        """
+        Set the voxels of the current frame.
+
+        :param voxels: (N, 3) integer voxel coordinates in a fixed (world) grid, so
+                       that voxels which did not change keep their coordinates.
+        """
+        self.version += 1
+        self._keys = unique_keys(pack_voxels(voxels))
+        self._messages = {}
+
+    @property
+    def keys(self):
+        return self._keys if self._keys is not None else np.empty(0, dtype=np.int64)
+
+    # Clients
+
+    def add_client(self, client_id):
+        self.clients[client_id] = VoxelDeltaClient()
+
+    def remove_client(self, client_id):
+        self.clients.pop(client_id, None)
+
+    def reset_client(self, client_id):
+        """Send the client a keyframe next."""
+        client = self.clients[client_id]
+        client.version = None
+        client.keys = None
+
+    def message(self, client_id):
+        """
+        The message bringing a client to the current frame, or None if it is up to date.
+
+        :return: Dict with type ("keyframe" or "delta"), version, base (the version
+                 a delta applies to), count (voxels of the frame), encoding, added
+                 and removed (voxel coordinate triplets as int16 or int32 bytes).
+        """
+        client = self.clients[client_id]
+        if self._keys is None or client.version == self.version:
+            return None
+
+        if client.keys is None or client.since_keyframe >= self.keyframe_interval:
+            message = self._keyframe()
+            client.keyframes += 1
+            client.since_keyframe = 0
+        else:
+            message = self._delta(client.version, client.keys)
+            client.deltas += 1
+            client.since_keyframe += 1
+
+        client.version = self.version
+        client.keys = self._keys
+        client.bytes_sent += len(message["added"]) + len(message["removed"])
+        return message
+
+    def get_stats(self):
+        return {
+            "version": self.version,
+            "voxels": len(self.keys),
+            "clients": {
+                client_id: {
+                    "version": client.version,
+                    "keyframes": client.keyframes,
+                    "deltas": client.deltas,
+                    "bytes_sent": client.bytes_sent,
+                }
+                for client_id, client in self.clients.items()
+            },
+        }
+
+    def _keyframe(self):
+        message = self._messages.get(None)
+        if message is None:
+            voxels = unpack_voxels(self.keys)
+            encoding = voxel_encoding(voxels)
+            message = self._messages[None] = self._message(
+                "keyframe", None, voxels.astype(encoding).tobytes(), b"", encoding
+            )
+        return message
+
+    def _delta(self, base_version, base_keys):
+        message = self._messages.get(base_version)
+        if message is None:
+            keys = self.keys
+            added = unpack_voxels(np.setdiff1d(keys, base_keys, assume_unique=True))
+            removed = unpack_voxels(np.setdiff1d(base_keys, keys, assume_unique=True))
+            encoding = voxel_encoding(added, removed)
+            message = self._messages[base_version] = self._message(
+                "delta", base_version, added.astype(encoding).tobytes(), removed.astype(encoding).tobytes(), encoding
+            )
+        return message
+
+    def _message(self, message_type, base, added, removed, encoding):
+        return {
+            "type": message_type,
+            "version": self.version,
+            "base": base,
+            "count": len(self.keys),
+            "encoding": encoding,
+            "added": added,
+            "removed": removed,
+        }
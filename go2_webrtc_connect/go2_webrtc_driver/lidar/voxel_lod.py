@@ -0,0 +1,145 @@
+import math
+
+import numpy as np
+
+from .voxel_delta import pack_voxels, unique_keys, unpack_voxels
+
+
+class VoxelLevels:
+    """
+    Levels of detail of a voxel frame for viewers that do not need every point.
+
+    Level n pools the frame into cells of 2**n voxels per edge; a cell is
+    occupied when any of its voxels is. Levels are built on demand from the
+    level below and cached until the next frame, together with anything
+    derived from them (cached()), so every viewer at a level shares the work.
+
+    Viewers subscribe with a point budget (the finest level with at most that
+    many voxels) or a resolution in meters (the finest level at least that
+    coarse); clients_by_level() groups them for the current frame. A viewer
+    with a point budget keeps its level while the voxel count hovers around
+    the budget: it changes level at once only when the count is off by more
+    than margin, and otherwise after patience frames in a row.
+    """
+
+    def __init__(self, resolution=0.05, max_level=4, margin=0.2, patience=5):
+        """
+        :param resolution: Voxel size of the frames (level 0) in meters.
+        :param max_level: Coarsest level, with cells of 2**max_level voxels.
+        :param margin: Fraction of the point budget beyond which a viewer changes level at once.
+        :param patience: Frames in a row another level must fit the budget better before a
+                         viewer within the margin changes to it.
+        """
+        self.resolution = resolution
+        self.max_level = max_level
+        self.margin = margin
+        self.patience = patience
+        self.version = 0
+        self.views = {}  # client id -> (point budget, resolution)
+        self.served = {}  # client id -> [level served, frames in a row another level was due]
+        self._levels = []  # Sorted unique packed voxel keys per built level
+        self._cache = {}  # (level, name) -> value for the current frame
+
+    # Frames
+
+    def update(self, voxels):
+        """
+        Set the voxels of the current frame.
+
+        :param voxels: (N, 3) integer voxel coordinates. Use a fixed (world) grid
+                       so that the coarse cells do not shift with the robot.
+        """
+        self.version += 1
+        self._levels = [unique_keys(pack_voxels(voxels))]
+        self._cache = {}
+
+    def keys(self, level):
+        """Sorted packed keys of the cells of a level (see voxel_delta.pack_voxels)."""
+        if not 0 <= level <= self.max_level:
+            raise ValueError(f"level must be between 0 and {self.max_level}")
+        if not self._levels:
+            return np.empty(0, dtype=np.int64)
+        while len(self._levels) <= level:
+            # Halving the cell coordinates of the level below (floor division by 2)
+            self._levels.append(unique_keys(pack_voxels(unpack_voxels(self._levels[-1]) >> 1)))
+        return self._levels[level]
+
+    def voxels(self, level):
+        """(N, 3) int32 cell coordinates of a level; cell c covers voxels c * 2**level ... (c + 1) * 2**level - 1."""
+        return self.cached(level, "voxels", lambda: unpack_voxels(self.keys(level)))
+
+    def points(self, level):
+        """(N, 3) float32 cell centers of a level, in level 0 voxel units."""
+        scale = 1 << level
+        return self.cached(level, "points", lambda: (self.voxels(level) * scale + (scale - 1) / 2).astype(np.float32))
+
+    def count(self, level):
+        return len(self.keys(level))
+
+    def cached(self, level, name, build):
+        """build() for this level and frame, computed once and shared until the next update()."""
+        key = (level, name)
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    # Viewers
+
+    def subscribe(self, client_id, point_budget=None, resolution=None):
+        """
+        :param point_budget: Largest number of voxels the viewer wants per frame.
+        :param resolution: Coarsest cell size in meters the viewer needs.
+        """
+        self.views[client_id] = (point_budget, resolution)
+        self.served.pop(client_id, None)  # A new view takes effect at once
+
+    def unsubscribe(self, client_id):
+        self.views.pop(client_id, None)
+        self.served.pop(client_id, None)
+
+    def level_for(self, point_budget=None, resolution=None):
+        """The finest level meeting both the resolution and the point budget of the current frame."""
+        level = 0
+        if resolution:
+            level = max(0, math.ceil(math.log2(resolution / self.resolution) - 1e-9))
+        level = min(level, self.max_level)
+        if point_budget:
+            while level < self.max_level and self.count(level) > point_budget:
+                level += 1
+        return level
+
+    def clients_by_level(self):
+        """Level -> ids of the subscribed viewers served from it for the current frame."""
+        groups = {}
+        for client_id, (point_budget, resolution) in self.views.items():
+            groups.setdefault(self._serve(client_id, point_budget, resolution), []).append(client_id)
+        return groups
+
+    def _serve(self, client_id, point_budget, resolution):
+        """The level of a viewer for the current frame, with hysteresis around its point budget."""
+        target = self.level_for(point_budget, resolution)
+        state = self.served.get(client_id)
+        if state is None or not point_budget:
+            self.served[client_id] = [target, 0]
+            return target
+
+        level = state[0]
+        if target == level:
+            state[1] = 0
+            return level
+
+        if target > level:
+            far = self.count(level) > point_budget * (1 + self.margin)
+        else:
+            far = self.count(target) < point_budget * (1 - self.margin)
+        state[1] += 1
+        if far or state[1] >= self.patience:
+            state[:] = [target, 0]
+        return state[0]
+
+    def get_stats(self):
+        return {
+            "version": self.version,
+            "viewers": len(self.views),
+            "levels": {level: len(keys) for level, keys in enumerate(self._levels)},
+        }
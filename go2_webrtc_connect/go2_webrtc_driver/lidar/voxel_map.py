@@ -0,0 +1,284 @@
+import logging
+import time
+from collections import deque
+
+import numpy as np
+
+from ..constants import RTC_TOPIC
+
+# Default voxel map window of rt/utlidar/voxel_map_compressed
+DEFAULT_WINDOW = (128, 128, 38)
+
+
+def quaternion_to_matrix(x, y, z, w):
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+class VoxelBlock:
+    """Dense block_size^3 chunk of the global map."""
+
+    def __init__(self, block_size):
+        self.occupied = np.zeros((block_size, block_size, block_size), dtype=bool)
+        self.last_seen = 0.0  # Stamp of the last frame that observed the block
+        self.version = 0
+        self.points = None  # Cached voxel coordinates, dropped on change
+
+
+class VoxelMapAccumulator:
+    """
+    Global voxel map built incrementally from voxel_map_compressed frames.
+
+    The map is a sparse hash of dense blocks keyed by block coordinates. Each
+    frame only touches the blocks overlapping its window: voxels the frame sees
+    as occupied are set, voxels inside the window it no longer sees are cleared.
+    Frames in another frame than world_frame are placed with the robot pose
+    closest in time (from RTC_TOPIC["ROBOTODOM"]) and only add occupied voxels.
+    Blocks no frame has observed for `decay` seconds are dropped.
+
+    Every change bumps the map version and is recorded per block, so consumers
+    can fetch only the blocks changed since the version they last saw.
+
+    The frames must carry the points of the native decoder:
+    conn.datachannel.set_decoder("native").
+    """
+
+    def __init__(self, resolution=0.05, block_size=16, decay=None, world_frame="odom", pose_history=200):
+        """
+        :param resolution: Voxel size in meters; frames with another resolution are rejected.
+        :param block_size: Edge length of a block in voxels.
+        :param decay: Seconds after which unobserved blocks are removed, or None to keep them.
+        :param world_frame: frame_id of frames that are already in map coordinates.
+        :param pose_history: Number of robot poses kept to place frames of other frames.
+        """
+        self.resolution = resolution
+        self.block_size = block_size
+        self.decay = decay
+        self.world_frame = world_frame
+
+        self.blocks = {}  # (bx, by, bz) -> VoxelBlock
+        self.removed_blocks = {}  # (bx, by, bz) -> version at which the block became empty
+        self.version = 0
+        self.poses = deque(maxlen=pose_history)  # (stamp, position, rotation matrix)
+
+        self.frames = 0
+        self.dropped_frames = 0
+        self.last_update_time = None
+
+    # Input
+
+    def subscribe(self, pub_sub):
+        """Feed the map from the robot pose and lidar topics of a pub/sub."""
+        pub_sub.subscribe(RTC_TOPIC["ROBOTODOM"], self.on_pose)
+        pub_sub.subscribe(RTC_TOPIC["ULIDAR_ARRAY"], self.on_lidar)
+
+    def unsubscribe(self, pub_sub):
+        pub_sub.unsubscribe(RTC_TOPIC["ROBOTODOM"], self.on_pose)
+        pub_sub.unsubscribe(RTC_TOPIC["ULIDAR_ARRAY"], self.on_lidar)
+
+    def on_pose(self, message):
+        """Store a geometry_msgs/PoseStamped style robot pose message."""
+        data = message["data"]
+        stamp = data["header"]["stamp"]
+        position = data["pose"]["position"]
+        orientation = data["pose"]["orientation"]
+        self.poses.append((
+            stamp["sec"] + stamp["nanosec"] * 1e-9,
+            np.array([position["x"], position["y"], position["z"]]),
+            quaternion_to_matrix(orientation["x"], orientation["y"], orientation["z"], orientation["w"]),
+        ))
+
+    def on_lidar(self, message):
+        data = message["data"]
+        decoded = data["data"]
+        if "points" not in decoded:
+            raise ValueError("VoxelMapAccumulator needs the native decoder. Call set_decoder('native').")
+        self.integrate(decoded["points"], data)
+
+    def pose_at(self, stamp):
+        """The stored pose closest in time to stamp, or None."""
+        if not self.poses:
+            return None
+        return min(self.poses, key=lambda pose: abs(pose[0] - stamp))
+
+    def integrate(self, points, metadata, pose=None):
+        """
+        Merge one decoded frame into the map.
+
+        :param points: (N, 3) voxel positions of the frame (native decoder output).
+        :param metadata: The frame's metadata (origin, resolution, width, stamp, frame_id).
+        :param pose: (stamp, position, rotation matrix) overriding the stored poses.
+        :return: Keys of the blocks that changed.
+        """
+        started = time.perf_counter()
+        resolution = metadata["resolution"]
+        if not np.isclose(resolution, self.resolution):
+            raise ValueError(f"Frame resolution {resolution} differs from the map resolution {self.resolution}")
+        stamp = metadata.get("stamp") or time.time()
+
+        if metadata.get("frame_id", self.world_frame) == self.world_frame:
+            changed = self._integrate_window(points, metadata, stamp)
+        else:
+            pose = pose or self.pose_at(stamp)
+            if pose is None:
+                self.dropped_frames += 1
+                logging.debug("Dropping lidar frame in %s: no robot pose yet", metadata.get("frame_id"))
+                return []
+            _, position, rotation = pose
+            world_points = np.asarray(points, dtype=np.float64) @ rotation.T + position
+            changed = self._integrate_points(world_points, stamp)
+
+        if self.decay:
+            changed.update(self._decay(stamp - self.decay))
+        self._commit(changed)
+
+        self.frames += 1
+        self.last_update_time = time.perf_counter() - started
+        return list(changed)
+
+    def _integrate_window(self, points, metadata, stamp):
+        # The frame is a dense window aligned with the map grid. Scatter it into
+        # the blocks it overlaps and compare all of them at once.
+        size = self.block_size
+        shape = np.array(metadata.get("width") or DEFAULT_WINDOW)
+        window_low = np.rint(np.asarray(metadata["origin"]) / self.resolution).astype(np.int64)
+        first_block = window_low // size
+        block_counts = (window_low + shape - 1) // size - first_block + 1
+        offset = window_low - first_block * size
+
+        local = np.rint((np.asarray(points) - metadata["origin"]) / self.resolution).astype(np.int64)
+        local = local[((local >= 0) & (local < shape)).all(axis=1)] + offset
+        block_index, in_block = np.divmod(local, size)
+
+        # (bx, by, bz, size, size, size) occupancy of the overlapped blocks
+        observed_blocks = np.zeros((*block_counts, size, size, size), dtype=bool)
+        observed_blocks[(*block_index.T, *in_block.T)] = True
+        observed_any = observed_blocks.reshape(*block_counts, -1).any(axis=3)
+
+        # Per axis: which voxels of each block row lie inside the window
+        axis_masks = []
+        for axis in range(3):
+            coordinates = np.arange(block_counts[axis] * size).reshape(-1, size)
+            axis_masks.append((coordinates >= offset[axis]) & (coordinates < offset[axis] + shape[axis]))
+
+        # Blocks that already exist or receive their first voxels
+        first_x, first_y, first_z = first_block.tolist()
+        grid_indices = []
+        candidates = []
+        for index in np.ndindex(*block_counts):
+            key = (first_x + index[0], first_y + index[1], first_z + index[2])
+            block = self.blocks.get(key)
+            if block is not None or observed_any[index]:
+                grid_indices.append(index)
+                candidates.append((key, block))
+        if not candidates:
+            return {}
+
+        gx, gy, gz = np.array(grid_indices).T
+        empty = np.zeros((size, size, size), dtype=bool)
+        current = np.stack([block.occupied if block is not None else empty for _, block in candidates])
+        updated = observed_blocks[gx, gy, gz]
+
+        # Blocks on the window border keep their voxels outside the window
+        x_masks, y_masks, z_masks = axis_masks[0][gx], axis_masks[1][gy], axis_masks[2][gz]
+        partial = ~(x_masks.all(axis=1) & y_masks.all(axis=1) & z_masks.all(axis=1))
+        outside = ~(x_masks[partial][:, :, None, None]
+                    & y_masks[partial][:, None, :, None]
+                    & z_masks[partial][:, None, None, :])
+        updated[partial] |= current[partial] & outside
+        differs = (updated != current).any(axis=(1, 2, 3))
+
+        changed = {}
+        for (key, block), occupancy, block_differs in zip(candidates, updated, differs):
+            if block is None:
+                block = self.blocks[key] = VoxelBlock(size)
+            block.last_seen = stamp
+            if block_differs:
+                block.occupied = occupancy.copy()
+                changed[key] = block
+        return changed
+
+    def _integrate_points(self, world_points, stamp):
+        if not len(world_points):
+            return {}
+        voxels = np.floor(world_points / self.resolution).astype(np.int64)
+        block_index, in_block = np.divmod(voxels, self.block_size)
+
+        # Group the voxels by block: sort by block and split where the block changes
+        order = np.lexsort(block_index.T[::-1])
+        block_index, in_block = block_index[order], in_block[order]
+        starts = np.flatnonzero(np.any(np.diff(block_index, axis=0) != 0, axis=1)) + 1
+
+        changed = {}
+        for key, (x, y, z) in zip(map(tuple, block_index[np.r_[0, starts]].tolist()),
+                                  (group.T for group in np.split(in_block, starts))):
+            block = self.blocks.get(key)
+            if block is None:
+                block = self.blocks[key] = VoxelBlock(self.block_size)
+            block.last_seen = stamp
+            if not block.occupied[x, y, z].all():
+                block.occupied[x, y, z] = True
+                changed[key] = block
+        return changed
+
+    def _decay(self, cutoff):
+        changed = {}
+        for key, block in self.blocks.items():
+            if block.last_seen < cutoff:
+                block.occupied[...] = False
+                changed[key] = block
+        return changed
+
+    def _commit(self, changed):
+        if not changed:
+            return
+        self.version += 1
+        for key, block in changed.items():
+            block.points = None
+            if block.occupied.any():
+                block.version = self.version
+                self.removed_blocks.pop(key, None)
+            else:
+                del self.blocks[key]
+                self.removed_blocks[key] = self.version
+
+    # Queries
+
+    def block_points(self, key):
+        """(N, 3) float32 positions of the occupied voxels of a block."""
+        block = self.blocks.get(key)
+        if block is None:
+            return np.empty((0, 3), dtype=np.float32)
+        if block.points is None:
+            voxels = np.argwhere(block.occupied) + np.array(key) * self.block_size
+            block.points = (voxels * self.resolution).astype(np.float32)
+        return block.points
+
+    def points(self):
+        """(N, 3) float32 positions of every occupied voxel of the map."""
+        if not self.blocks:
+            return np.empty((0, 3), dtype=np.float32)
+        return np.concatenate([self.block_points(key) for key in self.blocks])
+
+    def changes_since(self, version):
+        """
+        Blocks changed after `version`.
+
+        :return: (keys of blocks updated or added, keys of blocks that became empty)
+        """
+        updated = [key for key, block in self.blocks.items() if block.version > version]
+        removed = [key for key, removed_version in self.removed_blocks.items() if removed_version > version]
+        return updated, removed
+
+    def get_stats(self):
+        return {
+            "version": self.version,
+            "blocks": len(self.blocks),
+            "voxels": int(sum(np.count_nonzero(block.occupied) for block in self.blocks.values())),
+            "frames": self.frames,
+            "dropped_frames": self.dropped_frames,
+            "last_update_ms": self.last_update_time * 1e3 if self.last_update_time is not None else None,
+        }
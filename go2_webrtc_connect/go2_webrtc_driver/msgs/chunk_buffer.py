@@ -0,0 +1,112 @@
+import logging
+
+
+class ChunkBuffer:
+    """
+    Reassembles a chunked response whose chunks are numbered 1..total_chunks.
+
+    When the total size is advertised, chunks are written by index into one
+    preallocated bytearray through a memoryview, and result() copies it into
+    bytes once instead of joining a list of chunks. Every chunk except the last has the same size, so
+    a chunk's offset follows from its index even when chunks arrive out of
+    order. Without a size, chunks are kept in index slots and joined once.
+    """
+
+    def __init__(self, total_chunks, total_size=None):
+        if not total_chunks:
+            raise ValueError("Total number of chunks cannot be zero")
+
+        self.total_chunks = total_chunks
+        self.received = 0
+        self.seen = bytearray(total_chunks)
+        self.slots = None
+        self.buffer = None
+
+        if total_size:
+            self.buffer = bytearray(total_size)
+            self.view = memoryview(self.buffer)
+            self.chunk_size = None
+            self.last_chunk_length = None
+        else:
+            self.slots = [None] * total_chunks
+
+    @property
+    def complete(self):
+        return self.received == self.total_chunks
+
+    def add(self, chunk_index, chunk):
+        """
+        Store a chunk. Duplicates are ignored.
+
+        :return: True once every chunk has been received.
+        """
+        if chunk_index is None:
+            raise ValueError("Chunk index is missing")
+        index = chunk_index - 1
+        if not 0 <= index < self.total_chunks:
+            raise ValueError(f"Chunk index {chunk_index} out of range 1..{self.total_chunks}")
+        if self.seen[index]:
+            return self.complete
+
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk is None:
+            chunk = b""
+
+        if self.buffer is not None and not self._write(index, chunk):
+            self._switch_to_slots()
+        if self.slots is not None:
+            self.slots[index] = chunk
+
+        self.seen[index] = 1
+        self.received += 1
+        return self.complete
+
+    def _write(self, index, chunk):
+        length = len(chunk)
+        if index == self.total_chunks - 1:
+            offset = len(self.buffer) - length
+            if offset < 0:
+                return False
+            self.last_chunk_length = length
+        else:
+            if self.chunk_size is None:
+                self.chunk_size = length
+            elif length != self.chunk_size:
+                return False
+            offset = index * length
+            if offset + length > len(self.buffer):
+                return False
+
+        self.view[offset:offset + length] = chunk
+        return True
+
+    def _switch_to_slots(self):
+        # The advertised size or the chunk sizes didn't add up: keep the chunks
+        # already written as separate slots and join at the end instead.
+        logging.warning("Chunk sizes don't match the advertised size, reassembling without preallocation")
+        self.slots = [None] * self.total_chunks
+        for index in range(self.total_chunks):
+            if not self.seen[index]:
+                continue
+            if index == self.total_chunks - 1:
+                self.slots[index] = bytes(self.view[len(self.buffer) - self.last_chunk_length:])
+            else:
+                offset = index * self.chunk_size
+                self.slots[index] = bytes(self.view[offset:offset + self.chunk_size])
+        self.view.release()
+        self.buffer = None
+
+    def result(self):
+        """Return the reassembled data as bytes."""
+        if not self.complete:
+            raise ValueError("Chunked data is incomplete")
+        if self.buffer is not None:
+            expected_size = (self.total_chunks - 1) * (self.chunk_size or 0) + self.last_chunk_length
+            if expected_size != len(self.buffer):
+                self._switch_to_slots()
+            else:
+                self.view.release()
+                # bytes like the joined result, so callers can hash or compare it
+                return bytes(self.buffer)
+        return b"".join(self.slots)
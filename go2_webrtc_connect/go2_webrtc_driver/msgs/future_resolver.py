@@ -1,120 +1,274 @@
+import asyncio
+import heapq
+import itertools
 import logging
 from ..constants import DATA_CHANNEL_TYPE
 from ..util import get_nested_field
+from .chunk_buffer import ChunkBuffer
+
+
+# Message type of the response to a request, when it differs from the request's
+RESPONSE_TYPES = {DATA_CHANNEL_TYPE["REQUEST"]: DATA_CHANNEL_TYPE["RESPONSE"]}
+
+
+class PublishTimeoutError(TimeoutError):
+    """Raised to the caller of publish() when no response arrived before the deadline."""
+
 
 class FutureResolver:
-    def __init__(self):
+    def __init__(self, chunk_timeout=30):
+        """
+        :param chunk_timeout: Seconds without a new chunk after which a partial
+                              chunked response is discarded.
+        """
         self.pending_responses = {}
         self.pending_callbacks = {}
+        self.pending_topics = {}  # topic -> number of pending keys requested on it
+        self.pending_types = {}  # (message type, topic) a response may arrive as -> number of pending keys
+        self.key_topics = {}  # pending key -> (message types, topic) it waits for
         self.chunk_data_storage = {}
+        self.topic_keys = {}
 
-    def save_resolve(self, message_type, topic, future, identifier):
+        # All deadlines share one heap and one loop timer. Entries are checked
+        # lazily against the dicts below, so extending a deadline just pushes a new entry.
+        self.chunk_timeout = chunk_timeout
+        self.deadlines = []  # heap of (deadline, sequence, kind, future or key)
+        self.deadline_sequence = itertools.count()
+        self.pending_deadlines = {}  # future -> (deadline, timeout, key)
+        self.chunk_deadlines = {}  # key -> deadline
+        self.expiry_timer = None
+        self.expiry_timer_when = None
+        self.expired_futures = 0
+        self.expired_chunks = 0
+
+    def save_resolve(self, message_type, topic, future, identifier, timeout=None):
         key = self.generate_message_key(message_type,topic,identifier)
         if key in self.pending_callbacks:
             self.pending_callbacks[key].append(future)
         else:
             self.pending_callbacks[key] = [future]
+            message_types = {message_type, RESPONSE_TYPES.get(message_type, message_type)}
+            self.key_topics[key] = (message_types, topic)
+            self.pending_topics[topic] = self.pending_topics.get(topic, 0) + 1
+            for response_type in message_types:
+                self.pending_types[(response_type, topic)] = self.pending_types.get((response_type, topic), 0) + 1
+
+        # Each request keeps its own deadline, even when several wait on the same key; None waits forever
+        if timeout is not None:
+            self.pending_deadlines[future] = (self._push_deadline(timeout, "future", future), timeout, key)
+
+    def _push_deadline(self, timeout, kind, item):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        heapq.heappush(self.deadlines, (deadline, next(self.deadline_sequence), kind, item))
+
+        if self.expiry_timer_when is None or deadline < self.expiry_timer_when:
+            if self.expiry_timer:
+                self.expiry_timer.cancel()
+            self.expiry_timer = loop.call_at(deadline, self.expire)
+            self.expiry_timer_when = deadline
+        return deadline
+
+    def _touch_pending(self, key):
+        """A chunk arrived for the key: push back the deadlines of whoever waits for it."""
+        for future in self.pending_callbacks.get(key, ()):
+            entry = self.pending_deadlines.get(future)
+            if entry:
+                self.pending_deadlines[future] = (self._push_deadline(entry[1], "future", future), entry[1], key)
+        self.chunk_deadlines[key] = self._push_deadline(self.chunk_timeout, "chunk", key)
+
+    def _clear_deadlines(self, key):
+        for future in self.pending_callbacks.get(key, ()):
+            self.pending_deadlines.pop(future, None)
+        self.chunk_deadlines.pop(key, None)
+
+    def expire(self):
+        """Evict every pending future and partial chunk buffer whose deadline has passed."""
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        self.expiry_timer = None
+        self.expiry_timer_when = None
+
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, _, kind, item = heapq.heappop(self.deadlines)
+
+            if kind == "future":
+                entry = self.pending_deadlines.get(item)
+                if entry is None or entry[0] != deadline:
+                    continue  # resolved, or the deadline was extended
+                del self.pending_deadlines[item]
+                _, timeout, key = entry
+
+                # Only this request fails; others waiting on the same key keep their own deadlines
+                futures = self.pending_callbacks.get(key, [])
+                if item in futures:
+                    futures.remove(item)
+                if not item.done():
+                    item.set_exception(PublishTimeoutError(f"No response for {key} after {timeout}s"))
+                self.expired_futures += 1
+                logging.warning("Request %s timed out after %ss", key, timeout)
+
+                if not futures:
+                    self._pop_pending(key)
+                    if self.chunk_data_storage.pop(key, None) is not None:
+                        self.chunk_deadlines.pop(key, None)
+                        self.expired_chunks += 1
+
+            elif kind == "chunk":
+                key = item
+                if self.chunk_deadlines.get(key) != deadline:
+                    continue
+                del self.chunk_deadlines[key]
+                if self.chunk_data_storage.pop(key, None) is not None:
+                    self.expired_chunks += 1
+                    logging.warning("Discarded incomplete chunked response %s", key)
+
+        if self.deadlines:
+            self.expiry_timer_when = self.deadlines[0][0]
+            self.expiry_timer = loop.call_at(self.expiry_timer_when, self.expire)
+
+    def _pop_pending(self, key):
+        """Remove and return the futures waiting for the key, or None."""
+        futures = self.pending_callbacks.pop(key, None)
+        if futures is not None:
+            message_types, topic = self.key_topics.pop(key)
+            self._decrement(self.pending_topics, topic)
+            for response_type in message_types:
+                self._decrement(self.pending_types, (response_type, topic))
+        return futures
+
+    @staticmethod
+    def _decrement(counts, key):
+        count = counts.get(key, 0) - 1
+        if count > 0:
+            counts[key] = count
+        else:
+            counts.pop(key, None)
+
+    def has_pending(self, topic, message_type=None):
+        """
+        Whether a request made on the topic still waits for its response.
+
+        :param message_type: Only count requests a message of this type could answer.
+        """
+        if message_type is None:
+            return topic in self.pending_topics
+        return (message_type, topic) in self.pending_types
+
+    def get_stats(self):
+        return {
+            "pending_futures": sum(len(futures) for futures in self.pending_callbacks.values()),
+            "partial_chunks": len(self.chunk_data_storage),
+            "expired_futures": self.expired_futures,
+            "expired_chunks": self.expired_chunks,
+        }
 
     def run_resolve_for_topic(self, message):
-        if not message.get("type"):
+        message_type = message.get("type")
+        if not message_type:
             return
 
-        if message["type"] == DATA_CHANNEL_TYPE["RTC_INNER_REQ"] and get_nested_field(message, "info", "req_type") == "request_static_file":
+        data = message.get("data")
+        info = message.get("info")
+
+        if message_type == DATA_CHANNEL_TYPE["RTC_INNER_REQ"] and isinstance(info, dict) and info.get("req_type") == "request_static_file":
             self.run_resolve_for_topic_for_file(message)
             return
 
-        key = self.generate_message_key(
-            message["type"],
-            message.get("topic", ""),
-            get_nested_field(message, "data", "uuid") or
-            get_nested_field(message, "data", "header", "identity", "id") or
-            get_nested_field(message, "info", "uuid") or
-            get_nested_field(message, "info", "req_uuid")
-        )
-
-        content_info = get_nested_field(message, "data", "content_info")
-        if content_info and content_info.get("enable_chunking"):
-            chunk_index = content_info.get("chunk_index")
-            total_chunks = content_info.get("total_chunk_num")
-
-            if total_chunks is None or total_chunks == 0:
-                raise ValueError("Total number of chunks cannot be zero")
-            if chunk_index is None:
-                raise ValueError("Chunk index is missing")
-
-            data_chunk = message["data"].get("data")
-            if chunk_index < total_chunks:
-                if key in self.chunk_data_storage:
-                    self.chunk_data_storage[key].append(data_chunk)
-                else:
-                    self.chunk_data_storage[key] = [data_chunk]
+        content_info = data.get("content_info") if isinstance(data, dict) else None
+        chunked = isinstance(content_info, dict) and content_info.get("enable_chunking")
+
+        # Fast path for streamed topics: no request waits for this type and topic, and nothing to reassemble
+        topic = message.get("topic", "")
+        if not chunked and not self.has_pending(topic, message_type):
+            return
+
+        key = self.generate_message_key(message_type, topic, self.extract_identifier(message))
+
+        if chunked:
+            # Chunks are written into one preallocated buffer when the size is advertised
+            chunk_buffer = self.chunk_data_storage.get(key)
+            if chunk_buffer is None:
+                chunk_buffer = self.chunk_data_storage[key] = ChunkBuffer(
+                    content_info.get("total_chunk_num"),
+                    content_info.get("total_size")
+                )
+
+            if not chunk_buffer.add(content_info.get("chunk_index"), data.get("data")):
+                self._touch_pending(key)
                 return
-            else:
-                self.chunk_data_storage[key].append(data_chunk)
-                message["data"]["data"] = self.merge_array_buffers(self.chunk_data_storage[key])
-                del self.chunk_data_storage[key]
+
+            data["data"] = chunk_buffer.result()
+            del self.chunk_data_storage[key]
 
         # Resolve the pending future with the final message
-        if key in self.pending_callbacks:
-            for future in self.pending_callbacks[key]:
-                if future:
+        self._clear_deadlines(key)
+        futures = self._pop_pending(key)
+        if futures:
+            for future in futures:
+                if future and not future.done():
                     future.set_result(message)  # Resolve the future with the message
-            del self.pending_callbacks[key]
 
-    def merge_array_buffers(self, buffers):
-        total_length = sum(len(buf) for buf in buffers)
-        merged_buffer = bytearray(total_length)
+    @staticmethod
+    def extract_identifier(message):
+        """
+        Extract the correlation ID of a response in a single pass, looking at
+        data.uuid, data.header.identity.id, info.uuid and info.req_uuid in that order.
+        """
+        data = message.get("data")
+        if isinstance(data, dict):
+            identifier = data.get("uuid")
+            if identifier:
+                return identifier
+            header = data.get("header")
+            if isinstance(header, dict):
+                identity = header.get("identity")
+                if isinstance(identity, dict):
+                    identifier = identity.get("id")
+                    if identifier:
+                        return identifier
 
-        current_position = 0
-        for buffer in buffers:
-            merged_buffer[current_position:current_position + len(buffer)] = buffer
-            current_position += len(buffer)
+        info = message.get("info")
+        if isinstance(info, dict):
+            return info.get("uuid") or info.get("req_uuid")
+        return None
 
-        return bytes(merged_buffer)
+    def merge_array_buffers(self, buffers):
+        return b"".join(buffers)
 
     def run_resolve_for_topic_for_file(self, message):
-        key = self.generate_message_key(
-            message["type"], 
-            message.get("topic", ""), 
-            get_nested_field(message, "data", "uuid") or
-            get_nested_field(message, "data", "header", "identity", "id") or
-            get_nested_field(message, "info", "uuid") or
-            get_nested_field(message, "info", "req_uuid")
-        )
+        key = self.generate_message_key(message["type"], message.get("topic", ""), self.extract_identifier(message))
 
         file_info = get_nested_field(message, "info", "file")
         if file_info and file_info.get("enable_chunking"):
-            chunk_index = file_info.get("chunk_index")
-            total_chunks = file_info.get("total_chunk_num")
-
-            if total_chunks is None or total_chunks == 0:
-                raise ValueError("Total number of chunks cannot be zero")
-            if chunk_index is None:
-                raise ValueError("Chunk index is missing")
+            chunk_buffer = self.chunk_data_storage.get(key)
+            if chunk_buffer is None:
+                chunk_buffer = self.chunk_data_storage[key] = ChunkBuffer(
+                    file_info.get("total_chunk_num"),
+                    message["info"].get("file_size_after_b64")
+                )
 
-            # Extract the chunk data
-            data_chunk = file_info.get("data")
-
-            # Initialize the key in chunk_data_storage if it doesn't exist
-            if key not in self.chunk_data_storage:
-                self.chunk_data_storage[key] = []
-
-            # Append the chunk to the storage, ensuring it's in bytes
-            self.chunk_data_storage[key].append(data_chunk.encode('utf-8') if isinstance(data_chunk, str) else data_chunk)
+            if not chunk_buffer.add(file_info.get("chunk_index"), file_info.get("data")):
+                # Wait for the remaining chunks before resolving
+                self._touch_pending(key)
+                return
 
-            # If this is the last chunk, combine all chunks and store the complete data
-            if chunk_index == total_chunks:
-                message["info"]["file"]["data"] = b''.join(self.chunk_data_storage[key])
-                del self.chunk_data_storage[key]  # Clean up the storage
+            file_info["data"] = chunk_buffer.result()
+            del self.chunk_data_storage[key]  # Clean up the storage
 
         # Resolve the pending future with the final message
-        if key in self.pending_callbacks:
-            for future in self.pending_callbacks[key]:
-                if future:
-                    future.set_result(message)  # Resolve the future with the message
-            del self.pending_callbacks[key]
+        self._clear_deadlines(key)
+        for future in self._pop_pending(key) or ():
+            if future and not future.done():
+                future.set_result(message)  # Resolve the future with the message
 
     def generate_message_key(self, message_type, topic, identifier):
-        return identifier or f"{message_type} $ {topic}"
+        if identifier:
+            return identifier
+        # Topic keys are cached per (type, topic) to avoid formatting a string per message
+        topic_key = self.topic_keys.get((message_type, topic))
+        if topic_key is None:
+            topic_key = self.topic_keys[(message_type, topic)] = f"{message_type} $ {topic}"
+        return topic_key
 
 
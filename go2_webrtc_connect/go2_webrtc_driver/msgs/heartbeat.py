@@ -4,11 +4,12 @@ import time
 from ..constants import DATA_CHANNEL_TYPE
 
 class WebRTCDataChannelHeartBeat:
-    def __init__(self, channel, pub_sub):
+    def __init__(self, channel, pub_sub, link_monitor=None):
         self.channel = channel
         self.heartbeat_timer = None
         self.heartbeat_response = None
         self.publish = pub_sub.publish_without_callback
+        self.link_monitor = link_monitor
 
     def _format_date(self, timestamp):
         return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
@@ -37,11 +38,16 @@ class WebRTCDataChannelHeartBeat:
                 data,
                 DATA_CHANNEL_TYPE["HEARTBEAT"],
             )
+            if self.link_monitor:
+                self.link_monitor.on_heartbeat_sent(data["timeInNum"])
         # Schedule the next heartbeat
         self.heartbeat_timer = asyncio.get_event_loop().call_later(2, self.send_heartbeat)
 
     def handle_response(self, message):
         """Handle a received heartbeat message."""
         self.heartbeat_response = time.time()
+        if self.link_monitor:
+            data = message.get("data")
+            self.link_monitor.on_heartbeat_response(data.get("timeInNum") if isinstance(data, dict) else None)
         logging.info("Heartbeat response received.")
     
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import statistics
+import time
+from collections import OrderedDict, deque
+
+
+class WebRTCLinkMonitor:
+    """
+    Tracks the link quality to the Go2 from the heartbeat round trips, the robot's
+    RTT probes and the peer connection statistics. Metrics are recomputed when a
+    sample arrives, so snapshot() only returns a prepared dict.
+
+    The link is degraded when the heartbeat RTT, jitter or loss, the RTP loss
+    of the media received since the previous stats poll, or the RTT the robot
+    reports for the media we send exceed their threshold.
+    """
+
+    def __init__(self, conn, window=30, heartbeat_timeout=5.0, stats_interval=2.0,
+                 rtt_threshold=0.3, jitter_threshold=0.1, loss_threshold=0.1):
+        """
+        :param conn: Go2WebRTCConnection whose peer connection is polled for stats.
+        :param window: Number of heartbeat samples kept in the sliding window.
+        :param heartbeat_timeout: Seconds after which an unanswered heartbeat counts as lost.
+        :param stats_interval: Seconds between RTCPeerConnection.getStats() polls.
+        :param rtt_threshold: Mean heartbeat RTT or RTP round trip time (s) above which the link is degraded.
+        :param jitter_threshold: Heartbeat RTT jitter (s) above which the link is degraded.
+        :param loss_threshold: Heartbeat or RTP packet loss ratio above which the link is degraded.
+        """
+        self.conn = conn
+        self.heartbeat_timeout = heartbeat_timeout
+        self.stats_interval = stats_interval
+        self.rtt_threshold = rtt_threshold
+        self.jitter_threshold = jitter_threshold
+        self.loss_threshold = loss_threshold
+
+        self.pending_heartbeats = OrderedDict()  # timeInNum -> send time of unanswered heartbeats
+        self.samples = deque(maxlen=window)  # RTT in seconds, or None for a lost heartbeat
+        self.probe_arrivals = deque(maxlen=window)
+        self.peer_stats = {}
+        self.rtp_totals = None  # (packets lost, packets received) at the previous stats poll
+        self.stats_timer = None
+        self.running = False
+        self.generation = 0  # Bumped by start()/stop() so a poll in progress knows it was superseded
+        self.degraded = False
+        self.on_degraded_callbacks = []
+        self.on_recovered_callbacks = []
+        self._snapshot = self._empty_snapshot()
+
+    @staticmethod
+    def _empty_snapshot():
+        return {
+            "rtt": None,
+            "rtt_min": None,
+            "rtt_max": None,
+            "jitter": None,
+            "loss": 0.0,
+            "samples": 0,
+            "probe_interval": None,
+            "last_rx": None,
+            "peer": {},
+            "degraded": False,
+        }
+
+    def set_on_degraded_callback(self, callback):
+        """Register a callback called with the snapshot when the link becomes degraded."""
+        if callback and callable(callback):
+            self.on_degraded_callbacks.append(callback)
+
+    def set_on_recovered_callback(self, callback):
+        """Register a callback called with the snapshot when the link is healthy again."""
+        if callback and callable(callback):
+            self.on_recovered_callbacks.append(callback)
+
+    def snapshot(self):
+        """Return the latest link metrics. Cheap enough to call from a control loop."""
+        return self._snapshot
+
+    def on_heartbeat_sent(self, stamp):
+        """
+        :param stamp: timeInNum of the heartbeat, which the robot echoes in its response.
+        """
+        now = time.monotonic()
+        # Anything unanswered for longer than the timeout is lost
+        while self.pending_heartbeats and now - next(iter(self.pending_heartbeats.values())) > self.heartbeat_timeout:
+            self.pending_heartbeats.popitem(last=False)
+            self.samples.append(None)
+        self.pending_heartbeats[stamp] = now
+        self._update()
+
+    def on_heartbeat_response(self, stamp=None):
+        """
+        :param stamp: timeInNum echoed by the robot. Without it the response is paired
+                      with the oldest unanswered heartbeat.
+        """
+        now = time.monotonic()
+        self._snapshot["last_rx"] = now
+        if stamp is None and self.pending_heartbeats:
+            stamp = next(iter(self.pending_heartbeats))
+        if stamp not in self.pending_heartbeats:
+            return  # Already counted as lost, or not ours
+        # Heartbeats sent before this one and still unanswered were lost
+        while True:
+            sent_stamp, sent = self.pending_heartbeats.popitem(last=False)
+            if sent_stamp == stamp:
+                break
+            self.samples.append(None)
+        self.samples.append(now - sent)
+        self._update()
+
+    def on_rtt_probe(self):
+        now = time.monotonic()
+        self.probe_arrivals.append(now)
+        self._snapshot["last_rx"] = now
+
+    def start(self):
+        """Start polling the peer connection statistics. Restarts the poll if it already runs."""
+        self.stop()
+        self.running = True
+        self._schedule_next()
+
+    def stop(self):
+        """Stop polling the peer connection statistics, including a poll in progress."""
+        self.running = False
+        self.generation += 1
+        if self.stats_timer:
+            self.stats_timer.cancel()
+            self.stats_timer = None
+
+    def _schedule_next(self):
+        self.stats_timer = asyncio.get_event_loop().call_later(
+            self.stats_interval, self.schedule_stats_poll, self.generation
+        )
+
+    def schedule_stats_poll(self, generation=None):
+        asyncio.ensure_future(self.poll_stats(generation))
+
+    async def poll_stats(self, generation=None):
+        pc = self.conn.pc
+        if pc is None:
+            return
+        try:
+            report = await pc.getStats()
+            self.peer_stats = self.merge_stats(report)
+            self._update_rtp_loss()
+            self._update()
+        except Exception:
+            logging.error("Failed to fetch peer connection stats", exc_info=True)
+        # stop() or start() may have been called while getStats() was awaited
+        if not self.running or generation != self.generation:
+            return
+        self._schedule_next()
+
+    @staticmethod
+    def merge_stats(report):
+        """Reduce an RTCStatsReport to the transport byte counters, RTP loss and RTT."""
+        merged = {
+            "bytes_sent": 0,
+            "bytes_received": 0,
+            "packets_lost": 0,
+            "packets_received": 0,
+            "rtp_loss": None,
+            "rtp_jitter": None,
+            "rtp_rtt": None,
+        }
+        for stats in report.values():
+            if stats.type == "transport":
+                merged["bytes_sent"] = max(merged["bytes_sent"], stats.bytesSent)
+                merged["bytes_received"] = max(merged["bytes_received"], stats.bytesReceived)
+            elif stats.type == "inbound-rtp":
+                merged["packets_lost"] += stats.packetsLost
+                merged["packets_received"] += stats.packetsReceived
+                merged["rtp_jitter"] = max(merged["rtp_jitter"] or 0, stats.jitter)
+            elif stats.type == "remote-inbound-rtp":
+                merged["rtp_rtt"] = max(merged["rtp_rtt"] or 0, stats.roundTripTime)
+        return merged
+
+    def _update_rtp_loss(self):
+        """Loss ratio of the RTP packets expected since the previous poll, from the cumulative counters."""
+        totals = (self.peer_stats["packets_lost"], self.peer_stats["packets_received"])
+        if self.rtp_totals is not None:
+            lost = totals[0] - self.rtp_totals[0]
+            expected = lost + totals[1] - self.rtp_totals[1]
+            if expected > 0:
+                self.peer_stats["rtp_loss"] = max(0, lost) / expected
+        self.rtp_totals = totals
+
+    def _update(self):
+        rtts = [sample for sample in self.samples if sample is not None]
+        snapshot = self._empty_snapshot()
+        snapshot["last_rx"] = self._snapshot["last_rx"]
+        snapshot["samples"] = len(self.samples)
+        snapshot["peer"] = self.peer_stats
+
+        if self.samples:
+            snapshot["loss"] = (len(self.samples) - len(rtts)) / len(self.samples)
+        if rtts:
+            snapshot["rtt"] = statistics.fmean(rtts)
+            snapshot["rtt_min"] = min(rtts)
+            snapshot["rtt_max"] = max(rtts)
+        if len(rtts) > 1:
+            # Mean absolute difference between consecutive RTTs (RFC 3550 style)
+            snapshot["jitter"] = statistics.fmean(abs(b - a) for a, b in zip(rtts, rtts[1:]))
+        if len(self.probe_arrivals) > 1:
+            arrivals = list(self.probe_arrivals)
+            snapshot["probe_interval"] = statistics.fmean(b - a for a, b in zip(arrivals, arrivals[1:]))
+
+        rtp_loss = self.peer_stats.get("rtp_loss")
+        rtp_rtt = self.peer_stats.get("rtp_rtt")
+        degraded = (
+            (snapshot["rtt"] is not None and snapshot["rtt"] > self.rtt_threshold)
+            or (snapshot["jitter"] is not None and snapshot["jitter"] > self.jitter_threshold)
+            or snapshot["loss"] > self.loss_threshold
+            or (rtp_loss is not None and rtp_loss > self.loss_threshold)
+            or (rtp_rtt is not None and rtp_rtt > self.rtt_threshold)
+        )
+        snapshot["degraded"] = degraded
+        self._snapshot = snapshot
+
+        if degraded != self.degraded:
+            self.degraded = degraded
+            callbacks = self.on_degraded_callbacks if degraded else self.on_recovered_callbacks
+            for callback in callbacks:
+                try:
+                    callback(snapshot)
+                except Exception:
+                    logging.error("Error in link monitor callback", exc_info=True)
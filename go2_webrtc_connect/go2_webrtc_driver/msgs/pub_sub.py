@@ -5,28 +5,71 @@ import random
 import logging
 from ..constants import DATA_CHANNEL_TYPE
 from .future_resolver import FutureResolver
+from .subscription import TopicSubscription, DROP_OLDEST
+from .rate_limit import RateLimitedCallback, RateMeter
+from .state_records import StateRingBuffer
 from ..util import get_nested_field
+from ..json_codec import StdlibJsonCodec
+
+REQUEST_ID_MODULO = 2147483648  # Request IDs are kept within a positive int32
 
 class WebRTCDataChannelPubSub:
 
-    def __init__(self, channel):
+    def __init__(self, channel, max_in_flight_per_topic=None, codec=None):
         self.channel = channel
+        self.codec = codec or StdlibJsonCodec
 
         self.future_resolver = FutureResolver()
-        self.subscriptions = {}  # Dictionary to hold callbacks keyed by topic
+        self.subscriptions = {}  # Dictionary to hold the list of callbacks keyed by topic
+        self.raw_subscriptions = {}  # topic -> callbacks given binary messages before they are decoded
+        self.topic_meters = {}  # topic -> RateMeter of the incoming messages
+
+        # Request IDs increase monotonically per connection, starting from a time and
+        # random based offset so they don't match responses meant for an earlier connection
+        self.last_request_id = (int(time.time() * 1000) + random.randint(0, 1000)) % REQUEST_ID_MODULO
+
+        # Optional limit of concurrent publish_request_new() calls per topic
+        self.max_in_flight_per_topic = max_in_flight_per_topic
+        self.max_in_flight = {}  # topic -> limit overriding max_in_flight_per_topic
+        self.in_flight_semaphores = {}  # topic -> asyncio.Semaphore
     
     def run_resolve(self, message):
         self.future_resolver.run_resolve_for_topic(message)
 
-         # Extract the topic from the message
+        # Call every callback registered for the topic
         topic = message.get("topic")
-        if topic in self.subscriptions:
-            # Call the registered callback with the message
-            callback = self.subscriptions[topic]
-            callback(message)
+        callbacks = self.subscriptions.get(topic)
+        if callbacks:
+            self.topic_meters[topic].tick()
+            for callback in tuple(callbacks):
+                try:
+                    callback(message)
+                except Exception:
+                    logging.error("Error in subscription callback for %s", message.get("topic"), exc_info=True)
         
 
-    async def publish(self, topic, data=None, msg_type=None):
+    def run_raw(self, message):
+        """Call the raw subscribers of a binary message, before its payload is decoded or dropped."""
+        callbacks = self.raw_subscriptions.get(message.get("topic"))
+        if callbacks:
+            for callback in tuple(callbacks):
+                try:
+                    callback(message)
+                except Exception:
+                    logging.error("Error in raw subscription callback for %s", message.get("topic"), exc_info=True)
+
+    def has_consumers(self, topic):
+        """Whether a subscriber or a pending request on the topic could read a message of it."""
+        return bool(self.subscriptions.get(topic)) or self.future_resolver.has_pending(topic)
+
+    async def publish(self, topic, data=None, msg_type=None, timeout=None):
+        """
+        Send a message and wait for its response.
+
+        :param timeout: Seconds to wait for the response. On expiry the pending entry
+                        is evicted and PublishTimeoutError is raised. Chunked responses
+                        extend it with every chunk. None (the default) waits forever.
+        """
         channel = self.channel
         future = asyncio.get_event_loop().create_future()
 
@@ -40,12 +83,12 @@ class WebRTCDataChannelPubSub:
                 message_dict["data"] = data
             
             # Convert the dictionary to a JSON string
-            message = json.dumps(message_dict)
+            message = self.codec.dumps(message_dict)
 
             channel.send(message)
 
             # Log the message being published
-            logging.info(f"> message sent: {message}")
+            logging.info("> message sent: %s", message)
 
             # Store the future so it can be completed when the response is received
             uuid = (
@@ -54,7 +97,7 @@ class WebRTCDataChannelPubSub:
                 get_nested_field(data, "req_uuid")
             )
 
-            self.future_resolver.save_resolve(msg_type or DATA_CHANNEL_TYPE["MSG"], topic, future, uuid)
+            self.future_resolver.save_resolve(msg_type or DATA_CHANNEL_TYPE["MSG"], topic, future, uuid, timeout)
         else:
             future.set_exception(Exception("Data channel is not open"))
 
@@ -74,20 +117,45 @@ class WebRTCDataChannelPubSub:
                 message_dict["data"] = data
             
             # Convert the dictionary to a JSON string
-            message = json.dumps(message_dict)
+            message = self.codec.dumps(message_dict)
                 
             self.channel.send(message)
 
             # Log the message being published
-            logging.info(f"> message sent: {message}")
+            logging.info("> message sent: %s", message)
         else:
             Exception("Data channel is not open")
         
 
-    async def publish_request_new(self, topic, options=None):
-        # Generate a unique identifier
-        generated_id = int(time.time() * 1000) % 2147483648 + random.randint(0, 1000)
-        
+    def next_request_id(self):
+        """Allocate the next request ID of this connection (never 0, wraps at 2**31)."""
+        self.last_request_id = (self.last_request_id + 1) % REQUEST_ID_MODULO or 1
+        return self.last_request_id
+
+    def set_max_in_flight(self, limit, topic=None):
+        """
+        Limit how many requests may await a response at the same time.
+
+        :param limit: Maximum number of in-flight requests, or None for no limit.
+        :param topic: Topic the limit applies to; None changes the default for all topics.
+        """
+        if topic is None:
+            self.max_in_flight_per_topic = limit
+            self.in_flight_semaphores = {t: sem for t, sem in self.in_flight_semaphores.items() if t in self.max_in_flight}
+        else:
+            self.max_in_flight[topic] = limit
+            self.in_flight_semaphores.pop(topic, None)
+
+    def _get_in_flight_semaphore(self, topic):
+        semaphore = self.in_flight_semaphores.get(topic)
+        if semaphore is None:
+            limit = self.max_in_flight.get(topic, self.max_in_flight_per_topic)
+            if not limit:
+                return None
+            semaphore = self.in_flight_semaphores[topic] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def publish_request_new(self, topic, options=None, timeout=None):
         # Check if api_id is provided
         if not (options and "api_id" in options):
             print("Error: Please provide app id")
@@ -97,7 +165,7 @@ class WebRTCDataChannelPubSub:
         request_payload = {
             "header": {
                 "identity": {
-                    "id": options.get("id", generated_id),
+                    "id": options["id"] if "id" in options else self.next_request_id(),
                     "api_id": options.get("api_id", 0)
                 }
             },
@@ -114,23 +182,102 @@ class WebRTCDataChannelPubSub:
                 "priority": 1
             }
 
-        # Publish the request
-        return await self.publish(topic, request_payload, DATA_CHANNEL_TYPE["REQUEST"])
+        # Publish the request, waiting for a free slot if the topic is at its in-flight limit
+        semaphore = self._get_in_flight_semaphore(topic)
+        if semaphore is None:
+            return await self.publish(topic, request_payload, DATA_CHANNEL_TYPE["REQUEST"], timeout)
+        async with semaphore:
+            return await self.publish(topic, request_payload, DATA_CHANNEL_TYPE["REQUEST"], timeout)
     
-    def subscribe(self, topic, callback=None):
+    def subscribe(self, topic, callback=None, rate=None, every=None, coalesce=False, raw=False):
+        """
+        Subscribe to a topic. High-frequency topics can be thinned out before the
+        callback runs.
+
+        :param rate: Deliver at most `rate` messages per second.
+        :param every: Deliver only every Nth message.
+        :param coalesce: Keep only the latest message of each interval and deliver it
+                         late instead of dropping it.
+        :param raw: Call the callback with every binary message of the topic as soon
+                    as it arrives, with its payload still compressed, even if the
+                    decode pool later drops the frame. Not combined with rate limits.
+        """
+        if raw and (rate or every or coalesce):
+            raise ValueError("Raw subscriptions cannot be rate limited.")
+
         channel = self.channel
 
         if not channel or channel.readyState != "open":
             print("Error: Data channel is not open")
             return
         
-        # Register the callback for the topic
-        if callback:
-            self.subscriptions[topic] = callback
+        # Register the callback for the topic, next to any existing subscribers
+        if callback and raw:
+            self.raw_subscriptions.setdefault(topic, []).append(callback)
+        elif callback:
+            if rate or every or coalesce:
+                callback = RateLimitedCallback(callback, rate, every, coalesce)
+            self.subscriptions.setdefault(topic, []).append(callback)
+            self.topic_meters.setdefault(topic, RateMeter())
 
         self.publish_without_callback(topic=topic, msg_type=DATA_CHANNEL_TYPE["SUBSCRIBE"])
 
-    def unsubscribe(self, topic):
+    def subscribe_queue(self, topic, maxsize=16, policy=DROP_OLDEST, rate=None, every=None):
+        """
+        Subscribe to a topic through a bounded queue consumed as an async iterator.
+
+        :param maxsize: Maximum number of queued messages for this subscriber.
+        :param policy: "drop_oldest" or "keep_latest" (only the newest message is kept).
+        :param rate: Enqueue at most `rate` messages per second.
+        :param every: Enqueue only every Nth message.
+        :return: TopicSubscription, or None if the data channel is not open.
+        """
+        channel = self.channel
+
+        if not channel or channel.readyState != "open":
+            print("Error: Data channel is not open")
+            return None
+
+        subscription = TopicSubscription(self, topic, maxsize, policy)
+        self.subscribe(topic, subscription.put, rate, every)
+        return subscription
+
+    def subscribe_state(self, topic, capacity=1024, rate=None, every=None):
+        """
+        Subscribe to LOW_STATE or (LF_)SPORT_MOD_STATE and keep the recent samples
+        in a typed ring buffer instead of handling every message in a callback.
+
+        :param capacity: Number of recent samples kept.
+        :return: StateRingBuffer, or None if the data channel is not open.
+        """
+        channel = self.channel
+
+        if not channel or channel.readyState != "open":
+            print("Error: Data channel is not open")
+            return None
+
+        state_buffer = StateRingBuffer(topic, capacity)
+        self.subscribe(topic, state_buffer.put, rate, every)
+        return state_buffer
+
+    def unsubscribe(self, topic, callback=None):
+        """
+        Remove one callback from the topic, or all of them when callback is None.
+        The robot is told to stop sending only when no subscriber is left.
+        """
+        callbacks = self.subscriptions.get(topic, [])
+        raw_callbacks = self.raw_subscriptions.get(topic, [])
+        # A callback registered both normally and raw loses one registration per call
+        if not self._remove_callback(callbacks, callback) or callback is None:
+            self._remove_callback(raw_callbacks, callback)
+
+        if not raw_callbacks:
+            self.raw_subscriptions.pop(topic, None)
+        if callbacks or raw_callbacks:
+            return
+        self.subscriptions.pop(topic, None)
+        self.topic_meters.pop(topic, None)
+
         channel = self.channel
 
         if not channel or channel.readyState != "open":
@@ -139,4 +286,43 @@ class WebRTCDataChannelPubSub:
 
         self.publish_without_callback(topic=topic, msg_type=DATA_CHANNEL_TYPE["UNSUBSCRIBE"])
 
-    
\ No newline at end of file
+    @staticmethod
+    def _remove_callback(registrations, callback):
+        """Remove the first registration of callback, or all of them when it is None. Return whether any was removed."""
+        removed = False
+        for registered in tuple(registrations):
+            # Rate limited subscriptions are registered through their wrapper
+            if callback is None or registered == callback or getattr(registered, "callback", None) == callback:
+                registrations.remove(registered)
+                if isinstance(registered, RateLimitedCallback):
+                    registered.close()
+                removed = True
+                if callback is not None:
+                    break
+        return removed
+
+    def get_subscription_stats(self):
+        """
+        Report the incoming message rate of every subscribed topic and the rate
+        each of its callbacks effectively receives.
+        """
+        stats = {}
+        for topic, callbacks in self.subscriptions.items():
+            meter = self.topic_meters.get(topic)
+            subscribers = []
+            for callback in callbacks:
+                if isinstance(callback, RateLimitedCallback):
+                    subscribers.append(callback.stats())
+                else:
+                    subscribers.append({
+                        "received": meter.count,
+                        "delivered": meter.count,
+                        "dropped": 0,
+                        "rate": meter.rate,
+                    })
+            stats[topic] = {
+                "received": meter.count,
+                "rate": meter.rate,
+                "subscribers": subscribers,
+            }
+        return stats
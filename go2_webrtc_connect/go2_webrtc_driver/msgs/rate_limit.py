@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+
+class RateMeter:
+    """Message rate over the last `window` arrivals."""
+
+    def __init__(self, window=50):
+        self.arrivals = deque(maxlen=window)
+        self.count = 0
+
+    def tick(self, now=None):
+        self.arrivals.append(time.monotonic() if now is None else now)
+        self.count += 1
+
+    @property
+    def rate(self):
+        if len(self.arrivals) < 2:
+            return None
+        elapsed = self.arrivals[-1] - self.arrivals[0]
+        return (len(self.arrivals) - 1) / elapsed if elapsed > 0 else None
+
+
+class RateLimitedCallback:
+    """
+    Wraps a subscription callback so high-frequency topics are thinned out
+    before the callback runs:
+
+    - every: only every Nth message is passed on.
+    - rate: at most `rate` messages per second; messages inside the interval are dropped.
+    - coalesce: instead of dropping, keep only the latest message and deliver it
+      when the interval has passed (or on the next loop iteration without a rate).
+    """
+
+    def __init__(self, callback, rate=None, every=None, coalesce=False):
+        """
+        :param callback: Callback receiving the messages that pass the filter.
+        :param rate: Target rate in messages per second.
+        :param every: Pass on every Nth message.
+        :param coalesce: Deliver the latest message of each interval instead of dropping it.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive")
+        if every is not None and (int(every) != every or every < 1):
+            raise ValueError("every must be a positive integer")
+
+        self.callback = callback
+        self.rate = rate
+        self.every = every
+        self.coalesce = coalesce
+        self.interval = 1.0 / rate if rate else 0.0
+
+        self.skipped = 0
+        self.next_time = 0.0
+        self.latest = None
+        self.timer = None
+        self.received = 0
+        self.dropped = 0
+        self.meter = RateMeter()
+
+    def __call__(self, message):
+        self.received += 1
+
+        if self.every:
+            self.skipped += 1
+            if self.skipped < self.every:
+                self.dropped += 1
+                return
+            self.skipped = 0
+
+        now = time.monotonic()
+        if self.coalesce:
+            if self.latest is not None:
+                self.dropped += 1  # Replaced before it was delivered
+            self.latest = message
+            if self.timer is None:
+                loop = asyncio.get_event_loop()
+                if now >= self.next_time:
+                    self.timer = loop.call_soon(self._deliver_latest)
+                else:
+                    self.timer = loop.call_at(loop.time() + self.next_time - now, self._deliver_latest)
+            return
+
+        if now < self.next_time:
+            self.dropped += 1
+            return
+        self._deliver(message, now)
+
+    def _deliver_latest(self):
+        self.timer = None
+        message, self.latest = self.latest, None
+        if message is not None:
+            self._deliver(message, time.monotonic())
+
+    def _deliver(self, message, now):
+        self.next_time = now + self.interval
+        self.meter.tick(now)
+        try:
+            self.callback(message)
+        except Exception:
+            logging.error("Error in subscription callback", exc_info=True)
+
+    def close(self):
+        """Cancel a pending coalesced delivery."""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        self.latest = None
+
+    def stats(self):
+        return {
+            "target_rate": self.rate,
+            "every": self.every,
+            "coalesce": self.coalesce,
+            "received": self.received,
+            "delivered": self.meter.count,
+            "dropped": self.dropped,
+            "rate": self.meter.rate,
+        }
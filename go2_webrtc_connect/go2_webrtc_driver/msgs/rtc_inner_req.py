@@ -5,11 +5,14 @@ from ..constants import DATA_CHANNEL_TYPE, WebRTCConnectionMethod
 from ..util import generate_uuid
 
 class WebRTCChannelProbeResponse:
-    def __init__(self, channel, pub_sub):
+    def __init__(self, channel, pub_sub, link_monitor=None):
         self.channel = channel
         self.publish = pub_sub.publish_without_callback
+        self.link_monitor = link_monitor
         
     def handle_response(self, info):
+        if self.link_monitor:
+            self.link_monitor.on_rtt_probe()
         self.publish(
             "",
             info,
@@ -55,6 +58,7 @@ class WebRTCDataChannelNetworkStatus:
                 "",
                 data,
                 DATA_CHANNEL_TYPE["RTC_INNER_REQ"],
+                timeout=5,
             )
             self.handle_response(response.get("info"))
         except Exception as e:
@@ -200,12 +204,12 @@ def cancel(self):
     self.cancel_download = True
 
 class WebRTCDataChannelRTCInnerReq:
-    def __init__(self, conn, channel, pub_sub):
+    def __init__(self, conn, channel, pub_sub, link_monitor=None):
         self.conn = conn
         self.channel = channel
 
         self.network_status = WebRTCDataChannelNetworkStatus(self.conn, self.channel, pub_sub)
-        self.probe_res = WebRTCChannelProbeResponse(self.channel, pub_sub)
+        self.probe_res = WebRTCChannelProbeResponse(self.channel, pub_sub, link_monitor)
     
     def handle_response(self, msg):
         """Handle a received network status message."""
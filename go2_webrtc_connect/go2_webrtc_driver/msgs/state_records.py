@@ -0,0 +1,180 @@
+import logging
+import time
+
+import numpy as np
+
+from ..constants import RTC_TOPIC
+
+# Record layouts of rt/lf/lowstate and rt/(lf/)sportmodestate. Every message is
+# written into one row of a preallocated structured array, so a window of samples
+# can be read as plain arrays, e.g. buffer.recent()["motor_q"] has shape (T, 20).
+MOTOR_COUNT = 20
+LOW_STATE_DTYPE = np.dtype([
+    ("received", np.float64),  # time.time() when the message was stored
+    ("imu_rpy", np.float32, (3,)),
+    ("motor_q", np.float32, (MOTOR_COUNT,)),
+    ("motor_temperature", np.int16, (MOTOR_COUNT,)),
+    ("motor_lost", np.uint32, (MOTOR_COUNT,)),
+    ("foot_force", np.int16, (4,)),
+    ("bms_soc", np.uint8),
+    ("bms_current", np.int32),
+    ("bms_cycle", np.uint16),
+    ("bms_bq_ntc", np.int8, (2,)),
+    ("bms_mcu_ntc", np.int8, (2,)),
+    ("temperature_ntc1", np.int16),
+    ("power_v", np.float32),
+])
+
+SPORT_MODE_STATE_DTYPE = np.dtype([
+    ("received", np.float64),
+    ("stamp", np.float64),  # stamp.sec + stamp.nanosec * 1e-9
+    ("error_code", np.int32),
+    ("imu_quaternion", np.float32, (4,)),
+    ("imu_gyroscope", np.float32, (3,)),
+    ("imu_accelerometer", np.float32, (3,)),
+    ("imu_rpy", np.float32, (3,)),
+    ("imu_temperature", np.int16),
+    ("mode", np.uint8),
+    ("progress", np.float32),
+    ("gait_type", np.uint8),
+    ("foot_raise_height", np.float32),
+    ("position", np.float32, (3,)),
+    ("body_height", np.float32),
+    ("velocity", np.float32, (3,)),
+    ("yaw_speed", np.float32),
+    ("range_obstacle", np.float32, (4,)),
+    ("foot_force", np.int16, (4,)),
+    ("foot_position_body", np.float32, (12,)),
+    ("foot_speed_body", np.float32, (12,)),
+])
+
+
+def fit_motors(values, fill):
+    """Truncate or pad per-motor values to MOTOR_COUNT entries."""
+    if len(values) >= MOTOR_COUNT:
+        return values[:MOTOR_COUNT]
+    return values + [fill] * (MOTOR_COUNT - len(values))
+
+
+def low_state_row(data, received):
+    """
+    Flatten a LOW_STATE payload into a row tuple matching LOW_STATE_DTYPE.
+    A motor_state list that is not MOTOR_COUNT long is truncated, or padded
+    with NaN positions and zero temperature and loss counters.
+    """
+    motors = data["motor_state"]
+    bms = data["bms_state"]
+    return (
+        received,
+        data["imu_state"]["rpy"],
+        fit_motors([motor["q"] for motor in motors], np.nan),
+        fit_motors([motor["temperature"] for motor in motors], 0),
+        fit_motors([motor["lost"] for motor in motors], 0),
+        data["foot_force"],
+        bms["soc"],
+        bms["current"],
+        bms["cycle"],
+        bms["bq_ntc"],
+        bms["mcu_ntc"],
+        data["temperature_ntc1"],
+        data["power_v"],
+    )
+
+
+def sport_mode_state_row(data, received):
+    """Flatten a SPORT_MOD_STATE payload into a row tuple matching SPORT_MODE_STATE_DTYPE."""
+    imu = data["imu_state"]
+    stamp = data.get("stamp")
+    return (
+        received,
+        stamp["sec"] + stamp["nanosec"] * 1e-9 if stamp else 0.0,
+        data.get("error_code", 0),
+        imu["quaternion"],
+        imu["gyroscope"],
+        imu["accelerometer"],
+        imu["rpy"],
+        imu["temperature"],
+        data["mode"],
+        data["progress"],
+        data["gait_type"],
+        data["foot_raise_height"],
+        data["position"],
+        data["body_height"],
+        data["velocity"],
+        data["yaw_speed"],
+        data["range_obstacle"],
+        data["foot_force"],
+        data["foot_position_body"],
+        data["foot_speed_body"],
+    )
+
+
+# topic -> (dtype, row builder)
+STATE_RECORD_LAYOUTS = {
+    RTC_TOPIC["LOW_STATE"]: (LOW_STATE_DTYPE, low_state_row),
+    RTC_TOPIC["SPORT_MOD_STATE"]: (SPORT_MODE_STATE_DTYPE, sport_mode_state_row),
+    RTC_TOPIC["LF_SPORT_MOD_STATE"]: (SPORT_MODE_STATE_DTYPE, sport_mode_state_row),
+}
+
+
+class StateRingBuffer:
+    """
+    Fixed-size ring buffer of typed state samples backed by one preallocated
+    numpy structured array. put() is a subscription callback: it writes the
+    message payload into the next row and allocates no per-sample objects
+    beyond the parsed message itself.
+    """
+
+    def __init__(self, topic, capacity=1024):
+        """
+        :param topic: RTC_TOPIC["LOW_STATE"], RTC_TOPIC["SPORT_MOD_STATE"] or RTC_TOPIC["LF_SPORT_MOD_STATE"].
+        :param capacity: Number of recent samples kept.
+        """
+        if topic not in STATE_RECORD_LAYOUTS:
+            raise ValueError(f"No typed layout for topic {topic}")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+
+        self.topic = topic
+        self.dtype, self.build_row = STATE_RECORD_LAYOUTS[topic]
+        self.records = np.zeros(capacity, dtype=self.dtype)
+        self.capacity = capacity
+        self.count = 0  # Total number of samples stored
+        self.errors = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def put(self, message):
+        """Store message['data']; malformed payloads are counted and skipped, the first one is logged."""
+        try:
+            self.records[self.count % self.capacity] = self.build_row(message["data"], time.time())
+        except (KeyError, TypeError, ValueError):
+            self.errors += 1
+            if self.errors == 1:
+                logging.warning("Skipping malformed %s sample; later ones are only counted in errors",
+                                self.topic, exc_info=True)
+            return
+        self.count += 1
+
+    def latest(self):
+        """The newest sample as a structured scalar, or None if nothing was received."""
+        if not self.count:
+            return None
+        return self.records[(self.count - 1) % self.capacity]
+
+    def recent(self, n=None):
+        """
+        The newest n samples (all stored samples by default), oldest first.
+        Returns a view when the window doesn't wrap around the ring, a copy otherwise.
+        """
+        size = len(self)
+        n = size if n is None else min(n, size)
+        end = self.count % self.capacity if self.count >= self.capacity else self.count
+        start = end - n
+        if start >= 0:
+            return self.records[start:end]
+        return np.concatenate((self.records[start:], self.records[:end]))
+
+    def clear(self):
+        self.count = 0
@@ -0,0 +1,83 @@
+import asyncio
+from collections import deque
+
+# Queue policies for TopicSubscription
+DROP_OLDEST = "drop_oldest"  # Keep the newest `maxsize` messages
+KEEP_LATEST = "keep_latest"  # Keep only the newest message
+
+
+class TopicSubscription:
+    """
+    Bounded per-subscriber message queue that can be consumed as an async iterator:
+
+        async for message in pub_sub.subscribe_queue(topic):
+            ...
+
+    When the consumer falls behind, messages are dropped according to the policy
+    instead of piling up, and counted in `dropped`.
+    """
+
+    def __init__(self, pub_sub, topic, maxsize=16, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, KEEP_LATEST):
+            raise ValueError("Invalid policy. Choose 'drop_oldest' or 'keep_latest'.")
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.pub_sub = pub_sub
+        self.topic = topic
+        self.maxsize = 1 if policy == KEEP_LATEST else maxsize
+        self.policy = policy
+        self.queue = deque()
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+        self.waiter = None
+
+    def put(self, message):
+        """Enqueue a message; called by the pub/sub dispatcher."""
+        if self.closed:
+            return
+        self.received += 1
+        if len(self.queue) >= self.maxsize:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(message)
+
+        if self.waiter and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self):
+        """Wait for the next message. Raises StopAsyncIteration once closed and drained."""
+        while not self.queue:
+            if self.closed:
+                raise StopAsyncIteration
+            self.waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.queue.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def close(self):
+        """Detach from the topic and wake up a waiting consumer."""
+        if self.closed:
+            return
+        self.closed = True
+        self.pub_sub.unsubscribe(self.topic, self.put)
+        if self.waiter and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def stats(self):
+        return {
+            "topic": self.topic,
+            "policy": self.policy,
+            "queued": len(self.queue),
+            "received": self.received,
+            "dropped": self.dropped,
+        }
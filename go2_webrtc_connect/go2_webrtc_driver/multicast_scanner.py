@@ -1,11 +1,14 @@
+import asyncio
 import socket
 import struct
 import json
 import logging
+import time
 
 RECV_PORT = 10134  # Port where the devices will send the multicast responses
 MULTICAST_GROUP = '231.1.1.1'  # Multicast group IP address
 MULTICAST_PORT = 10131  # Port to send multicast query to devices
+QUERY_MESSAGE = json.dumps({"name": "unitree_dapengche"}).encode('utf-8')
 
 def discover_ip_sn(timeout=2):
     print("Discovering devices on the network...")
@@ -26,10 +29,8 @@ def discover_ip_sn(timeout=2):
     sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
 
     # Send a multicast query to discover devices
-    query_message = json.dumps({"name": "unitree_dapengche"})
-    
     try:
-        sock.sendto(query_message.encode('utf-8'), (MULTICAST_GROUP, MULTICAST_PORT))
+        sock.sendto(QUERY_MESSAGE, (MULTICAST_GROUP, MULTICAST_PORT))
     except Exception as e:
         logging.error(f"Error sending multicast query: {e}")
         sock.close()
@@ -62,6 +63,146 @@ def discover_ip_sn(timeout=2):
 
     return serial_to_ip
 
+def create_multicast_socket():
+    """Create a non-blocking UDP socket bound to RECV_PORT and joined to the multicast group."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        # Let other scanners (e.g. a second app) share the response port
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('', RECV_PORT))
+
+    mreq = struct.pack("4sl", socket.inet_aton(MULTICAST_GROUP), socket.INADDR_ANY)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    sock.setblocking(False)
+    return sock
+
+
+class MulticastScannerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, scanner):
+        self.scanner = scanner
+
+    def datagram_received(self, data, addr):
+        try:
+            message_dict = json.loads(data.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            logging.error(f"Error decoding JSON message: {e}")
+            return
+        if isinstance(message_dict, dict) and "sn" in message_dict:
+            self.scanner.add_device(message_dict["sn"], message_dict.get("ip", addr[0]))
+
+    def error_received(self, exc):
+        logging.error(f"Multicast scanner error: {exc}")
+
+
+class MulticastScanner:
+    """
+    Background multicast discovery. The scanner keeps listening for device
+    announcements, re-sends the query every query_interval seconds and keeps a
+    serial number -> IP cache whose entries expire after ttl seconds.
+    """
+
+    def __init__(self, ttl=60, query_interval=10):
+        self.ttl = ttl
+        self.query_interval = query_interval
+        self.cache = {}  # serial number -> (ip, last seen monotonic time)
+        self.transport = None
+        self.query_task = None
+        self.waiters = {}  # serial number -> list of futures waiting for it
+
+    @property
+    def running(self):
+        return self.transport is not None
+
+    async def start(self):
+        """Bind the listening socket and start the periodic query loop."""
+        if self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: MulticastScannerProtocol(self), sock=create_multicast_socket()
+        )
+        self.query_task = asyncio.ensure_future(self._query_loop())
+
+    def stop(self):
+        """Stop the query loop and close the socket. The cache is kept."""
+        if self.query_task:
+            self.query_task.cancel()
+            self.query_task = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+    async def _query_loop(self):
+        while True:
+            self.send_query()
+            await asyncio.sleep(self.query_interval)
+
+    def send_query(self):
+        try:
+            self.transport.sendto(QUERY_MESSAGE, (MULTICAST_GROUP, MULTICAST_PORT))
+        except Exception as e:
+            logging.error(f"Error sending multicast query: {e}")
+
+    def add_device(self, serial_number, ip_address):
+        if serial_number not in self.cache:
+            print(f"Discovered device: {serial_number} at {ip_address}")
+        self.cache[serial_number] = (ip_address, time.monotonic())
+
+        for future in self.waiters.pop(serial_number, []):
+            if not future.done():
+                future.set_result(ip_address)
+
+    def lookup(self, serial_number):
+        """Return the cached IP for the serial number, or None if unknown or expired."""
+        entry = self.cache.get(serial_number)
+        if entry is None:
+            return None
+        ip_address, last_seen = entry
+        if time.monotonic() - last_seen > self.ttl:
+            del self.cache[serial_number]
+            return None
+        return ip_address
+
+    def devices(self):
+        """Return all non-expired serial number -> IP entries."""
+        now = time.monotonic()
+        return {sn: ip for sn, (ip, last_seen) in self.cache.items() if now - last_seen <= self.ttl}
+
+    async def query(self, serial_number, timeout=2):
+        """
+        Send an active query and wait until the serial number answers.
+        Returns as soon as the device is seen, or None after the timeout.
+        """
+        ip_address = self.lookup(serial_number)
+        if ip_address:
+            return ip_address
+
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(serial_number, []).append(future)
+        self.send_query()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self.waiters.get(serial_number)
+            if waiters and future in waiters:
+                waiters.remove(future)
+
+
+_default_scanner = None
+
+async def get_multicast_scanner():
+    """Return the process-wide background scanner, starting it on first use."""
+    global _default_scanner
+    if _default_scanner is None:
+        _default_scanner = MulticastScanner()
+    await _default_scanner.start()
+    return _default_scanner
+
+
 if __name__ == '__main__':
     print("Discovering devices on the network...")
     serial_to_ip = discover_ip_sn(timeout=3)
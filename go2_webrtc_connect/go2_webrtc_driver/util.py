@@ -5,6 +5,7 @@ import requests
 import time
 import sys
 import os
+from collections.abc import Mapping
 import jwt
 from dotenv import load_dotenv  # 추가
 from Crypto.PublicKey import RSA
@@ -32,7 +33,7 @@ def generate_uuid():
 def get_nested_field(message, *fields):
     current_level = message
     for field in fields:
-        if isinstance(current_level, dict) and field in current_level:
+        if isinstance(current_level, Mapping) and field in current_level:
             current_level = current_level[field]
         else:
             return None
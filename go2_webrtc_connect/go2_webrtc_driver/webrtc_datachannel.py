@@ -4,34 +4,55 @@ import logging
 import struct
 import sys
 from .msgs.pub_sub import WebRTCDataChannelPubSub
-from .lidar.lidar_decoder_unified import UnifiedLidarDecoder
+from .lidar.lidar_decoder_unified import UnifiedLidarDecoder, LazyDecodedData
+from .lidar.lidar_decode_pool import LidarDecodePool
 from .msgs.heartbeat import WebRTCDataChannelHeartBeat
 from .msgs.validation import WebRTCDataChannelValidaton
 from .msgs.rtc_inner_req import WebRTCDataChannelRTCInnerReq
+from .msgs.link_monitor import WebRTCLinkMonitor
 from .util import print_status
 from .msgs.error_handler import handle_error
+from .json_codec import get_json_codec
 
 from .constants import DATA_CHANNEL_TYPE
 
 
 class WebRTCDataChannel:
-    def __init__(self, conn, pc) -> None:
+    def __init__(self, conn, pc, codec=None) -> None:
         self.channel = pc.createDataChannel("data")
         self.data_channel_opened = False
         self.conn = conn
 
-        self.pub_sub = WebRTCDataChannelPubSub(self.channel)
+        # JSON codec for the hot path; orjson when installed unless another is given
+        self.codec = get_json_codec(codec) if codec is None or isinstance(codec, str) else codec
 
-        self.heartbeat = WebRTCDataChannelHeartBeat(self.channel, self.pub_sub)
+        self.pub_sub = WebRTCDataChannelPubSub(self.channel, codec=self.codec)
+
+        self.link_monitor = WebRTCLinkMonitor(self.conn)
+
+        self.heartbeat = WebRTCDataChannelHeartBeat(self.channel, self.pub_sub, self.link_monitor)
         self.validaton = WebRTCDataChannelValidaton(self.channel, self.pub_sub)
-        self.rtc_inner_req = WebRTCDataChannelRTCInnerReq(self.conn, self.channel, self.pub_sub)
+        self.rtc_inner_req = WebRTCDataChannelRTCInnerReq(self.conn, self.channel, self.pub_sub, self.link_monitor)
 
+        self.decode_pool = None
+        # Only selects the decoder; it is created when the first frame is decoded
         self.set_decoder(decoder_type = 'libvoxel')
 
+        # Control message handlers: type -> topic -> (callback, is_async); topic None handles any topic
+        self.response_handlers = {}
+        self.set_response_handler(DATA_CHANNEL_TYPE["VALIDATION"], self.validaton.handle_response, is_async=True)
+        self.set_response_handler(DATA_CHANNEL_TYPE["RTC_INNER_REQ"], self.rtc_inner_req.handle_response)
+        self.set_response_handler(DATA_CHANNEL_TYPE["HEARTBEAT"], self.heartbeat.handle_response)
+        self.set_response_handler(DATA_CHANNEL_TYPE["ERRORS"], handle_error)
+        self.set_response_handler(DATA_CHANNEL_TYPE["ADD_ERROR"], handle_error)
+        self.set_response_handler(DATA_CHANNEL_TYPE["RM_ERROR"], handle_error)
+        self.set_response_handler(DATA_CHANNEL_TYPE["ERR"], self.validaton.handle_err_response, is_async=True)
+
         #Event handler for Validation succeed
         def on_validate():
             self.data_channel_opened = True
             self.heartbeat.start_heartbeat()
+            self.link_monitor.start()
             self.rtc_inner_req.network_status.start_network_status_fetch()
             print_status("Data Channel Verification", "✅ OK")
             
@@ -55,12 +76,16 @@ class WebRTCDataChannel:
             logging.info("Data channel closed")
             self.data_channel_opened = False
             self.heartbeat.stop_heartbeat()
+            self.link_monitor.stop()
             self.rtc_inner_req.network_status.stop_network_status_fetch()
+            # Shut the decode workers down; a reconnect creates a new data channel
+            self.set_decode_pool(0)
             
         # Event handler for data channel messages
         @self.channel.on("message")
         async def on_message(message):
-            logging.info("Received message on data channel: %s", message)
+            # Debug level: formatting every lowstate message at info level is costly
+            logging.debug("Received message on data channel: %s", message)
             try:
             
                 # Check if the message is not empty
@@ -69,9 +94,18 @@ class WebRTCDataChannel:
 
                 # Determine how to parse the 'data' field
                 if isinstance(message, str):
-                    parsed_data = json.loads(message)
+                    parsed_data = self.codec.loads(message)
                 elif isinstance(message, bytes):
                     parsed_data = self.deal_array_buffer(message)
+                    # Raw subscribers (e.g. a LidarRecorder) see every frame, before any is dropped
+                    self.pub_sub.run_raw(parsed_data)
+                    # Binary payloads nobody listens to (e.g. requested by another app) stop here
+                    if not self.pub_sub.has_consumers(parsed_data.get("topic")):
+                        return
+                    # Decode off the event loop; the pool dispatches the frame once decoded
+                    if self.decode_pool and isinstance(parsed_data.get("data"), LazyDecodedData):
+                        self.decode_pool.submit(parsed_data, self.pub_sub.run_resolve)
+                        return
                 
                 # Resolve any pending futures or callbacks associated with this message
                 self.pub_sub.run_resolve(parsed_data)
@@ -85,19 +119,30 @@ class WebRTCDataChannel:
                 logging.error("Error processing WebRTC data", exc_info=True)
 
 
+    def set_response_handler(self, msg_type, callback, is_async=False, topic=None):
+        """
+        Handle incoming messages of a type with callback(message).
+
+        :param is_async: Whether the callback is a coroutine function.
+        :param topic: Only handle messages of this topic. A handler for the message's
+                      topic takes precedence over the handler of its type.
+        """
+        self.response_handlers.setdefault(msg_type, {})[topic] = (callback, is_async)
+
     async def handle_response(self, msg: dict):
-        msg_type = msg["type"]
-
-        if msg_type == DATA_CHANNEL_TYPE["VALIDATION"]:
-            await self.validaton.handle_response(msg)
-        elif msg_type == DATA_CHANNEL_TYPE["RTC_INNER_REQ"]:
-            self.rtc_inner_req.handle_response(msg)
-        elif msg_type == DATA_CHANNEL_TYPE["HEARTBEAT"]:
-            self.heartbeat.handle_response(msg)
-        elif msg_type in {DATA_CHANNEL_TYPE["ERRORS"], DATA_CHANNEL_TYPE["ADD_ERROR"], DATA_CHANNEL_TYPE["RM_ERROR"]}:
-            handle_error(msg)
-        elif msg_type == DATA_CHANNEL_TYPE["ERR"]:
-            await self.validaton.handle_err_response(msg)
+        # Most messages (topic data) have no handler and stop at the first lookup
+        handlers = self.response_handlers.get(msg["type"])
+        if handlers is None:
+            return
+        handler = handlers.get(msg.get("topic")) or handlers.get(None)
+        if handler is None:
+            return
+
+        callback, is_async = handler
+        if is_async:
+            await callback(msg)
+        else:
+            callback(msg)
         
 
     async def wait_datachannel_open(self, timeout=5):
@@ -126,11 +171,10 @@ class WebRTCDataChannel:
         json_data = buffer[4:4 + header_length]
         binary_data = buffer[4 + header_length:]
 
-        decoded_json = json.loads(json_data.decode('utf-8'))
+        decoded_json = self.codec.loads(json_data)
 
-        decoded_data = self.decoder.decode(binary_data, decoded_json['data'])
-
-        decoded_json['data']['data'] = decoded_data
+        # Decoded on first access to decoded_json['data']['data']
+        decoded_json['data'] = self.decoder.decode_lazy(binary_data, decoded_json['data'])
         return decoded_json
 
     def deal_array_buffer_for_lidar(self, buffer):
@@ -138,11 +182,10 @@ class WebRTCDataChannel:
         json_data = buffer[8:8 + header_length]
         binary_data = buffer[8 + header_length:]
 
-        decoded_json = json.loads(json_data.decode('utf-8'))
-
-        decoded_data = self.decoder.decode(binary_data, decoded_json['data'])
+        decoded_json = self.codec.loads(json_data)
 
-        decoded_json['data']['data'] = decoded_data
+        # Decoded on first access to decoded_json['data']['data']
+        decoded_json['data'] = self.decoder.decode_lazy(binary_data, decoded_json['data'])
         return decoded_json
 
     
@@ -182,17 +225,54 @@ class WebRTCDataChannel:
         )
         print(f"Audio channel: {'on' if switch else 'off'}")
     
-    def set_decoder(self, decoder_type):
+    def set_codec(self, codec):
+        """
+        Set the JSON codec used to parse incoming and serialize outgoing messages.
+
+        :param codec: "orjson", "json" or an object with loads()/dumps().
+        """
+        self.codec = get_json_codec(codec) if isinstance(codec, str) else codec
+        self.pub_sub.codec = self.codec
+
+    def set_decoder(self, decoder_type, debug_info=False, output_buffers=0):
         """
         Set the decoder to be used for decoding incoming data.
 
         :param decoder_type: The type of decoder to use ("libvoxel" or "native").
+        :param debug_info: Compile the libvoxel module with debug info.
+        :param output_buffers: Decode into a ring of this many reused frame buffers.
+                               A decoded frame is only valid until that many newer
+                               frames were decoded. Each decode pool worker has its own ring.
         """
         if decoder_type not in ["libvoxel", "native"]:
             raise ValueError("Invalid decoder type. Choose 'libvoxel' or 'native'.")
 
         # Create an instance of UnifiedLidarDecoder with the specified type
-        self.decoder = UnifiedLidarDecoder(decoder_type=decoder_type)
+        self.decoder_type = decoder_type
+        self.debug_info = debug_info
+        self.output_buffers = output_buffers
+        self.decoder = UnifiedLidarDecoder(decoder_type=decoder_type, debug_info=debug_info, output_buffers=output_buffers)
         print(f"Decoder set to: {self.decoder.get_decoder_name()}")
+
+        # Restart the decode pool so its workers use the new decoder
+        if self.decode_pool:
+            pool = self.decode_pool
+            self.set_decode_pool(pool.workers, pool.executor_type, pool.max_in_flight)
+
+    def set_decode_pool(self, workers=2, executor="thread", max_in_flight=None):
+        """
+        Decode binary lidar payloads on a worker pool instead of the event loop.
+
+        :param workers: Number of worker threads/processes, or 0 to decode inline again.
+        :param executor: "thread" or "process".
+        :param max_in_flight: Frames pending at most; see LidarDecodePool.
+        """
+        if self.decode_pool:
+            self.decode_pool.close()
+            self.decode_pool = None
+        if workers:
+            self.decode_pool = LidarDecodePool(
+                self.decoder_type, workers, executor, max_in_flight, self.debug_info, self.output_buffers
+            )
     
     
@@ -2,31 +2,56 @@ import asyncio
 import logging
 import json
 import sys
+import time
 from aiortc import RTCPeerConnection, RTCSessionDescription, RTCIceServer, RTCConfiguration
 from aiortc.contrib.media import MediaPlayer
 from .unitree_auth import send_sdp_to_local_peer, send_sdp_to_remote_peer
 from .webrtc_datachannel import WebRTCDataChannel
 from .webrtc_audio import WebRTCAudioChannel
 from .webrtc_video import WebRTCVideoChannel
-from .constants import DATA_CHANNEL_TYPE, WebRTCConnectionMethod
+from .constants import DATA_CHANNEL_TYPE, DEFAULT_ICE_POLICY, STUN_SERVER_URL, WebRTCConnectionMethod, WebRTCIcePolicy
 from .util import fetch_public_key, fetch_token, fetch_turn_server_info, print_status, TokenManager
-from .multicast_scanner import discover_ip_sn
+from .multicast_scanner import get_multicast_scanner
+from .webrtc_pool import WebRTCPeerConnectionPool
+
+try:
+    from aioice import TransportPolicy
+except ImportError:  # aioice < 0.9 has no transport policy
+    TransportPolicy = None
+
+
+def relay_only_sdp(sdp):
+    """Remove the host and server reflexive candidates from an SDP, keeping the relay ones."""
+    return "".join(
+        line for line in sdp.splitlines(keepends=True)
+        if not line.startswith("a=candidate:") or " typ relay" in line
+    )
 
 # # Enable logging for debugging
 # logging.basicConfig(level=logging.INFO)
 
 class Go2WebRTCConnection:
-    def __init__(self, connectionMethod: WebRTCConnectionMethod, serialNumber=None, ip=None, username=None, password=None) -> None:
+    def __init__(self, connectionMethod: WebRTCConnectionMethod, serialNumber=None, ip=None, username=None, password=None, warmPoolSize=0, icePolicy: WebRTCIcePolicy = None) -> None:
         self.pc = None
         self.sn = serialNumber
         self.ip = ip
         self.connectionMethod = connectionMethod
         self.isConnected = False
 
+        # Which candidate types are gathered; defaults depend on the connection method
+        self.ice_policy = icePolicy or DEFAULT_ICE_POLICY[connectionMethod]
+        # Connect durations in seconds per ICE policy name: [{"local_setup": .., "total": ..}, ...]
+        self.connect_timings = {}
+
         # TokenManager를 사용하여 토큰을 불러오고, 없거나 만료되었을 때만 새로 발급
         self.token_manager = TokenManager()
         self.token = self.token_manager.get_token()
 
+        # Optional pool of pre-warmed peer connections used by connect()/reconnect()
+        self.warm_pool = WebRTCPeerConnectionPool(
+            self.prepare_peer_connection, size=warmPoolSize, scope=(connectionMethod, self.ice_policy)
+        ) if warmPoolSize > 0 else None
+
     async def connect(self):
         print_status("WebRTC connection", "🟡 started")
         if self.connectionMethod == WebRTCConnectionMethod.Remote:
@@ -35,25 +60,28 @@ class Go2WebRTCConnection:
             await self.init_webrtc(turn_server_info)
         elif self.connectionMethod == WebRTCConnectionMethod.LocalSTA:
             if not self.ip and self.sn:
-                discovered_ip_sn_addresses = discover_ip_sn()
-                
-                if discovered_ip_sn_addresses:
-                    if self.sn in discovered_ip_sn_addresses:
-                        self.ip = discovered_ip_sn_addresses[self.sn]
-                    else:
+                # Resolve from the background scanner cache, querying only on a miss
+                scanner = await get_multicast_scanner()
+                self.ip = scanner.lookup(self.sn) or await scanner.query(self.sn)
+
+                if not self.ip:
+                    if scanner.devices():
                         raise ValueError("The provided serial number wasn't found on the network. Provide an IP address instead.")
-                else:
-                    raise ValueError("No devices found on the network. Provide an IP address instead.")
+                    else:
+                        raise ValueError("No devices found on the network. Provide an IP address instead.")
 
             await self.init_webrtc(ip=self.ip)
         elif self.connectionMethod == WebRTCConnectionMethod.LocalAP:
             self.ip = "192.168.12.1"
             await self.init_webrtc(ip=self.ip)
     
-    async def disconnect(self):
+    async def disconnect(self, closeWarmPool=False):
         if self.pc:
+            self.datachannel.set_decode_pool(0)
             await self.pc.close()
             self.pc = None
+        if closeWarmPool and self.warm_pool:
+            await self.warm_pool.close()
         self.isConnected = False
         print_status("WebRTC connection", "🔴 disconnected")
 
@@ -62,7 +90,13 @@ class Go2WebRTCConnection:
         await self.connect()
         print_status("WebRTC connection", "🟢 reconnected")
 
-    def create_webrtc_configuration(self, turn_server_info, stunEnable=True, turnEnable=True) -> RTCConfiguration:
+    def create_webrtc_configuration(self, turn_server_info, stunEnable=None, turnEnable=None) -> RTCConfiguration:
+        # Unless forced by the caller, STUN/TURN usage follows the ICE policy
+        if stunEnable is None:
+            stunEnable = self.ice_policy in (WebRTCIcePolicy.HostStun, WebRTCIcePolicy.All)
+        if turnEnable is None:
+            turnEnable = self.ice_policy in (WebRTCIcePolicy.Relay, WebRTCIcePolicy.All)
+
         ice_servers = []
 
         if turn_server_info:
@@ -79,16 +113,18 @@ class Go2WebRTCConnection:
                             credential=credential
                         )
                     )
-                if stunEnable:
-                    # Use Google's public STUN server
-                    stun_url = "stun:stun.l.google.com:19302"
-                    ice_servers.append(
-                        RTCIceServer(
-                            urls=[stun_url]
-                        )
-                    )
             else:
                 raise ValueError("Invalid TURN server information")
+        elif self.ice_policy == WebRTCIcePolicy.Relay:
+            raise ValueError("Relay ICE policy requires TURN server information")
+
+        if stunEnable:
+            # Use Google's public STUN server
+            ice_servers.append(
+                RTCIceServer(
+                    urls=[STUN_SERVER_URL]
+                )
+            )
         
         configuration = RTCConfiguration(
             iceServers=ice_servers
@@ -96,19 +132,105 @@ class Go2WebRTCConnection:
         
         return configuration
 
+    def restrict_to_relay_candidates(self, pc):
+        """
+        Make every ICE transport of the peer connection gather relay candidates only.
+        aiortc's RTCConfiguration has no iceTransportPolicy and aioice only takes the
+        policy when its connection is created, so it is set on the aioice connections
+        before the offer triggers gathering, where the installed versions allow it.
+        Whether or not that works, the offer only lists relay candidates (see
+        offer_sdp()).
+
+        :return: True if gathering is restricted to relay candidates.
+        """
+        dtls_transports = [transceiver.sender.transport for transceiver in pc.getTransceivers()]
+        if pc.sctp:
+            dtls_transports.append(pc.sctp.transport)
+
+        enforced = TransportPolicy is not None
+        for dtls_transport in dtls_transports:
+            gatherer = getattr(dtls_transport.transport, "iceGatherer", None)
+            connection = getattr(gatherer, "_connection", None)
+            if enforced and hasattr(connection, "_transport_policy"):
+                connection._transport_policy = TransportPolicy.RELAY
+            else:
+                enforced = False
+
+        if not enforced:
+            logging.warning(
+                "The installed aiortc/aioice cannot restrict ICE gathering to relay candidates: "
+                "host and reflexive candidates are still gathered, but only relay candidates are offered"
+            )
+        return enforced
+
+    def offer_sdp(self, pc):
+        """The SDP of the local offer, with relay candidates only under the Relay ICE policy."""
+        sdp = pc.localDescription.sdp
+        if self.ice_policy == WebRTCIcePolicy.Relay:
+            sdp = relay_only_sdp(sdp)
+        return sdp
+
     async def init_webrtc(self, turn_server_info=None, ip=None):
+        started_at = time.perf_counter()
         configuration = self.create_webrtc_configuration(turn_server_info)
-        self.pc = RTCPeerConnection(configuration)
 
+        prepared = self.warm_pool.acquire(configuration) if self.warm_pool else None
+        if prepared is not None:
+            print_status("Peer Connection", "♻️ pre-warmed")
+        else:
+            prepared = await self.prepare_peer_connection(configuration)
+
+        self.pc, self.datachannel, self.audio, self.video = prepared
+        local_setup_time = time.perf_counter() - started_at
+
+        # Refill in the background so the next reconnect can skip the local setup
+        if self.warm_pool:
+            self.warm_pool.schedule_fill(configuration)
+
+        if self.connectionMethod == WebRTCConnectionMethod.Remote:
+            peer_answer_json = await self.get_answer_from_remote_peer(self.pc, turn_server_info)
+        elif self.connectionMethod == WebRTCConnectionMethod.LocalSTA or self.connectionMethod == WebRTCConnectionMethod.LocalAP:
+            peer_answer_json = await self.get_answer_from_local_peer(self.pc, self.ip)
 
-        self.datachannel = WebRTCDataChannel(self, self.pc)
+        if peer_answer_json is not None:
+            peer_answer = json.loads(peer_answer_json)
+        else:
+            print("Could not get SDP from the peer. Check if the Go2 is switched on")
+            sys.exit(1)
 
-        self.audio = WebRTCAudioChannel(self.pc, self.datachannel)
-        self.video = WebRTCVideoChannel(self.pc, self.datachannel)
+        if peer_answer['sdp'] == "reject":
+            print("Go2 is connected by another WebRTC client. Close your mobile APP and try again.")
+            sys.exit(1)
 
-        @self.pc.on("icegatheringstatechange")
+        remote_sdp = RTCSessionDescription(sdp=peer_answer['sdp'], type=peer_answer['type']) 
+        await self.pc.setRemoteDescription(remote_sdp)
+   
+        await self.datachannel.wait_datachannel_open()
+
+        total_time = time.perf_counter() - started_at
+        self.connect_timings.setdefault(self.ice_policy.name, []).append({
+            "local_setup": local_setup_time,
+            "total": total_time
+        })
+        print_status("Connect time", f"{total_time:.2f}s ({self.ice_policy.name})")
+
+    async def prepare_peer_connection(self, configuration):
+        """
+        Run the local part of the WebRTC setup: create the peer connection with its
+        data/audio/video channels, create the offer and gather the ICE candidates.
+
+        :return: Tuple of (pc, datachannel, audio, video) ready to be sent to the robot.
+        """
+        pc = RTCPeerConnection(configuration)
+
+        datachannel = WebRTCDataChannel(self, pc)
+
+        audio = WebRTCAudioChannel(pc, datachannel)
+        video = WebRTCVideoChannel(pc, datachannel)
+
+        @pc.on("icegatheringstatechange")
         async def on_ice_gathering_state_change():
-            state = self.pc.iceGatheringState
+            state = pc.iceGatheringState
             if state == "new":
                 print_status("ICE Gathering State", "🔵 new")
             elif state == "gathering":
@@ -117,9 +239,12 @@ class Go2WebRTCConnection:
                 print_status("ICE Gathering State", "🟢 complete")
 
 
-        @self.pc.on("iceconnectionstatechange")
+        @pc.on("iceconnectionstatechange")
         async def on_ice_connection_state_change():
-            state = self.pc.iceConnectionState
+            # Warm peer connections waiting in the pool are not reported
+            if pc is not self.pc:
+                return
+            state = pc.iceConnectionState
             if state == "checking":
                 print_status("ICE Connection State", "🔵 checking")
             elif state == "completed":
@@ -130,9 +255,11 @@ class Go2WebRTCConnection:
                 print_status("ICE Connection State", "⚫ closed")
 
 
-        @self.pc.on("connectionstatechange")
+        @pc.on("connectionstatechange")
         async def on_connection_state_change():
-            state = self.pc.connectionState
+            if pc is not self.pc:
+                return
+            state = pc.connectionState
             if state == "connecting":
                 print_status("Peer Connection State", "🔵 connecting")
             elif state == "connected":
@@ -144,9 +271,9 @@ class Go2WebRTCConnection:
             elif state == "failed":
                 print_status("Peer Connection State", "🔴 failed")
         
-        @self.pc.on("signalingstatechange")
+        @pc.on("signalingstatechange")
         async def on_signaling_state_change():
-            state = self.pc.signalingState
+            state = pc.signalingState
             if state == "stable":
                 print_status("Signaling State", "🟢 stable")
             elif state == "have-local-offer":
@@ -156,53 +283,37 @@ class Go2WebRTCConnection:
             elif state == "closed":
                 print_status("Signaling State", "⚫ closed")
         
-        @self.pc.on("track")
+        @pc.on("track")
         async def on_track(track):
             logging.info("Track recieved: %s", track.kind)
 
             if track.kind == "video":
                 #await for the first frame, #ToDo make the code more nicer
                 frame = await track.recv()
-                await self.video.track_handler(track)
+                await video.track_handler(track)
                 
             if track.kind == "audio":
                 frame = await track.recv()
                 while True:
                     frame = await track.recv()
-                    await self.audio.frame_handler(frame)
-
-        logging.info("Creating offer...")
-        offer = await self.pc.createOffer()
-        await self.pc.setLocalDescription(offer)
+                    await audio.frame_handler(frame)
 
-        if self.connectionMethod == WebRTCConnectionMethod.Remote:
-            peer_answer_json = await self.get_answer_from_remote_peer(self.pc, turn_server_info)
-        elif self.connectionMethod == WebRTCConnectionMethod.LocalSTA or self.connectionMethod == WebRTCConnectionMethod.LocalAP:
-            peer_answer_json = await self.get_answer_from_local_peer(self.pc, self.ip)
+        if self.ice_policy == WebRTCIcePolicy.Relay:
+            self.restrict_to_relay_candidates(pc)
 
-        if peer_answer_json is not None:
-            peer_answer = json.loads(peer_answer_json)
-        else:
-            print("Could not get SDP from the peer. Check if the Go2 is switched on")
-            sys.exit(1)
-
-        if peer_answer['sdp'] == "reject":
-            print("Go2 is connected by another WebRTC client. Close your mobile APP and try again.")
-            sys.exit(1)
+        logging.info("Creating offer...")
+        offer = await pc.createOffer()
+        await pc.setLocalDescription(offer)
 
-        remote_sdp = RTCSessionDescription(sdp=peer_answer['sdp'], type=peer_answer['type']) 
-        await self.pc.setRemoteDescription(remote_sdp)
-   
-        await self.datachannel.wait_datachannel_open()
+        return pc, datachannel, audio, video
 
-    
     async def get_answer_from_remote_peer(self, pc, turn_server_info):
         sdp_offer = pc.localDescription
 
         sdp_offer_json = {
             "id": "",
             "turnserver": turn_server_info,
-            "sdp": sdp_offer.sdp,
+            "sdp": self.offer_sdp(pc),
             "type": sdp_offer.type,
             "token": self.token
         }
@@ -218,7 +329,7 @@ class Go2WebRTCConnection:
 
         sdp_offer_json = {
             "id": "STA_localNetwork" if self.connectionMethod == WebRTCConnectionMethod.LocalSTA else "",
-            "sdp": sdp_offer.sdp,
+            "sdp": self.offer_sdp(pc),
             "type": sdp_offer.type,
             "token": self.token
         }
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+
+
+def configuration_key(configuration, scope=()):
+    """
+    Build a hashable key for an RTCConfiguration so that warm peer connections
+    are only reused with the ICE servers they were gathered against. TURN
+    credentials are left out: the Remote method fetches new ones for every
+    connection, so they would never match a warm entry.
+
+    :param scope: What else the entry depends on, e.g. the connection method and ICE policy.
+    """
+    urls = []
+    for server in configuration.iceServers or []:
+        urls.append(tuple(server.urls) if isinstance(server.urls, list) else (server.urls,))
+    return tuple(scope), tuple(urls)
+
+
+class WebRTCPeerConnectionPool:
+    """
+    Keeps peer connections ready to be handed to the robot: the transceivers and
+    the data channel are added, the offer is created and ICE gathering has
+    completed. Entries are grouped per configuration and expire after max_age
+    seconds because host candidates and TURN allocations go stale.
+
+    A warm entry keeps the TURN allocation it made with the credentials of its
+    time, which remains valid within max_age; the newest credentials passed to
+    acquire() or schedule_fill() are used for every entry prepared afterwards.
+    """
+
+    def __init__(self, factory, size=1, max_age=60, scope=()):
+        """
+        :param factory: Coroutine function taking an RTCConfiguration and returning
+                        a prepared tuple whose first element is the RTCPeerConnection.
+        :param size: Number of warm peer connections kept per configuration.
+        :param max_age: Seconds after which a warm peer connection is discarded.
+        :param scope: Added to every configuration key, e.g. (connection method, ICE policy).
+        """
+        self.factory = factory
+        self.size = size
+        self.max_age = max_age
+        self.scope = scope
+        self.ready = {}  # configuration key -> list of (created_at, prepared)
+        self.configurations = {}  # configuration key -> latest configuration (freshest TURN credentials)
+        self.fill_tasks = {}  # configuration key -> running fill task
+
+    def acquire(self, configuration):
+        """
+        Take a warm peer connection for the configuration, or None if there is none.
+        Expired entries are closed on the way.
+        """
+        key = self._refresh(configuration)
+        entries = self.ready.get(key, [])
+        now = time.monotonic()
+
+        while entries:
+            created_at, prepared = entries.pop(0)
+            if now - created_at <= self.max_age:
+                return prepared
+            logging.info("Discarding expired warm peer connection")
+            asyncio.ensure_future(prepared[0].close())
+        return None
+
+    def schedule_fill(self, configuration):
+        """Top the pool up for the configuration in the background."""
+        key = self._refresh(configuration)
+        task = self.fill_tasks.get(key)
+        if task and not task.done():
+            return
+        self.fill_tasks[key] = asyncio.ensure_future(self.fill(configuration))
+
+    async def fill(self, configuration):
+        """Prepare peer connections until the pool holds `size` entries for the configuration."""
+        key = self._refresh(configuration)
+        entries = self.ready.setdefault(key, [])
+        while len(entries) < self.size:
+            try:
+                # Credentials may have been renewed while the previous entry was gathering
+                prepared = await self.factory(self.configurations[key])
+            except Exception:
+                logging.error("Failed to prepare a warm peer connection", exc_info=True)
+                return
+            entries.append((time.monotonic(), prepared))
+            logging.info("Warm peer connection ready (%d/%d)", len(entries), self.size)
+
+    def _refresh(self, configuration):
+        """Remember the configuration as the latest for its key and return the key."""
+        key = configuration_key(configuration, self.scope)
+        self.configurations[key] = configuration
+        return key
+
+    async def close(self):
+        """Cancel pending fills and close every warm peer connection."""
+        for task in self.fill_tasks.values():
+            task.cancel()
+        self.fill_tasks.clear()
+
+        for entries in self.ready.values():
+            for _, prepared in entries:
+                await prepared[0].close()
+        self.ready.clear()
+        self.configurations.clear()
@@ -18,4 +18,7 @@ setup(
         'lz4',
         'pydub'
     ],
+    extras_require={
+        'fast': ['orjson'],
+    },
 )